@@ -0,0 +1,84 @@
+"""
+Compares the ply lexer of mamba.lexer with the hand written mamba.scanner on
+a large source made of copies of the benchmarks and examples, checking that
+both produce the same tokens.
+
+    python benchmarks/lexer.py              # 60 copies
+    python benchmarks/lexer.py -c 200 -r 5
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import mamba.lexer
+import mamba.parser
+from mamba.scanner import Scanner
+
+LEXERS = (
+    ('ply', lambda: mamba.lexer.lexer.clone()),
+    ('scanner', Scanner),
+)
+
+
+def generate(copies: int):
+    paths = sorted(glob.glob(os.path.join(HERE, '*.mb')))
+    paths += sorted(glob.glob(os.path.join(HERE, '..', 'examples', '*.mb')))
+    source = ''
+
+    for path in paths:
+        with open(path) as f:
+            source += f.read() + '\n'
+
+    return source * copies
+
+
+def tokens(lexer, source: str):
+    lexer.input(source)
+    return [(t.type, t.value, t.lineno, t.lexpos) for t in iter(lexer.token, None)]
+
+
+def best_time(run, repeat: int):
+    best = float('inf')
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Compares the ply lexer with mamba.scanner')
+    parser.add_argument('-c', '--copies', type=int, default=60, help='copies of the sources in the generated one')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per lexer, the best one counts')
+    args = parser.parse_args(argv)
+
+    source = generate(args.copies)
+    expected = tokens(LEXERS[0][1](), source)
+    grammar = mamba.parser.get_parser(True)
+
+    print('%d KiB, %d lines, %d tokens' % (len(source) // 1024, source.count('\n'), len(expected)))
+    print('%-8s %10s %10s %12s' % ('lexer', 'lex ms', 'parse ms', 'tokens/sec'))
+
+    for name, make in LEXERS:
+        if tokens(make(), source) != expected:
+            print('%s produces different tokens than ply' % name, file=sys.stderr)
+            return 1
+
+        lex = best_time(lambda: tokens(make(), source), args.repeat)
+        parse = best_time(lambda: grammar.parse(source, lexer=make()), args.repeat)
+
+        print('%-8s %10.1f %10.1f %12.0f' % (name, lex * 1000, parse * 1000, len(expected) / lex))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
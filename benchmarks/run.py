@@ -0,0 +1,206 @@
+"""
+Runs the Mamba benchmarks and compares them with the stored baseline.
+
+Every benchmark is a .mb file in this directory starting with a
+`// ops: N` comment, the amount of work units (calls, loop iterations...)
+it performs, which is what ops/sec is computed from.
+
+    python benchmarks/run.py                       # all benchmarks on the tree engine
+    python benchmarks/run.py -e vm -e closure arrays
+    python benchmarks/run.py --save                # store the results as the new baseline
+
+Timings depend on the machine, only compare against a baseline saved on the same one.
+A benchmark slower than the baseline is measured again up to --retries times
+keeping the best time, a busy machine slows single runs down by far more than
+the threshold and only slowdowns which last through the retries are reported.
+On machines noisier than that pass a larger -t. Save a new baseline along with
+changes meant to make things faster or slower
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from mamba.interpreter import Interpreter, engines
+
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+
+# Peak memory differences below this many KiB are noise, not regressions
+MEMORY_SLACK = 64
+
+
+def discover(names=None):
+    paths = sorted(glob.glob(os.path.join(HERE, '*.mb')))
+    benchmarks = [(os.path.splitext(os.path.basename(p))[0], p) for p in paths]
+
+    if names:
+        benchmarks = [(n, p) for n, p in benchmarks if n in names]
+
+    return benchmarks
+
+
+def read_ops(source: str):
+    m = re.match(r'//\s*ops:\s*(\d+)', source)
+
+    if m is None:
+        raise ValueError("Benchmarks have to start with a '// ops: N' comment")
+
+    return int(m.group(1))
+
+
+def measure(interpreter: Interpreter, source: str, repeat: int):
+    """
+    Returns the best parse and eval time out of repeat runs and the peak
+    memory allocated while evaluating, measured in a run of its own since
+    tracing allocations slows everything down
+    """
+
+    parse = evaluate = float('inf')
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        interpreter.parse(source)
+        parse = min(parse, time.perf_counter() - start)
+
+        program = interpreter.load(source)
+        interpreter.reset()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            interpreter.run(program)
+            evaluate = min(evaluate, time.perf_counter() - start)
+
+    program = interpreter.load(source)
+    interpreter.reset()
+    tracemalloc.start()
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return parse, evaluate, peak
+
+
+def summarize(ops: int, parse: float, evaluate: float, peak: int) -> dict:
+    return {
+        'parse': round(parse, 6),
+        'eval': round(evaluate, 6),
+        'ops_per_sec': round(ops / evaluate),
+        'peak_kb': round(peak / 1024, 1)
+    }
+
+
+def compare(result: dict, base: dict, threshold: float):
+    """
+    Returns a short verdict and whether it is a regression
+    """
+
+    if base is None:
+        return 'new', False
+
+    speed = result['ops_per_sec'] / base['ops_per_sec']
+    memory = result['peak_kb'] / base['peak_kb'] if base['peak_kb'] else 1.0
+    notes = ['%.2fx' % speed]
+    regression = False
+
+    if speed < 1 - threshold:
+        notes.append('SLOWER')
+        regression = True
+
+    if memory > 1 + threshold and result['peak_kb'] - base['peak_kb'] > MEMORY_SLACK:
+        notes.append('MEMORY +%d%%' % round((memory - 1) * 100))
+        regression = True
+
+    return ' '.join(notes), regression
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Runs the Mamba benchmarks')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all)')
+    parser.add_argument('-e', '--engine', action='append', choices=engines, help='engines to run (default: tree)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per benchmark, the best one counts')
+    parser.add_argument('-b', '--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('-t', '--threshold', type=float, default=0.2,
+                        help='relative slowdown or memory growth reported as a regression')
+    parser.add_argument('--retries', type=int, default=2, help='extra measurements of benchmarks found slower')
+    parser.add_argument('--save', action='store_true', help='save the results as the baseline')
+    args = parser.parse_args(argv)
+
+    selected = args.engine or ['tree']
+    baseline = {}
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get('results', {})
+
+    results = {}
+    regressions = 0
+
+    print('%-14s %-8s %10s %10s %12s %10s  %s' % ('benchmark', 'engine', 'parse ms', 'eval ms', 'ops/sec',
+                                                 'peak KiB', 'vs baseline'))
+
+    for name, path in discover(args.names):
+        with open(path) as f:
+            source = f.read()
+
+        ops = read_ops(source)
+
+        for engine in selected:
+            base = baseline.get(name, {}).get(engine)
+            parse, evaluate, peak = measure(Interpreter(engine), source, args.repeat)
+            result = summarize(ops, parse, evaluate, peak)
+            verdict, regression = compare(result, base, args.threshold)
+
+            for _ in range(args.retries):
+                if not regression:
+                    break
+
+                again = measure(Interpreter(engine), source, args.repeat)
+                parse, evaluate, peak = min(parse, again[0]), min(evaluate, again[1]), min(peak, again[2])
+                result = summarize(ops, parse, evaluate, peak)
+                verdict, regression = compare(result, base, args.threshold)
+
+            regressions += regression
+
+            results.setdefault(name, {})[engine] = result
+
+            print('%-14s %-8s %10.2f %10.2f %12.0f %10.1f  %s' % (name, engine, parse * 1000, evaluate * 1000,
+                                                                 result['ops_per_sec'], result['peak_kb'], verdict))
+
+    if args.save:
+        # keep the baseline of benchmarks and engines which were not run this time
+        for name, by_engine in results.items():
+            baseline.setdefault(name, {}).update(by_engine)
+
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': baseline
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if regressions:
+        print('%d regression(s) against the baseline' % regressions, file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
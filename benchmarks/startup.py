@@ -0,0 +1,63 @@
+"""
+Measures how long running a tiny script takes from the command line, which
+is mostly interpreter startup: importing Mamba, loading the lexer and parser
+tables and setting up the standard library. Fails when it's over the target.
+
+    python benchmarks/startup.py                  # examples/hello.mb, 150 ms over a bare python
+    python benchmarks/startup.py -t 100 -n 20 other.mb
+
+The target is the time on top of starting python itself, so that it means the
+same on slower machines. The first run warms the program cache and isn't counted
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+DEFAULT_SCRIPT = os.path.join(ROOT, 'examples', 'hello.mb')
+
+
+def best_time(command: list, runs: int):
+    best = float('inf')
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Measures the startup time of mamba.py')
+    parser.add_argument('script', nargs='?', default=DEFAULT_SCRIPT)
+    parser.add_argument('-n', '--runs', type=int, default=10, help='runs, the best one counts')
+    parser.add_argument('-t', '--target', type=float, default=150,
+                        help='milliseconds allowed on top of starting python')
+    args = parser.parse_args(argv)
+
+    command = [sys.executable, os.path.join(ROOT, 'mamba.py'), args.script]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+
+    python = best_time([sys.executable, '-c', 'pass'], args.runs)
+    mamba = best_time(command, args.runs)
+    overhead = (mamba - python) * 1000
+
+    print('python   %8.1f ms' % (python * 1000))
+    print('mamba.py %8.1f ms' % (mamba * 1000))
+    print('overhead %8.1f ms (target %.0f ms)' % (overhead, args.target))
+
+    if overhead > args.target:
+        print('Startup is over the target', file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
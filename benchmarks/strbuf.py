@@ -0,0 +1,98 @@
+"""
+Times building a string of n appends, n going up tenfold up to 1000000, with
+s += "..." in a loop (which the optimizer turns into appends to a buffer),
+with strbuf_append and with s += "..." unoptimized, which copies the string
+on every append. The time per append stays flat as n grows when building is
+linear and grows with n when it's quadratic. The unoptimized runs stop at
+--plain-max appends, past that they take minutes.
+
+    python benchmarks/strbuf.py
+    python benchmarks/strbuf.py -e vm -n 10000000 -p 300000
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from mamba.interpreter import Interpreter, engines
+
+CONCATENATE = '''
+s = "";
+for i in 1 -> %d {
+    s += "line\\n";
+}
+say len(s);
+'''
+
+APPEND = '''
+b = strbuf();
+for i in 1 -> %d {
+    strbuf_append(b, "line\\n");
+}
+say len(strbuf_str(b));
+'''
+
+VARIANTS = (
+    ('+=', CONCATENATE, True),
+    ('strbuf', APPEND, True),
+    ('+= plain', CONCATENATE, False),
+)
+
+
+def best_time(engine: str, source: str, optimize: bool, repeat: int):
+    best = float('inf')
+    output = None
+
+    for _ in range(repeat):
+        output = io.StringIO()
+        interpreter = Interpreter(engine, optimize, argv=[], output=output)
+
+        start = time.perf_counter()
+        interpreter.execute(source)
+        best = min(best, time.perf_counter() - start)
+
+    return best, output.getvalue()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Times building strings of growing length')
+    parser.add_argument('-e', '--engine', action='append', choices=engines, help='engines to time, all by default')
+    parser.add_argument('-n', '--appends', type=int, default=1000000, help='largest number of appends')
+    parser.add_argument('-p', '--plain-max', type=int, default=100000, help='largest unoptimized run')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per case, the best one counts')
+    args = parser.parse_args(argv)
+
+    sizes = []
+    n = 1000
+
+    while n <= args.appends:
+        sizes.append(n)
+        n *= 10
+
+    print('%-8s %-9s %10s %12s %14s' % ('engine', 'variant', 'appends', 'ms', 'ns/append'))
+
+    for engine in args.engine or engines:
+        for name, source, optimize in VARIANTS:
+            for n in sizes:
+                if not optimize and n > args.plain_max:
+                    continue
+
+                elapsed, output = best_time(engine, source % n, optimize, args.repeat)
+
+                if output != str(n * 5):
+                    print('%s %s built a string of %s characters, expected %d' % (engine, name, output, n * 5),
+                          file=sys.stderr)
+                    return 1
+
+                print('%-8s %-9s %10d %12.1f %14.0f' % (engine, name, n, elapsed * 1000, elapsed / n * 1e9))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,123 @@
+"""
+Stress test of programs running concurrently in one process: runs many
+programs at once on a mamba.pool.Pool, every engine mixed, and checks each
+one printed exactly what it prints when run alone. The programs use the same
+global and function names with different values, recurse, memoize, iterate
+generators and spawn builtins, so any state leaking between them shows up
+in the output. Fails on the first mismatch.
+
+    python benchmarks/threads.py                  # 300 programs on 16 threads
+    python benchmarks/threads.py -n 1000 -w 64
+"""
+
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from mamba.interpreter import engines
+from mamba.pool import Pool
+
+TEMPLATE = '''
+seed = %(seed)d;
+seen = [];
+
+fn depth(n) {
+    if n == 0 {
+        ret seed;
+    }
+
+    ret 1 + depth(n - 1);
+}
+
+memo fn fib(n) {
+    if n < 2 {
+        ret n + seed;
+    }
+
+    ret fib(n - 1) + fib(n - 2);
+}
+
+fn evens(n) {
+    for i in range(0, n) {
+        if i %% 2 == 0 {
+            yield i * seed;
+        }
+    }
+}
+
+fn add(n) {
+    array_push(seen, n);
+}
+
+for v in evens(%(size)d) {
+    add(v);
+}
+
+counts = {};
+
+for i in 1 -> %(size)d {
+    key = str(i %% 7);
+    counts[key] = map_get(counts, key, 0) + seed;
+}
+
+say seed, " ", sum(seen), " ", depth(%(depth)d), " ", fib(60), " ", counts["3"], "\\n";
+say await [spawn str(seed), spawn upper("s" + str(seed))], "\\n";
+'''
+
+
+def program(seed: int) -> str:
+    return TEMPLATE % {'seed': seed, 'size': 200 + seed % 50, 'depth': 500 + seed % 300}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Runs Mamba programs concurrently and checks their isolation')
+    parser.add_argument('-n', '--programs', type=int, default=300)
+    parser.add_argument('-w', '--workers', type=int, default=16, help='threads running programs')
+    args = parser.parse_args(argv)
+
+    jobs = [(engines[i % len(engines)], program(i)) for i in range(args.programs)]
+
+    # what each program prints when nothing else runs
+    expected = {}
+
+    for engine in engines:
+        with Pool(1, engine) as pool:
+            for i, (e, source) in enumerate(jobs):
+                if e == engine:
+                    expected[i] = pool.run(source)
+
+    pools = {engine: Pool(args.workers, engine) for engine in engines}
+    start = time.perf_counter()
+
+    try:
+        futures = [pools[engine].submit(source) for engine, source in jobs]
+        results = [f.result() for f in futures]
+    finally:
+        for pool in pools.values():
+            pool.close()
+
+    elapsed = time.perf_counter() - start
+
+    for i, result in enumerate(results):
+        want = expected[i]
+
+        if result.status != want.status or result.output != want.output or result.error != want.error:
+            print('program %d (%s) differs when run concurrently' % (i, jobs[i][0]), file=sys.stderr)
+            print('expected: %r %r' % (want.output, want.error), file=sys.stderr)
+            print('got:      %r %r' % (result.output, result.error), file=sys.stderr)
+            return 1
+
+    failed = sum(1 for r in results if r.status)
+
+    print('%d programs on %d threads per engine, %d failed, all isolated, %.3fs (%.1f programs/sec)' % (
+        len(jobs), args.workers, failed, elapsed, len(jobs) / elapsed))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,8 +1,31 @@
 import mamba
+import mamba.cache
+import os
 import sys
 
-if len(sys.argv) == 1:
-    print("Usage: %s filename" % __file__)
-else:
-    with open(sys.argv[1]) as f:
-        mamba.execute(f.read())
+if __name__ == '__main__':
+    # the batch runner and the repl are imported when used, running a script should start fast
+    if len(sys.argv) == 1:
+        import mamba.repl
+        sys.exit(mamba.repl.main([]))
+    elif sys.argv[1] in ('-h', '--help'):
+        print("Usage: %s filename" % __file__)
+        print("       %s --profile filename" % __file__)
+        print("       %s batch <directory|manifest> [options]" % __file__)
+        print("       %s [repl [options]]" % __file__)
+    elif sys.argv[1] == 'repl':
+        import mamba.repl
+        sys.exit(mamba.repl.main(sys.argv[2:]))
+    elif sys.argv[1] == 'batch':
+        import mamba.batch
+        sys.exit(mamba.batch.main(sys.argv[2:]))
+    elif sys.argv[1] == '--profile' and len(sys.argv) > 2:
+        with open(sys.argv[2]) as f:
+            # collapsed stacks for flamegraph tools go next to the script
+            mamba.profile(f.read(), stacks=sys.argv[2] + '.folded')
+    else:
+        with open(sys.argv[1]) as f:
+            # parsed programs are cached next to the script, like python's __pycache__
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(sys.argv[1])), mamba.cache.DEFAULT_DIR)
+
+            mamba.execute(f.read(), cache_dir=cache_dir)
@@ -1,29 +1,69 @@
-import time
-import mamba.parser as p
-import mamba.ast
-import mamba.environment
 import mamba.exceptions
-import pprint
+from mamba.budget import Budget
+from mamba.incremental import IncrementalParser
+from mamba.interpreter import Interpreter, engines
+from mamba.profiler import Profiler
+from mamba.symbol_table import MAX_DEPTH
 import sys
 
 
-def execute(source, show_ast: bool=False, disable_warnings: bool=True):
-    p.disable_warnings = disable_warnings
+def execute(source, show_ast: bool=False, disable_warnings: bool=True, engine: str='tree', cache_dir: str=None,
+            optimize: bool=True, max_depth: int=MAX_DEPTH, scanner: bool=False, budget: Budget=None):
+    """
+    Runs the source in a new interpreter, use mamba.Interpreter directly to run
+    several programs in the same environment
+    """
+
+    interpreter = Interpreter(engine, optimize, cache_dir, disable_warnings=disable_warnings, max_depth=max_depth,
+                              scanner=scanner, budget=budget)
+
+    try:
+        interpreter.execute(source, show_ast)
+    except Exception as e:
+        print(e.__class__.__name__ + ': ' + str(e), file=sys.stderr)
+        if not disable_warnings:
+            raise e
+
+
+async def async_execute(source, disable_warnings: bool=True, engine: str='tree', cache_dir: str=None,
+                        optimize: bool=True, max_depth: int=MAX_DEPTH, scanner: bool=False, budget: Budget=None):
+    """
+    execute() as a coroutine, the program runs on a thread of its own so the
+    event loop and the other programs go on while it waits on files or input
+    """
+
+    interpreter = Interpreter(engine, optimize, cache_dir, disable_warnings=disable_warnings, max_depth=max_depth,
+                              scanner=scanner, budget=budget)
 
     try:
-        res = p.get_parser().parse(source)
-        environment.declare_env(mamba.ast.symbols)
+        await interpreter.async_execute(source)
+    except Exception as e:
+        print(e.__class__.__name__ + ': ' + str(e), file=sys.stderr)
+        if not disable_warnings:
+            raise e
 
-        for node in res.children:
-            node.eval()
 
-        if show_ast:
-            print("\n\n" + '=' * 80, ' == Syntax tree ==')
+def profile(source, report=sys.stderr, stacks: str=None, disable_warnings: bool=True):
+    """
+    Runs the source with the tree engine under the profiler, writing the report
+    to the report file and the collapsed call stacks to the stacks path if given.
+    Profiles of programs stopped by an error are reported as well
+    """
 
-            pp = pprint.PrettyPrinter()
-            pp.pprint(res.children)
-            pp.pprint(mamba.ast.symbols.table())
+    interpreter = Interpreter('tree', disable_warnings=disable_warnings)
+    profiler = Profiler()
+
+    try:
+        interpreter.execute(source, profiler=profiler)
     except Exception as e:
         print(e.__class__.__name__ + ': ' + str(e), file=sys.stderr)
         if not disable_warnings:
-            raise e
\ No newline at end of file
+            raise e
+    finally:
+        profiler.report(report, source)
+
+        if stacks is not None:
+            with open(stacks, 'w') as f:
+                profiler.write_stacks(f)
+
+    return profiler
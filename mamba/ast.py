@@ -1,9 +1,22 @@
+import contextvars
 import operator
+from collections import OrderedDict
 from types import LambdaType
 from mamba.exceptions import *
+import mamba.strbuf
 import mamba.symbol_table
+import mamba.tasks
+from mamba.symbol_table import UNSET
 
-symbols = mamba.symbol_table.SymbolTable()
+# Symbol table nodes are evaluated against, set by the interpreter running the program. Every program runs
+# in a context of its own, so programs running at the same time on different threads each see their own
+symbols = contextvars.ContextVar('symbols', default=mamba.symbol_table.SymbolTable())
+
+# File say prints to in every engine, sys.stdout when None
+output = contextvars.ContextVar('output', default=None)
+
+# Results kept by each memo function, the least recently used ones are dropped first
+MEMO_SIZE = 4096
 
 
 class InstructionList:
@@ -21,6 +34,37 @@ class InstructionList:
     def __repr__(self):
         return '<InstructionList {0}>'.format(self.children)
 
+    def execute(self):
+        """
+        Executes the children as statements, returns the exit or return
+        statement which stopped the block or None when it ran to the end
+        """
+
+        for n in self.children:
+            signal = n.execute()
+
+            if signal is not None:
+                return signal
+
+        return None
+
+    def gen_execute(self):
+        """
+        Same as execute for the body of a generator function, yields the
+        values of the yield statements and returns the signal
+        """
+
+        for n in self.children:
+            if n.gen_execute is None:
+                signal = n.execute()
+            else:
+                signal = yield from n.gen_execute()
+
+            if signal is not None:
+                return signal
+
+        return None
+
     def eval(self):
         """
         Evaluates all the class children and returns the result
@@ -44,9 +88,52 @@ class InstructionList:
 
 
 class BaseExpression:
+    # line of the source the node starts at, set by the parser
+    lineno = None
+
+    # statements which can contain a yield statement implement gen_execute(),
+    # a generator version of execute() used in the body of generator functions
+    gen_execute = None
+
     def eval(self):
         raise NotImplementedError()
 
+    def execute(self):
+        """
+        Runs the node as a statement, the value is of no use there. Statements
+        which stop the block they're in (exit and ret) return themselves so
+        the enclosing loop or function can handle them, all others return None
+        """
+
+        self.eval()
+
+
+def iter_child_nodes(node):
+    """
+    Yields the nodes directly contained in the passed node
+    """
+
+    if isinstance(node, InstructionList):
+        yield from node.children
+        return
+
+    for value in vars(node).values():
+        if isinstance(value, (BaseExpression, InstructionList)):
+            yield value
+
+
+def contains_yield(node):
+    """
+    Whether there's a yield statement in the node, not counting the functions declared in it
+    """
+
+    if isinstance(node, Yield):
+        return True
+    elif isinstance(node, Function):
+        return False
+
+    return any(contains_yield(n) for n in iter_child_nodes(node))
+
 
 class ExitStatement(BaseExpression):
     def __iter__(self):
@@ -55,6 +142,9 @@ class ExitStatement(BaseExpression):
     def eval(self):
         pass
 
+    def execute(self):
+        return self
+
 
 class ReturnStatement(ExitStatement):
     def __init__(self, expr: BaseExpression):
@@ -78,6 +168,20 @@ def full_eval(expr: BaseExpression):
     return expr
 
 
+class Yield(BaseExpression):
+    def __init__(self, expr: BaseExpression):
+        self.expr = expr
+
+    def __repr__(self):
+        return '<Yield expr={0}>'.format(self.expr)
+
+    def eval(self):
+        raise InterpreterRuntimeError("'yield' outside of a function")
+
+    def gen_execute(self):
+        yield full_eval(self.expr)
+
+
 class Primitive(BaseExpression):
     def __init__(self, value):
         self.value = value
@@ -92,6 +196,12 @@ class Primitive(BaseExpression):
 class Identifier(BaseExpression):
     is_function = False
 
+    # set by mamba.scope, variables which have not been resolved are looked up by name
+    local = False
+    slot = None
+    free = False
+    outer = None
+
     def __init__(self, name):
         self.name = name
 
@@ -99,16 +209,32 @@ class Identifier(BaseExpression):
         return '<Identifier {0}>'.format(self.name)
 
     def assign(self, val):
+        table = symbols.get()
+
         if self.is_function:
-            symbols.set_func(self.name, val)
+            table.set_func(self.name, val)
+        elif self.local:
+            table.store_local(self.slot, val)
+        elif self.slot is not None:
+            table.store_global(self.slot, val)
         else:
-            symbols.set_sym(self.name, val)
+            table.set_sym(self.name, val)
 
     def eval(self):
+        table = symbols.get()
+
         if self.is_function:
-            return symbols.get_func(self.name)
+            return table.get_func(self.name)
+        elif self.local:
+            return table.load_local(self.slot, self.name)
+        elif self.free:
+            return table.load_free(self.slot, self.name)
+        elif self.outer is not None:
+            return table.load_outer(table.current_frame(), self.outer, self.name)
+        elif self.slot is not None:
+            return table.load_global(self.slot, self.name)
 
-        return symbols.get_sym(self.name)
+        return table.get_sym(self.name)
 
 
 class Array(BaseExpression):
@@ -122,6 +248,18 @@ class Array(BaseExpression):
         return self.values.eval()
 
 
+class Map(BaseExpression):
+    def __init__(self, keys: InstructionList, values: InstructionList):
+        self.keys = keys
+        self.values = values
+
+    def __repr__(self):
+        return '<Map len={0} keys={1} values={2}>'.format(len(self.keys), self.keys, self.values)
+
+    def eval(self):
+        return {k.eval(): v.eval() for k, v in zip(self.keys, self.values)}
+
+
 class ArrayAccess(BaseExpression):
     def __init__(self, array: Identifier, index: BaseExpression):
         self.array = array
@@ -172,6 +310,32 @@ class ArraySlice(BaseExpression):
             return self.array.eval()[:]
 
 
+class ArraySliceAssign(BaseExpression):
+    """
+    a[start:end] = value, replaces the items of the slice with those of value in place
+    """
+
+    def __init__(self, array: Identifier, start: BaseExpression=None, end: BaseExpression=None,
+                 value: BaseExpression=None):
+        self.array = array
+        self.start = start
+        self.end = end
+        self.value = value
+
+    def __repr__(self):
+        fmt = '<ArraySliceAssign array={0} start={1} end={2} value={3}>'
+        return fmt.format(self.array, self.start, self.end, self.value)
+
+    def eval(self):
+        # same evaluation order as python's a[i:j] = v
+        value = self.value.eval()
+        array = self.array.eval()
+        start = self.start.eval() if self.start is not None else None
+        end = self.end.eval() if self.end is not None else None
+
+        array[start:end] = value
+
+
 class Assignment(BaseExpression):
     def __init__(self, identifier: Identifier, val):
         self.identifier = identifier
@@ -182,6 +346,13 @@ class Assignment(BaseExpression):
 
     def eval(self):
         if self.identifier.is_function:
+            symbols.get().local_names.update(self.val.varnames)
+
+        if self.identifier.is_function and self.val.memo:
+            function = self.val
+            memo = Memo(self.identifier.name, len(function.params), function.eval)
+            self.identifier.assign(BuiltInFunction(memo))
+        elif self.identifier.is_function:
             self.identifier.assign(self.val)
         else:
             self.identifier.assign(self.val.eval())
@@ -279,6 +450,23 @@ class CompoundOperation(BaseExpression):
             raise InterpreterRuntimeError("Unable to apply operation (%s: %s) %s (%s: %s)" % fmt)
 
 
+class Concatenation(CompoundOperation):
+    """
+    s += value inside a loop which does nothing else with s, the optimizer
+    rewrites those so that s holds a buffer while the loop runs (see
+    mamba.strbuf.concat and BufferedLoop)
+    """
+
+    def __init__(self, identifier: Identifier, modifier: BaseExpression):
+        super().__init__(identifier, modifier, '+=')
+
+    def __repr__(self):
+        return '<Concatenation identifier={0} mod={1}>'.format(self.identifier, self.modifier)
+
+    def eval(self):
+        self.identifier.assign(mamba.strbuf.concat(self.identifier.eval(), self.modifier.eval()))
+
+
 class UnaryOperation(BaseExpression):
     __operations = {
         '+': operator.pos,
@@ -307,11 +495,19 @@ class If(BaseExpression):
     def __repr__(self):
         return '<If condition={0} then={1} else={2}>'.format(self.condition, self.truepart, self.elsepart)
 
-    def eval(self):
+    def execute(self):
         if self.condition.eval():
-            return self.truepart.eval()
+            return self.truepart.execute()
         elif self.elsepart is not None:
-            return self.elsepart.eval()
+            return self.elsepart.execute()
+
+    eval = execute
+
+    def gen_execute(self):
+        if self.condition.eval():
+            return (yield from self.truepart.gen_execute())
+        elif self.elsepart is not None:
+            return (yield from self.elsepart.gen_execute())
 
 
 class For(BaseExpression):
@@ -326,7 +522,7 @@ class For(BaseExpression):
         fmt = '<For start={0} direction={1} end={2} body={3}>'
         return fmt.format(self.start, 'asc' if self.asc else 'desc', self.end, self.body)
 
-    def eval(self):
+    def __range(self):
         if self.asc:
             lo = self.start.eval()
             hi = self.end.eval() + 1
@@ -336,11 +532,38 @@ class For(BaseExpression):
             hi = self.end.eval() - 1
             sign = -1
 
-        for i in range(lo, hi, sign):
-            self.variable.assign(i)
+        return range(lo, hi, sign)
+
+    def execute(self):
+        variable, body = self.variable, self.body
+        budget = symbols.get().budget
+
+        for i in self.__range():
+            budget.left -= 1
+
+            if budget.left < 0:
+                budget.check()
+
+            variable.assign(i)
 
             # in case of exit statement prematurely break the loop
-            if isinstance(self.body.eval(), ExitStatement):
+            if body.execute() is not None:
+                break
+
+    eval = execute
+
+    def gen_execute(self):
+        budget = symbols.get().budget
+
+        for i in self.__range():
+            budget.left -= 1
+
+            if budget.left < 0:
+                budget.check()
+
+            self.variable.assign(i)
+
+            if (yield from self.body.gen_execute()) is not None:
                 break
 
 
@@ -353,10 +576,33 @@ class ForIn(BaseExpression):
     def __repr__(self):
         return '<ForIn var={0} in iterable={1} do body={2}>'.format(self.variable, self.sequence, self.body)
 
-    def eval(self):
+    def execute(self):
+        variable, body = self.variable, self.body
+        budget = symbols.get().budget
+
+        for i in self.sequence.eval():
+            budget.left -= 1
+
+            if budget.left < 0:
+                budget.check()
+
+            variable.assign(i)
+            if body.execute() is not None:
+                break
+
+    eval = execute
+
+    def gen_execute(self):
+        budget = symbols.get().budget
+
         for i in self.sequence.eval():
+            budget.left -= 1
+
+            if budget.left < 0:
+                budget.check()
+
             self.variable.assign(i)
-            if isinstance(self.body.eval(), ExitStatement):
+            if (yield from self.body.gen_execute()) is not None:
                 break
 
 
@@ -368,12 +614,65 @@ class While(BaseExpression):
     def __repr__(self):
         return '<While cond={0} body={1}>'.format(self.condition, self.body)
 
-    def eval(self):
+    def execute(self):
+        condition, body = self.condition, self.body
+        budget = symbols.get().budget
+
+        while condition.eval():
+            budget.left -= 1
+
+            if budget.left < 0:
+                budget.check()
+
+            if body.execute() is not None:
+                break
+
+    eval = execute
+
+    def gen_execute(self):
+        budget = symbols.get().budget
+
         while self.condition.eval():
-            if isinstance(self.body.eval(), ExitStatement):
+            budget.left -= 1
+
+            if budget.left < 0:
+                budget.check()
+
+            if (yield from self.body.gen_execute()) is not None:
                 break
 
 
+class BufferedLoop(BaseExpression):
+    """
+    A loop appending to the variables with Concatenation statements, the
+    buffers they hold are turned back into strings once it ends (or fails)
+    """
+
+    def __init__(self, loop: BaseExpression, variables: InstructionList):
+        self.loop = loop
+        self.variables = variables
+        self.lineno = loop.lineno
+
+    def __repr__(self):
+        return '<BufferedLoop variables={0} loop={1}>'.format(self.variables, self.loop)
+
+    def execute(self):
+        try:
+            return self.loop.execute()
+        finally:
+            for variable in self.variables:
+                try:
+                    value = variable.eval()
+                except SymbolNotFound:
+                    # never assigned, the loop didn't run
+                    continue
+
+                if value.__class__ is mamba.strbuf.Builder:
+                    variable.assign(value.value())
+
+    eval = execute
+
+
 class PrintStatement(BaseExpression):
     def __init__(self, items: InstructionList):
         self.items = items
@@ -382,10 +681,14 @@ class PrintStatement(BaseExpression):
         return '<Print {0}>'.format(self.items)
 
     def eval(self):
-        print(*self.items.eval(), end='', sep='')
+        print(*self.items.eval(), end='', sep='', file=output.get())
 
 
 class FunctionCall(BaseExpression):
+    # the symbol table the called function was looked up in and the function, functions
+    # can't be redeclared so it's valid for as long as the call runs against that table
+    __bound = (None, None)
+
     def __init__(self, name: Identifier, params: InstructionList):
         self.name = name
         self.params = params
@@ -393,72 +696,211 @@ class FunctionCall(BaseExpression):
     def __repr__(self):
         return '<Function call name={0} params={1}>'.format(self.name, self.params)
 
-    def __eval_builtin_func(self):
+    def __bind(self):
+        """
+        Looks up the called function and checks the number of arguments, once per symbol table
+        """
+
         func = self.name.eval()
-        args = []
 
-        for p in self.params:
-            args.append(full_eval(p))
+        if func.__class__ is not BuiltInFunction and len(func.params) != len(self.params):
+            msg = "Invalid number of arguments for function {0}. Expected {1} got {2}"
+            raise InvalidParamCount(msg.format(self.name.name, len(func.params), len(self.params)))
 
-        return func.eval(args)
+        self.__bound = (symbols.get(), func)
+        return func
 
-    def __eval_udf(self):
-        func = self.name.eval()
-        args = {}
+    def eval(self):
+        table, func = self.__bound
 
-        # check param count
-        l1 = len(func.params)
-        l2 = len(self.params)
+        if table is not symbols.get():
+            func = self.__bind()
 
-        if l1 != l2:
-            msg = "Invalid number of arguments for function {0}. Expected {1} got {2}"
-            raise InvalidParamCount(msg.format(self.name.name, l1, l2))
+        if func.__class__ is BuiltInFunction:
+            return func.func(*[full_eval(p) for p in self.params.children])
+
+        return func.eval([full_eval(p) for p in self.params.children], symbols.get().current_frame())
+
+    def tail_call(self):
+        """
+        Returns the called function and the evaluated arguments when the call can
+        take the place of the calling function's call (see Function.eval), None
+        when it has to be evaluated as usual
+        """
+
+        table, func = self.__bound
+
+        if table is not symbols.get():
+            func = self.__bind()
+
+        if func.__class__ is not Function or func.is_generator:
+            return None
+
+        return func, [full_eval(p) for p in self.params.children]
 
-        # pair the defined parameters in the function signature with
-        # whatever is being passed on.
-        #
-        # On the parameters we only need the name rather than fully evaluating them
-        for p, v in zip(func.params, self.params):
-            args[p.name] = full_eval(v)
+    def spawn(self):
+        """
+        Makes the call for a spawn expression, see mamba.tasks
+        """
+
+        table, func = self.__bound
+
+        if table is not symbols.get():
+            func = self.__bind()
+
+        args = [full_eval(p) for p in self.params.children]
+
+        if func.__class__ is not BuiltInFunction:
+            return mamba.tasks.done(func.eval(args, symbols.get().current_frame()))
+
+        # Mamba code only runs on the program's thread
+        if func.runs_code:
+            return mamba.tasks.done(func.func(*args))
 
-        return func.eval(args)
+        return mamba.tasks.spawn(func.func, args)
+
+
+class Spawn(BaseExpression):
+    def __init__(self, call: FunctionCall):
+        self.call = call
+
+    def __repr__(self):
+        return '<Spawn {0}>'.format(self.call)
 
     def eval(self):
-        if isinstance(self.name.eval(), BuiltInFunction):
-            return self.__eval_builtin_func()
+        return self.call.spawn()
+
+
+class Await(BaseExpression):
+    def __init__(self, expr: BaseExpression):
+        self.expr = expr
 
-        return self.__eval_udf()
+    def __repr__(self):
+        return '<Await {0}>'.format(self.expr)
+
+    def eval(self):
+        return mamba.tasks.wait(full_eval(self.expr))
 
 
 class Function(BaseExpression):
-    def __init__(self, params: InstructionList, body: InstructionList):
+    # set by mamba.scope, names of the local slots, the slot of each parameter and of each name
+    varnames = None
+    param_slots = None
+    scope = None
+
+    def __init__(self, params: InstructionList, body: InstructionList, memo: bool=False):
         self.params = params
         self.body = body
 
+        # declared with memo fn, see Memo
+        self.memo = memo
+
+        # calling a function with a yield statement returns a lazy iterator of the yielded values,
+        # decided here so that optimizing away the yield statements doesn't change that
+        self.is_generator = contains_yield(body)
+
     def __repr__(self):
         return '<Function params={0} body={1}>'.format(self.params, self.body)
 
-    def eval(self, args):
-        symbols.set_local(True)
+    def eval(self, args: list, caller: list=None):
+        """
+        Calls the function, caller is the frame of the calling function, None
+        at the top level and for calls from python
+        """
 
-        for k, v in args.items():
-            symbols.set_sym(k, v)
+        table = symbols.get()
+        stack = table.stack
 
-        try:
-            ret = self.body.eval()
+        # a segment's worth of calls deep the call goes on on the next one, see mamba.stack
+        if len(table.frames()) // stack.calls > stack.level:
+            return stack.call(self.eval, args, caller)
 
-            if isinstance(ret, ReturnStatement):
-                return ret.eval()
-        finally:
-            symbols.set_local(False)
+        function = self
+        budget = table.budget
+        replaced = None
 
-        return None
+        # ret f(...) runs f in place of the current call instead of nesting it
+        while True:
+            budget.left -= 1
+
+            if budget.left < 0:
+                budget.check()
+
+            frame = mamba.symbol_table.frame(len(function.varnames), function.scope, caller)
+
+            # pair the defined parameters in the function signature with whatever is being passed on
+            for slot, v in zip(function.param_slots, args):
+                frame[slot] = v
+
+            if replaced is not None:
+                mamba.symbol_table.link_tail_call(replaced, frame)
+
+            if function.is_generator:
+                return function.__generate(frame)
+
+            table.push_frame(frame)
+
+            try:
+                signal = function.body.execute()
+
+                # exit and ret nested in loops only stop the loop, whatever reaches here ends the call
+                if signal is None or not isinstance(signal, ReturnStatement):
+                    return None
+
+                tail = signal.expr.tail_call() if signal.expr.__class__ is FunctionCall else None
+
+                if tail is None:
+                    return full_eval(signal.expr)
+
+                function, args = tail
+                replaced = frame
+            finally:
+                table.pop_frame()
+
+    def __generate(self, frame: list):
+        # catching StopIteration costs as much as the generators nested in each other,
+        # the signal the body ends with is collected in a list which doubles as end marker
+        signal = []
+        body = _collect(self.body.gen_execute(), signal)
+        table = symbols.get()
+        frames = table.frames()
+        stack = table.stack
+
+        # the frame is only active while the body runs, between values the consumer's frame is
+        while True:
+            depth = len(frames)
+            table.push_frame(frame)
+
+            try:
+                if depth // stack.calls > stack.level:
+                    value = stack.call(next, body, signal)
+                else:
+                    value = next(body, signal)
+
+                if value is signal:
+                    # the value of a return statement is computed but not produced
+                    if signal[0] is not None and isinstance(signal[0], ReturnStatement):
+                        full_eval(signal[0].expr)
+
+                    return
+            finally:
+                table.pop_frame()
+
+            yield value
+
+
+def _collect(gen, result: list):
+    result.append((yield from gen))
 
 
 class BuiltInFunction(BaseExpression):
-    def __init__(self, func):
+    def __init__(self, func, runs_code: bool=False):
         self.func = func
 
+        # calling it may run Mamba code (memo functions, array_sort calling its key function), which only
+        # runs on the program's thread and can read the variables of the program
+        self.runs_code = runs_code or func.__class__ is Memo
+
     def __repr__(self):
         return '<Builtin function {0}>'.format(self.func)
 
@@ -466,6 +908,59 @@ class BuiltInFunction(BaseExpression):
         return self.func(*args)
 
 
+class Memo:
+    """
+    Result cache of a function declared with memo fn, keyed by the arguments
+    and their types and bounded to MEMO_SIZE results. Memo functions are
+    declared wrapped in a BuiltInFunction so every engine calls them like
+    builtins, call is the engine's own way of running the function with a
+    list of arguments. Calls with arguments which can't be hashed (arrays,
+    maps, string buffers) are not cached
+    """
+
+    def __init__(self, name: str, params: int, call, size: int=MEMO_SIZE):
+        self.name = name
+        self.params = params
+        self.call = call
+        self.size = size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return '<Memo {0} hits={1} misses={2}>'.format(self.name, self.hits, self.misses)
+
+    def __call__(self, *args):
+        if len(args) != self.params:
+            msg = "Invalid number of arguments for function {0}. Expected {1} got {2}"
+            raise InvalidParamCount(msg.format(self.name, self.params, len(args)))
+
+        # 1, 1.0 and true are equal keys but the results may differ
+        key = (args, tuple(v.__class__ for v in args))
+        results = self.results
+
+        try:
+            value = results[key]
+        except KeyError:
+            pass
+        except TypeError:
+            self.misses += 1
+            return self.call(list(args))
+        else:
+            self.hits += 1
+            results.move_to_end(key)
+            return value
+
+        self.misses += 1
+        value = self.call(list(args))
+        results[key] = value
+
+        if len(results) > self.size:
+            results.popitem(last=False)
+
+        return value
+
+
 class InExpression(BaseExpression):
     def __init__(self, a: BaseExpression, b: BaseExpression, not_in: bool=False):
         self.a = a
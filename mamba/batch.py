@@ -0,0 +1,148 @@
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import io
+import os
+import sys
+import time
+import mamba.cache
+from mamba.interpreter import Interpreter, engines
+
+# Outcome of one script, status is 0 when it ran to completion and 1 when it raised
+Result = collections.namedtuple('Result', ['path', 'status', 'output', 'error', 'elapsed'])
+
+# Worker state, built once per process by _init_worker
+_interpreter = None
+_caches = {}
+_use_cache = True
+
+
+def collect(path: str):
+    """
+    Returns the scripts to run: every .mb file under a directory, or the files
+    listed one per line in a manifest (relative to it, blank lines and lines
+    starting with # are skipped)
+    """
+
+    if os.path.isdir(path):
+        scripts = []
+
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != mamba.cache.DEFAULT_DIR)
+            scripts.extend(os.path.join(root, f) for f in sorted(files) if f.endswith('.mb'))
+
+        return scripts
+
+    base = os.path.dirname(os.path.abspath(path))
+
+    with open(path) as f:
+        lines = [line.strip() for line in f]
+
+    return [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+
+
+def _init_worker(engine: str, optimize: bool, use_cache: bool):
+    global _interpreter, _use_cache
+
+    # building the parser tables is the expensive part of startup, do it once per worker
+    _interpreter = Interpreter(engine, optimize)
+    _use_cache = use_cache
+
+
+def _cache_for(path: str):
+    directory = os.path.join(os.path.dirname(os.path.abspath(path)), mamba.cache.DEFAULT_DIR)
+
+    if directory not in _caches:
+        _caches[directory] = mamba.cache.ProgramCache(directory)
+
+    return _caches[directory]
+
+
+def run_script(path: str):
+    """
+    Runs a script in a clean environment of this worker's interpreter
+    """
+
+    output = io.StringIO()
+    status, error = 0, None
+    start = time.perf_counter()
+
+    try:
+        with open(path) as f:
+            source = f.read()
+
+        _interpreter.argv = [path]
+        _interpreter.reset()
+        _interpreter.cache = _cache_for(path) if _use_cache else None
+
+        with contextlib.redirect_stdout(output):
+            _interpreter.execute(source)
+    except Exception as e:
+        status, error = 1, e.__class__.__name__ + ': ' + str(e)
+
+    return Result(path, status, output.getvalue(), error, time.perf_counter() - start)
+
+
+def run_batch(paths: list, jobs: int=None, engine: str='tree', optimize: bool=True, use_cache: bool=True):
+    """
+    Runs the scripts across a pool of worker processes, yielding a Result for
+    each one in the order they were given
+    """
+
+    jobs = jobs or os.cpu_count() or 1
+
+    # hand scripts out in chunks, thousands of tiny scripts are otherwise dominated by the round trips
+    chunksize = max(1, len(paths) // (jobs * 8))
+
+    with concurrent.futures.ProcessPoolExecutor(jobs, initializer=_init_worker,
+                                                initargs=(engine, optimize, use_cache)) as executor:
+        yield from executor.map(run_script, paths, chunksize=chunksize)
+
+
+def main(argv: list):
+    parser = argparse.ArgumentParser(prog='mamba.py batch', description='Runs many Mamba scripts in parallel')
+    parser.add_argument('path', help='directory of .mb scripts or a manifest file listing them')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: all cores)')
+    parser.add_argument('-e', '--engine', choices=engines, default='tree')
+    parser.add_argument('-o', '--output', help='directory to write the output of each script to')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only report failures and the summary')
+    parser.add_argument('--no-optimize', dest='optimize', action='store_false')
+    parser.add_argument('--no-cache', dest='cache', action='store_false')
+    args = parser.parse_args(argv)
+
+    paths = collect(args.path)
+
+    # output files mirror the layout of the scripts below their common directory
+    common = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths]) if paths else ''
+    failed = 0
+    total = 0.0
+    start = time.perf_counter()
+
+    for result in run_batch(paths, args.jobs, args.engine, args.optimize, args.cache):
+        total += result.elapsed
+
+        if result.status:
+            failed += 1
+
+        if not args.quiet or result.status:
+            print('%-8s %8.3fs  %s' % ('ok' if result.status == 0 else 'FAILED', result.elapsed, result.path))
+
+        if result.error is not None:
+            print('    ' + result.error)
+
+        if args.output is not None:
+            name = os.path.splitext(os.path.relpath(os.path.abspath(result.path), common))[0] + '.out'
+            target = os.path.join(args.output, name)
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+            with open(target, 'w') as f:
+                f.write(result.output)
+
+    wall = time.perf_counter() - start
+
+    print('%d scripts, %d failed, %.3fs total script time in %.3fs' % (len(paths), failed, total, wall),
+          file=sys.stderr)
+
+    return 1 if failed else 0
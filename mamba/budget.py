@@ -0,0 +1,164 @@
+import itertools
+import sys
+import time
+from mamba.exceptions import *
+
+# Loop iterations and calls between two checks of the limits
+CHECK_INTERVAL = 1000
+
+# Items of a container looked at to estimate the size of the rest, and how deep containers are looked into
+SAMPLES = 8
+SAMPLE_DEPTH = 3
+
+# Small ints are shared by every container holding them, they're left out of the estimates
+_shared = (int, bool, type(None))
+
+
+def estimate(value, depth: int=SAMPLE_DEPTH) -> int:
+    """
+    Approximate size in bytes of the value and of what it holds. Containers
+    have a few of their items measured and the rest extrapolated from them,
+    so the cost doesn't depend on their size
+    """
+
+    size = sys.getsizeof(value)
+
+    if depth == 0 or not isinstance(value, (list, dict)) or not value:
+        return size
+
+    n = len(value)
+
+    if isinstance(value, list):
+        items = value if n <= SAMPLES else [value[i * n // SAMPLES] for i in range(SAMPLES)]
+    else:
+        items = list(itertools.chain.from_iterable(itertools.islice(value.items(), SAMPLES)))
+        n *= 2
+
+    distinct = {id(v): v for v in items if v.__class__ not in _shared}
+
+    if not distinct:
+        return size
+
+    measured = sum(estimate(v, depth - 1) for v in distinct.values())
+
+    if len(items) == n:
+        return size + measured
+
+    # items repeated among the samples are most likely the same few objects all along (a string pushed
+    # over and over), the number of different ones is extrapolated from the samples
+    k, d = len(items), len(distinct)
+
+    return size + measured * (1 + (n - 1) * (d - 1) // (k - 1)) // d
+
+
+class Budget:
+    """
+    Limits of a program run: steps (loop iterations and function calls),
+    seconds of wall time and bytes of memory, None for no limit. Exceeding
+    one stops the program with BudgetExceeded.
+
+    Every engine counts the steps in left and calls check() when it's used
+    up, every CHECK_INTERVAL steps, which looks at the clock and estimates
+    the size of the globals and of the variables of the running function
+    (see estimate). The memory estimate is rough, data only reachable from
+    the callers of the running function or held by generators isn't counted.
+
+    Each run of an interpreter starts counting over, a budget is meant for
+    one interpreter. cancel() stops the running program from another thread
+    at its next step
+    """
+
+    def __init__(self, steps: int=None, seconds: float=None, memory: int=None, interval: int=CHECK_INTERVAL):
+        self.steps = steps
+        self.seconds = seconds
+        self.memory = memory
+        self.interval = interval
+
+        # steps left before the next check
+        self.left = interval
+
+        # set by cancel(), cleared by the interpreter before each run
+        self.cancelled = False
+
+        self.__counted = 0
+        self.__granted = interval
+        self.__deadline = None
+        self.__table = None
+
+    def __repr__(self):
+        return '<Budget steps={0} seconds={1} memory={2} used={3}>'.format(self.steps, self.seconds, self.memory,
+                                                                           self.used)
+
+    @property
+    def used(self) -> int:
+        """
+        Steps taken since the run started
+        """
+        return self.__counted + self.__granted - self.left
+
+    def start(self, table):
+        """
+        Starts counting for a run against the symbol table
+        """
+
+        self.__counted = 0
+        self.__granted = self.left = 0
+        self.__table = table
+        self.__deadline = time.monotonic() + self.seconds if self.seconds is not None else None
+        self.__grant()
+
+    def __grant(self):
+        # the last grant stops at the limit so that the check comes right after the step exceeding it
+        granted = self.interval if self.steps is None else max(0, min(self.interval, self.steps - self.__counted))
+
+        self.left = self.__granted = granted
+
+    def copy(self) -> 'Budget':
+        """
+        A budget with the same limits and nothing counted
+        """
+        return Budget(self.steps, self.seconds, self.memory, self.interval)
+
+    def cancel(self):
+        """
+        Makes the next step of the running program check, which raises
+        KeyboardInterrupt on its thread. Programs waiting in a builtin (ask,
+        a blocking read) only stop once it returns
+        """
+
+        self.cancelled = True
+        self.left = 0
+
+    def check(self, local: list=None):
+        """
+        Checks the limits once the steps granted are used up, local is the
+        frame of the running function, the tree engine has it in the table
+        """
+
+        self.__counted += self.__granted - self.left
+        self.__granted = self.left = 0
+
+        if self.cancelled:
+            raise KeyboardInterrupt
+
+        if self.steps is not None and self.__counted > self.steps:
+            raise BudgetExceeded("Step limit of %d exceeded" % self.steps)
+
+        if self.__deadline is not None and time.monotonic() > self.__deadline:
+            raise BudgetExceeded("Time limit of %gs exceeded" % self.seconds)
+
+        if self.memory is not None and self.__table is not None:
+            if local is None and self.__table.frames():
+                local = self.__table.frames()[-1]
+
+            # every variable is measured, only what they hold is sampled
+            size = sum(estimate(v) for v in self.__table.globals())
+
+            if local is not None:
+                # the scope and the caller trail the variables of the frame
+                size += sum(estimate(v) for v in local[:-2])
+
+            if size > self.memory:
+                raise BudgetExceeded("Memory limit of %d bytes exceeded, about %d used" % (self.memory, size))
+
+        self.__grant()
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import pickle
+import sys
+import mamba.compiler
+
+# Bump whenever the syntax tree classes change in a way that breaks old pickles
+TREE_VERSION = 4
+
+# Entries written by another interpreter version, bytecode format or python are never read
+CACHE_TAG = '{0}-tree{1}-code{2}'.format(sys.implementation.cache_tag, TREE_VERSION, mamba.compiler.VERSION)
+
+DEFAULT_DIR = '__mambacache__'
+DEFAULT_MAX_SIZE = 32 * 1024 * 1024
+
+
+class ProgramCache:
+    """
+    On disk cache of parsed programs, similar to python's __pycache__.
+
+    Entries are keyed by a hash of the source and CACHE_TAG so editing the
+    script or upgrading the interpreter simply stops hitting old entries,
+    those are then evicted least recently used first once the directory
+    grows past max_size bytes.
+
+    Failing to read or write the cache is never an error, the program is
+    parsed as if there was no cache at all
+    """
+
+    tree_ext = '.tree'
+    code_ext = '.code'
+
+    def __init__(self, directory: str, max_size: int=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, source: str):
+        h = hashlib.sha256()
+        h.update(CACHE_TAG.encode())
+        h.update(b'\0')
+        h.update(source.encode('utf-8', 'surrogatepass'))
+
+        return h.hexdigest()
+
+    def path(self, source: str, ext: str):
+        return os.path.join(self.directory, self.key(source) + ext)
+
+    def __read(self, path: str, loads):
+        try:
+            with open(path, 'rb') as f:
+                value = loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # corrupt or incompatible entry, drop it
+            self.__remove(path)
+            return None
+
+        # keep recently used entries from being evicted
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return value
+
+    def __write(self, path: str, data: bytes):
+        # slow to import and only needed on cache misses
+        import tempfile
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+
+            # write to a temporary file first so readers never see partial entries
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+
+                os.replace(tmp, path)
+            except BaseException:
+                self.__remove(tmp)
+                raise
+        except OSError:
+            return
+
+        self.evict()
+
+    @staticmethod
+    def __remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def load_tree(self, source: str):
+        return self.__read(self.path(source, self.tree_ext), pickle.loads)
+
+    def store_tree(self, source: str, tree):
+        try:
+            data = pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, RecursionError):
+            # very deeply nested programs are simply not cached
+            return
+
+        self.__write(self.path(source, self.tree_ext), data)
+
+    def __code_path(self, source: str, optimized: bool):
+        return self.path(source, ('' if optimized else '.raw') + self.code_ext)
+
+    def load_code(self, source: str, optimized: bool=True):
+        return self.__read(self.__code_path(source, optimized), mamba.compiler.loads)
+
+    def store_code(self, source: str, code: mamba.compiler.Code, optimized: bool=True):
+        self.__write(self.__code_path(source, optimized), mamba.compiler.dumps(code))
+
+    def entries(self):
+        """
+        Returns (path, size, mtime) of every cache entry, oldest first
+        """
+
+        ret = []
+
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return ret
+
+        for name in names:
+            if not name.endswith((self.tree_ext, self.code_ext)):
+                continue
+
+            path = os.path.join(self.directory, name)
+
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+
+            ret.append((path, st.st_size, st.st_mtime))
+
+        ret.sort(key=lambda e: e[2])
+
+        return ret
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+
+        for path, size, _ in entries:
+            if total <= self.max_size:
+                break
+
+            self.__remove(path)
+            total -= size
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            self.__remove(path)
@@ -0,0 +1,940 @@
+import operator
+import mamba.ast as ast
+import mamba.strbuf
+import mamba.tasks
+from mamba.exceptions import *
+import mamba.symbol_table
+from mamba.symbol_table import UNSET
+
+# Statement closures return None when execution should carry on with the next
+# statement, or one of the values below when the enclosing block has to stop
+EXIT = object()
+
+# end marker of generators, see ClosureCompiler.__generate
+_exhausted = object()
+
+
+class _Return:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class _TailCall:
+    # ret f(...), the function is run by the calling loop in place of the current call
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, args: list):
+        self.func = func
+        self.args = args
+
+
+class CompiledFunction:
+    """
+    A user defined function whose body has been compiled to closures.
+    Stored in the symbol table in place of ast.Function
+    """
+
+    def __init__(self, node: ast.Function, body):
+        self.node = node
+        self.params = [p.name for p in node.params]
+        self.param_slots = node.param_slots
+        self.varnames = node.varnames
+        self.scope = node.scope
+        self.size = len(node.varnames)
+        self.body = body
+
+        # the body of generator functions is a python generator function
+        self.generator = node.is_generator
+
+        # when parameters take the first slots in order the arguments
+        # list only needs padding to become the local frame (see mamba.symbol_table.frame)
+        if self.param_slots == list(range(len(self.params))):
+            self.padding = [UNSET] * (self.size - len(self.params)) + [self.scope, None]
+        else:
+            self.padding = None
+
+    def __repr__(self):
+        return '<Compiled function params={0}>'.format(self.params)
+
+
+class ClosureCompiler:
+    """
+    Lowers the syntax tree returned by the parser into a tree of pre-bound
+    python closures. Everything the tree walker decides on every execution
+    (which operator to apply, whether an identifier is a function, whether
+    a statement result is an exit statement) is decided here once.
+
+    Every closure takes the list of local slots of the running call (see
+    mamba.scope, the tree has to be resolved against the same symbol table).
+    Expression closures return the value of the expression, statement closures
+    return None or a control flow signal (EXIT or a _Return instance).
+    """
+
+    __binary_operations = {
+        '+': operator.add,
+        '-': operator.sub,
+        '*': operator.mul,
+        '**': operator.pow,
+        '/': operator.truediv,
+        '%': operator.mod,
+
+        '>': operator.gt,
+        '>=': operator.ge,
+        '<': operator.lt,
+        '<=': operator.le,
+        '==': operator.eq,
+        '!=': operator.ne,
+
+        '&': operator.and_,
+        '|': operator.or_,
+        '^': operator.xor,
+        '>>': operator.rshift,
+        '<<': operator.lshift,
+    }
+
+    __compound_operations = {
+        '+=': operator.iadd,
+        '-=': operator.isub,
+        '/=': operator.itruediv,
+        '*=': operator.imul,
+        '%=': operator.imod,
+        '**=': operator.ipow,
+    }
+
+    __unary_operations = {
+        '+': operator.pos,
+        '-': operator.neg,
+        '~': operator.inv,
+        'not': operator.not_
+    }
+
+    # nodes which are statements, everything else is an expression
+    # whose value gets discarded when used as a statement
+    __statements = (
+        ast.If, ast.For, ast.ForIn, ast.While, ast.BufferedLoop, ast.ExitStatement, ast.PrintStatement,
+        ast.Assignment, ast.ArrayAssign, ast.ArraySliceAssign, ast.CompoundOperation
+    )
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+
+        # number of loops enclosing the node being compiled in the current function
+        self.__loops = 0
+        self.__in_function = False
+        self.__tail_calls = False
+
+        # active user function calls, functions declared by earlier programs count with the same calls
+        self.__depth = symbols.depth
+
+        symbols.call = self.compile_call()
+
+    def compile_program(self, tree: ast.InstructionList):
+        """
+        Compiles the top level statements and returns a callable executing them
+        """
+
+        statements = []
+
+        for node in tree:
+            if isinstance(node, ast.ReturnStatement):
+                # a top level return just evaluates its expression
+                statements.append(self.compile_expression(node.expr))
+            elif not isinstance(node, ast.ExitStatement):
+                statements.append(self.compile_statement(node))
+
+        def program():
+            # signals reaching the top level only stop the statement they were raised in,
+            # top level code only deals with globals so it runs without a frame
+            for s in statements:
+                s(None)
+
+        return program
+
+    def compile_expression(self, node):
+        method = getattr(self, '_compile_' + node.__class__.__name__, None)
+
+        if method is None:
+            raise InterpreterException("Unable to compile node %s" % node)
+
+        return method(node)
+
+    def compile_statement(self, node):
+        if isinstance(node, self.__statements):
+            return self.compile_expression(node)
+
+        expr = self.compile_expression(node)
+
+        def statement(frame):
+            expr(frame)
+
+        return statement
+
+    def compile_block(self, block: ast.InstructionList):
+        statements = [self.compile_statement(n) for n in block]
+
+        if len(statements) == 1:
+            return statements[0]
+
+        def run(frame):
+            for s in statements:
+                r = s(frame)
+
+                if r is not None:
+                    return r
+
+        return run
+
+    def compile_values(self, values: ast.InstructionList):
+        """
+        Compiles a list of expressions into a callable returning their values,
+        None values are dropped just as InstructionList.eval does
+        """
+
+        items = [self.compile_expression(n) for n in values]
+
+        def run(frame):
+            ret = []
+            for f in items:
+                v = f(frame)
+                if v is not None:
+                    ret.append(v)
+
+            return ret
+
+        return run
+
+    def compile_loop_body(self, body: ast.InstructionList):
+        self.__loops += 1
+
+        try:
+            return self.compile_block(body)
+        finally:
+            self.__loops -= 1
+
+    def compile_assign(self, identifier: ast.Identifier):
+        """
+        Returns a callable storing a value (in the passed frame for locals)
+        """
+
+        slot = identifier.slot
+
+        if identifier.local:
+            def assign_local(frame, value):
+                frame[slot] = value
+
+            return assign_local
+
+        values = self.symbols.globals()
+
+        def assign_global(frame, value):
+            values[slot] = value
+
+        return assign_global
+
+    def _compile_Primitive(self, node: ast.Primitive):
+        value = node.value
+        return lambda frame: value
+
+    def _compile_Identifier(self, node: ast.Identifier):
+        slot = node.slot
+        name = node.name
+        load_dynamic = self.symbols.load_dynamic
+
+        if node.local:
+            def load_local(frame):
+                value = frame[slot]
+
+                # locals read before being assigned in the call see the variable of the same name of the callers
+                if value is UNSET:
+                    return load_dynamic(frame[-1], name)
+
+                return value
+
+            return load_local
+
+        if node.outer is not None:
+            load_outer = self.symbols.load_outer
+            outer = node.outer
+
+            return lambda frame: load_outer(frame, outer, name)
+
+        values = self.symbols.globals()
+
+        if node.free:
+            local_names = self.symbols.local_names
+
+            def load_free(frame):
+                if name in local_names:
+                    return load_dynamic(frame[-1], name)
+
+                value = values[slot]
+
+                if value is UNSET:
+                    raise SymbolNotFound("Undefined variable '%s'" % name)
+
+                return value
+
+            return load_free
+
+        def load_global(frame):
+            value = values[slot]
+
+            if value is UNSET:
+                raise SymbolNotFound("Undefined variable '%s'" % name)
+
+            return value
+
+        return load_global
+
+    def _compile_ExitStatement(self, node):
+        return lambda frame: EXIT
+
+    def _compile_ReturnStatement(self, node: ast.ReturnStatement):
+        # inside loops a return statement only breaks out of the loop, same as exit
+        if self.__loops or not self.__in_function:
+            return lambda frame: EXIT
+
+        if self.__tail_calls and node.expr.__class__ is ast.FunctionCall:
+            return self.compile_tail_call(node.expr)
+
+        expr = self.compile_expression(node.expr)
+
+        return lambda frame: _Return(expr(frame))
+
+    def _compile_Array(self, node: ast.Array):
+        return self.compile_values(node.values)
+
+    def _compile_Map(self, node: ast.Map):
+        items = [(self.compile_expression(k), self.compile_expression(v)) for k, v in zip(node.keys, node.values)]
+
+        return lambda frame: {k(frame): v(frame) for k, v in items}
+
+    def _compile_ArrayAccess(self, node: ast.ArrayAccess):
+        array = self.compile_expression(node.array)
+        index = self.compile_expression(node.index)
+
+        return lambda frame: array(frame)[index(frame)]
+
+    def _compile_ArrayAssign(self, node: ast.ArrayAssign):
+        array = self.compile_expression(node.array)
+        index = self.compile_expression(node.index)
+        value = self.compile_expression(node.value)
+
+        def run(frame):
+            array(frame)[index(frame)] = value(frame)
+
+        return run
+
+    def _compile_ArraySlice(self, node: ast.ArraySlice):
+        array = self.compile_expression(node.array)
+
+        if node.start is not None and node.end is not None:
+            start = self.compile_expression(node.start)
+            end = self.compile_expression(node.end)
+            return lambda frame: array(frame)[start(frame):end(frame)]
+        elif node.start is None and node.end is not None:
+            end = self.compile_expression(node.end)
+            return lambda frame: array(frame)[:end(frame)]
+        elif node.start is not None and node.end is None:
+            start = self.compile_expression(node.start)
+            return lambda frame: array(frame)[start(frame):]
+
+        return lambda frame: array(frame)[:]
+
+    def _compile_ArraySliceAssign(self, node: ast.ArraySliceAssign):
+        array = self.compile_expression(node.array)
+        value = self.compile_expression(node.value)
+        start = self.compile_expression(node.start) if node.start is not None else lambda frame: None
+        end = self.compile_expression(node.end) if node.end is not None else lambda frame: None
+
+        def run(frame):
+            v = value(frame)
+            array(frame)[start(frame):end(frame)] = v
+
+        return run
+
+    def _compile_Assignment(self, node: ast.Assignment):
+        if node.identifier.is_function:
+            set_func = self.symbols.set_func
+            local_names = self.symbols.local_names
+            name = node.identifier.name
+            func = self.compile_function(node.val)
+
+            if node.val.memo:
+                call = self.compile_call()
+                params = len(func.params)
+
+                def declare(frame):
+                    local_names.update(func.varnames)
+                    set_func(name, ast.BuiltInFunction(ast.Memo(name, params, lambda args: call(func, args))))
+
+                return declare
+
+            def declare(frame):
+                local_names.update(func.varnames)
+                set_func(name, func)
+
+            return declare
+
+        assign = self.compile_assign(node.identifier)
+        value = self.compile_expression(node.val)
+
+        def run(frame):
+            assign(frame, value(frame))
+
+        return run
+
+    def _compile_BinaryOperation(self, node: ast.BinaryOperation):
+        left = self.compile_expression(node.left)
+        right = self.compile_expression(node.right)
+
+        # boolean operators short circuit and return one of the operands
+        if node.op == 'and':
+            return lambda frame: left(frame) and right(frame)
+        elif node.op == 'or':
+            return lambda frame: left(frame) or right(frame)
+
+        op = self.__binary_operations[node.op]
+        symbol = node.op
+
+        def fail(l, r):
+            fmt = (l.__class__.__name__, l, symbol, r.__class__.__name__, r)
+            return InterpreterRuntimeError("Unable to apply operation (%s: %s) %s (%s: %s)" % fmt)
+
+        if isinstance(node.right, ast.Primitive):
+            # very common case (i + 1, n * 2) skip a call for the right operand
+            constant = node.right.value
+
+            def run_constant(frame):
+                l = left(frame)
+                try:
+                    return op(l, constant)
+                except TypeError:
+                    raise fail(l, constant)
+
+            return run_constant
+
+        def run(frame):
+            l = left(frame)
+            r = right(frame)
+            try:
+                return op(l, r)
+            except TypeError:
+                raise fail(l, r)
+
+        return run
+
+    def _compile_CompoundOperation(self, node: ast.CompoundOperation):
+        get = self.compile_expression(node.identifier)
+        assign = self.compile_assign(node.identifier)
+        modifier = self.compile_expression(node.modifier)
+        op = self.__compound_operations[node.operation]
+        symbol = node.operation
+
+        def run(frame):
+            l = get(frame)
+            r = modifier(frame)
+
+            try:
+                assign(frame, op(l, r))
+            except TypeError:
+                fmt = (l.__class__.__name__, l, symbol, r.__class__.__name__, r)
+                raise InterpreterRuntimeError("Unable to apply operation (%s: %s) %s (%s: %s)" % fmt)
+
+        return run
+
+    def _compile_Concatenation(self, node: ast.Concatenation):
+        get = self.compile_expression(node.identifier)
+        assign = self.compile_assign(node.identifier)
+        modifier = self.compile_expression(node.modifier)
+        concat = mamba.strbuf.concat
+
+        def run(frame):
+            assign(frame, concat(get(frame), modifier(frame)))
+
+        return run
+
+    def _compile_UnaryOperation(self, node: ast.UnaryOperation):
+        op = self.__unary_operations[node.operation]
+        expr = self.compile_expression(node.expr)
+
+        return lambda frame: op(expr(frame))
+
+    def _compile_If(self, node: ast.If):
+        condition = self.compile_expression(node.condition)
+        truepart = self.compile_block(node.truepart)
+
+        if node.elsepart is None:
+            def run_if(frame):
+                if condition(frame):
+                    return truepart(frame)
+
+            return run_if
+
+        # else if chains store the nested If directly as the else part
+        if isinstance(node.elsepart, ast.InstructionList):
+            elsepart = self.compile_block(node.elsepart)
+        else:
+            elsepart = self.compile_statement(node.elsepart)
+
+        def run_if_else(frame):
+            if condition(frame):
+                return truepart(frame)
+
+            return elsepart(frame)
+
+        return run_if_else
+
+    def _compile_For(self, node: ast.For):
+        assign = self.compile_assign(node.variable)
+        start = self.compile_expression(node.start)
+        end = self.compile_expression(node.end)
+        body = self.compile_loop_body(node.body)
+        sign = 1 if node.asc else -1
+        budget = self.symbols.budget
+
+        def run(frame):
+            lo = start(frame)
+            hi = end(frame) + sign
+
+            for i in range(lo, hi, sign):
+                budget.left -= 1
+
+                if budget.left < 0:
+                    budget.check(frame)
+
+                assign(frame, i)
+
+                if body(frame) is not None:
+                    break
+
+        return run
+
+    def _compile_ForIn(self, node: ast.ForIn):
+        assign = self.compile_assign(node.variable)
+        sequence = self.compile_expression(node.sequence)
+        body = self.compile_loop_body(node.body)
+        budget = self.symbols.budget
+
+        def run(frame):
+            for i in sequence(frame):
+                budget.left -= 1
+
+                if budget.left < 0:
+                    budget.check(frame)
+
+                assign(frame, i)
+
+                if body(frame) is not None:
+                    break
+
+        return run
+
+    def _compile_While(self, node: ast.While):
+        condition = self.compile_expression(node.condition)
+        body = self.compile_loop_body(node.body)
+        budget = self.symbols.budget
+
+        if isinstance(node.condition, ast.Primitive) and node.condition.value:
+            # infinite loops (for { }) do not need to test their condition
+            def run_forever(frame):
+                while True:
+                    budget.left -= 1
+
+                    if budget.left < 0:
+                        budget.check(frame)
+
+                    if body(frame) is not None:
+                        break
+
+            return run_forever
+
+        def run(frame):
+            while condition(frame):
+                budget.left -= 1
+
+                if budget.left < 0:
+                    budget.check(frame)
+
+                if body(frame) is not None:
+                    break
+
+        return run
+
+    def _compile_BufferedLoop(self, node: ast.BufferedLoop):
+        loop = self.compile_statement(node.loop)
+        local = [v.slot for v in node.variables if v.local]
+        globals_ = [v.slot for v in node.variables if not v.local]
+        values = self.symbols.globals()
+        builder = mamba.strbuf.Builder
+
+        def run(frame):
+            try:
+                return loop(frame)
+            finally:
+                # unassigned slots and variables the loop didn't append strings to are left alone
+                for slot in local:
+                    if frame[slot].__class__ is builder:
+                        frame[slot] = frame[slot].value()
+
+                for slot in globals_:
+                    if values[slot].__class__ is builder:
+                        values[slot] = values[slot].value()
+
+        return run
+
+    def _compile_PrintStatement(self, node: ast.PrintStatement):
+        items = self.compile_values(node.items)
+        output = ast.output
+
+        def run(frame):
+            print(*items(frame), end='', sep='', file=output.get())
+
+        return run
+
+    def compile_binding(self, node: ast.FunctionCall):
+        """
+        Returns the inline cache of a call site, a list holding the called function
+        once bound, and the function binding it: looking the function up and
+        checking the number of arguments. Functions can't be redeclared and the
+        compiled program only runs against this symbol table, so that happens once
+        """
+
+        get_func = self.symbols.get_func
+        name = node.name.name
+        argc = len(node.params)
+        bound = [None]
+
+        def bind():
+            func = get_func(name)
+
+            if not isinstance(func, ast.BuiltInFunction) and len(func.params) != argc:
+                msg = "Invalid number of arguments for function {0}. Expected {1} got {2}"
+                raise InvalidParamCount(msg.format(name, len(func.params), argc))
+
+            bound[0] = func
+            return func
+
+        return bound, bind
+
+    def _compile_FunctionCall(self, node: ast.FunctionCall):
+        bound, bind = self.compile_binding(node)
+        params = [self.compile_expression(p) for p in node.params]
+        call = self.compile_call()
+        builtin = ast.BuiltInFunction
+
+        def run(frame):
+            func = bound[0]
+
+            if func is None:
+                func = bind()
+
+            if func.__class__ is builtin:
+                return func.func(*[p(frame) for p in params])
+
+            return call(func, [p(frame) for p in params], frame)
+
+        return run
+
+    def _compile_Spawn(self, node: ast.Spawn):
+        bound, bind = self.compile_binding(node.call)
+        params = [self.compile_expression(p) for p in node.call.params]
+        call = self.compile_call()
+        builtin = ast.BuiltInFunction
+        spawn, done = mamba.tasks.spawn, mamba.tasks.done
+
+        def run(frame):
+            func = bound[0]
+
+            if func is None:
+                func = bind()
+
+            args = [p(frame) for p in params]
+
+            if func.__class__ is not builtin:
+                return done(call(func, args, frame))
+
+            # Mamba code only runs on the program's thread
+            if func.runs_code:
+                return done(func.func(*args))
+
+            return spawn(func.func, args)
+
+        return run
+
+    def _compile_Await(self, node: ast.Await):
+        expr = self.compile_expression(node.expr)
+        wait = mamba.tasks.wait
+
+        return lambda frame: wait(expr(frame))
+
+    def compile_tail_call(self, node: ast.FunctionCall):
+        """
+        Compiles ret f(...) into a statement returning a _TailCall for the loop
+        in compile_call to run, builtins and generators are called right away
+        """
+
+        bound, bind = self.compile_binding(node)
+        params = [self.compile_expression(p) for p in node.params]
+        call = self.compile_call()
+        builtin = ast.BuiltInFunction
+
+        def run(frame):
+            func = bound[0]
+
+            if func is None:
+                func = bind()
+
+            if func.__class__ is builtin:
+                return _Return(func.func(*[p(frame) for p in params]))
+
+            if func.generator:
+                return _Return(call(func, [p(frame) for p in params], frame))
+
+            return _TailCall(func, [p(frame) for p in params])
+
+        return run
+
+    def compile_call(self):
+        """
+        Returns a callable invoking a compiled function with already evaluated arguments
+        """
+
+        depth = self.__depth
+        symbols = self.symbols
+        max_depth = symbols.max_depth
+        budget = symbols.budget
+        stack = symbols.stack
+        link_tail_call = mamba.symbol_table.link_tail_call
+
+        def call(func: CompiledFunction, args: list, caller: list = None):
+            if depth[0] >= max_depth:
+                raise symbols.depth_exceeded()
+
+            depth[0] += 1
+            replaced = None
+
+            try:
+                while True:
+                    if func.padding is not None:
+                        frame = args + func.padding
+                        frame[-1] = caller
+                    else:
+                        frame = mamba.symbol_table.frame(func.size, func.scope, caller)
+
+                        for slot, v in zip(func.param_slots, args):
+                            frame[slot] = v
+
+                    if replaced is not None:
+                        link_tail_call(replaced, frame)
+
+                    budget.left -= 1
+
+                    if budget.left < 0:
+                        budget.check(frame)
+
+                    if func.generator:
+                        return self.__generate(func.body(frame))
+
+                    # a segment's worth of calls deep the call goes on on the next one, see mamba.stack
+                    if depth[0] // stack.calls > stack.level:
+                        ret = stack.call(func.body, frame)
+                    else:
+                        ret = func.body(frame)
+
+                    if ret.__class__ is _Return:
+                        return ret.value
+                    elif ret.__class__ is not _TailCall:
+                        return None
+
+                    func, args = ret.func, ret.args
+                    replaced = frame
+            finally:
+                depth[0] -= 1
+
+        return call
+
+    def __generate(self, body):
+        # generators nest in the consumer while they run, which counts as a call like in the other engines
+        depth = self.__depth
+        symbols = self.symbols
+        stack = symbols.stack
+
+        while True:
+            if depth[0] >= symbols.max_depth:
+                raise symbols.depth_exceeded()
+
+            depth[0] += 1
+
+            try:
+                if depth[0] // stack.calls > stack.level:
+                    value = stack.call(next, body, _exhausted)
+                else:
+                    value = next(body, _exhausted)
+            finally:
+                depth[0] -= 1
+
+            if value is _exhausted:
+                return
+
+            yield value
+
+    def compile_function(self, node: ast.Function):
+        outer = (self.__loops, self.__in_function, self.__tail_calls)
+
+        # the return value of generators is not produced, their tail calls are evaluated in place
+        self.__loops, self.__in_function, self.__tail_calls = 0, True, not node.is_generator
+
+        try:
+            body = self.compile_gen_block(node.body) if node.is_generator else self.compile_block(node.body)
+        finally:
+            self.__loops, self.__in_function, self.__tail_calls = outer
+
+        return CompiledFunction(node, body)
+
+    # Generator function bodies: statements which contain a yield compile to python
+    # generator functions, yielding the values and returning the signal like statement
+    # closures do, the enclosing blocks delegate to them with yield from
+
+    def compile_gen_statement(self, node):
+        """
+        Returns the compiled statement and whether it's a generator
+        """
+
+        if not ast.contains_yield(node):
+            return self.compile_statement(node), False
+
+        return getattr(self, '_compile_gen_' + node.__class__.__name__)(node), True
+
+    def compile_gen_block(self, block: ast.InstructionList):
+        statements = [self.compile_gen_statement(n) for n in block]
+
+        def run(frame):
+            for s, suspends in statements:
+                r = (yield from s(frame)) if suspends else s(frame)
+
+                if r is not None:
+                    return r
+
+        return run
+
+    def compile_gen_loop_body(self, body: ast.InstructionList):
+        self.__loops += 1
+
+        try:
+            return self.compile_gen_block(body)
+        finally:
+            self.__loops -= 1
+
+    def _compile_gen_Yield(self, node: ast.Yield):
+        expr = self.compile_expression(node.expr)
+
+        def run(frame):
+            yield expr(frame)
+
+        return run
+
+    def _compile_gen_If(self, node: ast.If):
+        condition = self.compile_expression(node.condition)
+        truepart = self.compile_gen_block(node.truepart)
+
+        if node.elsepart is None:
+            elsepart = None
+        elif isinstance(node.elsepart, ast.InstructionList):
+            elsepart = self.compile_gen_block(node.elsepart)
+        else:
+            elsepart = self._compile_gen_If(node.elsepart)
+
+        def run(frame):
+            if condition(frame):
+                return (yield from truepart(frame))
+            elif elsepart is not None:
+                return (yield from elsepart(frame))
+
+        return run
+
+    def _compile_gen_For(self, node: ast.For):
+        assign = self.compile_assign(node.variable)
+        start = self.compile_expression(node.start)
+        end = self.compile_expression(node.end)
+        body = self.compile_gen_loop_body(node.body)
+        sign = 1 if node.asc else -1
+        budget = self.symbols.budget
+
+        def run(frame):
+            for i in range(start(frame), end(frame) + sign, sign):
+                budget.left -= 1
+
+                if budget.left < 0:
+                    budget.check(frame)
+
+                assign(frame, i)
+
+                if (yield from body(frame)) is not None:
+                    break
+
+        return run
+
+    def _compile_gen_ForIn(self, node: ast.ForIn):
+        assign = self.compile_assign(node.variable)
+        sequence = self.compile_expression(node.sequence)
+        body = self.compile_gen_loop_body(node.body)
+        budget = self.symbols.budget
+
+        def run(frame):
+            for i in sequence(frame):
+                budget.left -= 1
+
+                if budget.left < 0:
+                    budget.check(frame)
+
+                assign(frame, i)
+
+                if (yield from body(frame)) is not None:
+                    break
+
+        return run
+
+    def _compile_gen_While(self, node: ast.While):
+        condition = self.compile_expression(node.condition)
+        body = self.compile_gen_loop_body(node.body)
+        budget = self.symbols.budget
+
+        def run(frame):
+            while condition(frame):
+                budget.left -= 1
+
+                if budget.left < 0:
+                    budget.check(frame)
+
+                if (yield from body(frame)) is not None:
+                    break
+
+        return run
+
+    def _compile_InExpression(self, node: ast.InExpression):
+        a = self.compile_expression(node.a)
+        b = self.compile_expression(node.b)
+
+        if node.not_in:
+            return lambda frame: a(frame) not in b(frame)
+
+        return lambda frame: a(frame) in b(frame)
+
+    def _compile_TernaryOperator(self, node: ast.TernaryOperator):
+        cond = self.compile_expression(node.cond)
+        trueval = self.compile_expression(node.trueval)
+        falseval = self.compile_expression(node.falseval)
+
+        return lambda frame: trueval(frame) if cond(frame) else falseval(frame)
+
+
+def compile_program(tree: ast.InstructionList, symbols):
+    """
+    Compiles the parsed and resolved program against the given
+    symbol table and returns a callable executing it
+    """
+
+    return ClosureCompiler(symbols).compile_program(tree)
@@ -0,0 +1,547 @@
+import array
+import marshal
+import mamba.ast as ast
+import mamba.scope
+from mamba.exceptions import *
+
+# Bytecode format version, bump whenever opcodes or the serialized layout change
+VERSION = 11
+
+# Every instruction is an (opcode, argument) pair of integers
+LOAD_CONST = 1
+LOAD_GLOBAL = 2
+STORE_GLOBAL = 3
+POP = 4
+BINARY_OP = 5
+INPLACE_OP = 6
+UNARY_OP = 7
+JUMP = 8
+JUMP_IF_FALSE = 9
+JUMP_IF_FALSE_OR_POP = 10
+JUMP_IF_TRUE_OR_POP = 11
+BUILD_LIST = 12
+SUBSCR = 13
+STORE_SUBSCR = 14
+SLICE = 15
+CONTAINS = 16
+PRINT = 17
+LOAD_FUNC = 18
+CALL = 19
+DECLARE_FUNC = 20
+RETURN = 21
+RETURN_NONE = 22
+MAKE_RANGE = 23
+GET_ITER = 24
+FOR_ITER = 25
+BREAK_ITER = 26
+LOAD_LOCAL = 27
+STORE_LOCAL = 28
+YIELD_VALUE = 29
+BUILD_MAP = 30
+TAIL_CALL = 31
+SPAWN = 32
+AWAIT = 33
+LOOP = 34
+CONCAT = 35
+FLUSH_LOCAL = 36
+FLUSH_GLOBAL = 37
+STORE_SLICE = 38
+LOAD_FREE = 39
+LOAD_OUTER = 40
+
+opnames = {v: k for k, v in globals().items() if k.isupper() and isinstance(v, int) and k != 'VERSION'}
+
+# operators are referenced by their index in these tuples
+binary_operators = ('+', '-', '*', '**', '/', '%', '>', '>=', '<', '<=', '==', '!=', '&', '|', '^', '>>', '<<')
+inplace_operators = ('+=', '-=', '/=', '*=', '%=', '**=')
+unary_operators = ('+', '-', '~', 'not')
+
+# SLICE and STORE_SLICE argument flags
+SLICE_START = 1
+SLICE_END = 2
+
+
+class Code:
+    """
+    A compiled unit, either the program itself or a function body.
+
+    Instructions are stored in a flat integer array, arguments index
+    into the constant pool, the global name table, the local slots
+    (named by varnames) or the nested function list. Functions link
+    to the code they are declared in by outer
+    """
+
+    def __init__(self, name: str='<program>', params: list=None, varnames: list=None, param_slots: list=None,
+                 generator: bool=False, memo: bool=False):
+        self.name = name
+        self.generator = generator
+        self.memo = memo
+        self.params = params if params is not None else []
+        self.varnames = varnames if varnames is not None else []
+        self.param_slots = param_slots if param_slots is not None else []
+        self.scope = {n: i for i, n in enumerate(self.varnames)}
+        self.outer = None
+        self.ops = array.array('i')
+        self.consts = []
+        self.names = []
+        self.functions = []
+
+    def __repr__(self):
+        kind = 'Generator' if self.generator else 'Memo' if self.memo else 'Code'
+        return '<{0} {1} params={2} size={3}>'.format(kind, self.name, self.params, len(self.ops) // 2)
+
+    def to_tuple(self):
+        return (
+            self.name,
+            tuple(self.params),
+            tuple(self.varnames),
+            tuple(self.param_slots),
+            self.generator,
+            self.memo,
+            self.ops.tobytes(),
+            tuple(self.consts),
+            tuple(self.names),
+            tuple(f.to_tuple() for f in self.functions)
+        )
+
+    @classmethod
+    def from_tuple(cls, t):
+        name, params, varnames, param_slots, generator, memo, ops, consts, names, functions = t
+
+        code = cls(name, list(params), list(varnames), list(param_slots), generator, memo)
+        code.ops.frombytes(ops)
+        code.consts = list(consts)
+        code.names = list(names)
+        code.functions = [cls.from_tuple(f) for f in functions]
+
+        for f in code.functions:
+            f.outer = code
+
+        return code
+
+
+def dumps(code: Code) -> bytes:
+    return marshal.dumps((VERSION, code.to_tuple()))
+
+
+def loads(data: bytes) -> Code:
+    version, t = marshal.loads(data)
+
+    if version != VERSION:
+        raise InterpreterException("Incompatible bytecode version %s, expected %s" % (version, VERSION))
+
+    return Code.from_tuple(t)
+
+
+def disassemble(code: Code, indent: str=''):
+    """
+    Returns a human readable listing of the code and its nested functions
+    """
+
+    lines = ['{0}{1}'.format(indent, code)]
+
+    for pc in range(0, len(code.ops), 2):
+        op, arg = code.ops[pc], code.ops[pc + 1]
+        name = opnames[op]
+
+        if op in (LOAD_CONST, LOAD_FUNC, LOAD_OUTER):
+            detail = repr(code.consts[arg])
+        elif op in (LOAD_GLOBAL, STORE_GLOBAL, FLUSH_GLOBAL, LOAD_FREE):
+            detail = code.names[arg]
+        elif op in (LOAD_LOCAL, STORE_LOCAL, FLUSH_LOCAL):
+            detail = code.varnames[arg]
+        elif op == BINARY_OP:
+            detail = binary_operators[arg]
+        elif op == INPLACE_OP:
+            detail = inplace_operators[arg]
+        elif op == UNARY_OP:
+            detail = unary_operators[arg]
+        elif op == DECLARE_FUNC:
+            detail = code.functions[arg].name
+        else:
+            detail = arg
+
+        lines.append('{0}{1:>6} {2:<22}{3}'.format(indent, pc, name, detail))
+
+    for f in code.functions:
+        lines.append(disassemble(f, indent + '    '))
+
+    return '\n'.join(lines)
+
+
+class Compiler:
+    """
+    Lowers the syntax tree into bytecode for mamba.vm.
+
+    Exit statements (and return statements, which behave the same way inside
+    loops) compile to jumps to the end of the innermost loop, or to the end of
+    the top level statement they are found in when outside of any loop
+    """
+
+    # nodes which are statements, everything else is an expression
+    # whose value gets popped when used as a statement
+    __statements = (
+        ast.If, ast.For, ast.ForIn, ast.While, ast.BufferedLoop, ast.ExitStatement, ast.ReturnStatement,
+        ast.PrintStatement, ast.Assignment, ast.ArrayAssign, ast.ArraySliceAssign, ast.CompoundOperation, ast.Yield
+    )
+
+    def __init__(self):
+        self.code = None
+
+        # exit targets, a list of (jump positions to patch, pops iterator) tuples
+        self.__exits = []
+        self.__in_function = False
+
+    def compile_program(self, tree: ast.InstructionList) -> Code:
+        # locals get their slots, globals are linked to the symbol table by name when executed
+        mamba.scope.resolve(tree)
+
+        self.code = Code()
+
+        for node in tree:
+            if isinstance(node, ast.ReturnStatement):
+                # a top level return just evaluates its expression
+                self.compile_expression(node.expr)
+                self.emit(POP)
+            elif not isinstance(node, ast.ExitStatement):
+                # exit signals only stop the top level statement they were raised in
+                self.__exits.append(([], False))
+                self.compile_statement(node)
+                self.patch_exits(self.__exits.pop())
+
+        self.emit(RETURN_NONE)
+
+        return self.code
+
+    def emit(self, op: int, arg: int=0):
+        """
+        Appends an instruction returning its position
+        """
+
+        self.code.ops.append(op)
+        self.code.ops.append(arg)
+
+        return len(self.code.ops) - 2
+
+    def position(self):
+        return len(self.code.ops)
+
+    def patch(self, pc: int, target: int=None):
+        self.code.ops[pc + 1] = self.position() if target is None else target
+
+    def patch_exits(self, exits):
+        for pc in exits[0]:
+            self.patch(pc)
+
+    def const(self, value):
+        # bools and ints compare equal, keep them apart
+        for i, c in enumerate(self.code.consts):
+            if c.__class__ is value.__class__ and c == value:
+                return i
+
+        self.code.consts.append(value)
+        return len(self.code.consts) - 1
+
+    def name(self, name: str):
+        if name not in self.code.names:
+            self.code.names.append(name)
+
+        return self.code.names.index(name)
+
+    def compile_expression(self, node):
+        method = getattr(self, '_compile_' + node.__class__.__name__, None)
+
+        if method is None:
+            raise InterpreterException("Unable to compile node %s" % node)
+
+        method(node)
+
+    def compile_statement(self, node):
+        self.compile_expression(node)
+
+        if not isinstance(node, self.__statements):
+            self.emit(POP)
+
+    def compile_block(self, block: ast.InstructionList):
+        for node in block:
+            self.compile_statement(node)
+
+    def compile_loop_body(self, body: ast.InstructionList, pops_iterator: bool):
+        exits = ([], pops_iterator)
+
+        self.__exits.append(exits)
+        self.compile_block(body)
+        self.__exits.pop()
+
+        return exits
+
+    def _compile_Primitive(self, node: ast.Primitive):
+        self.emit(LOAD_CONST, self.const(node.value))
+
+    def _compile_Identifier(self, node: ast.Identifier):
+        if node.local:
+            self.emit(LOAD_LOCAL, node.slot)
+        elif node.outer is not None:
+            depth, _, slot = node.outer
+            self.emit(LOAD_OUTER, self.const((node.name, depth, slot)))
+        elif node.free:
+            self.emit(LOAD_FREE, self.name(node.name))
+        else:
+            self.emit(LOAD_GLOBAL, self.name(node.name))
+
+    def compile_store(self, identifier: ast.Identifier):
+        if identifier.local:
+            self.emit(STORE_LOCAL, identifier.slot)
+        else:
+            self.emit(STORE_GLOBAL, self.name(identifier.name))
+
+    def _compile_ExitStatement(self, node):
+        if self.__exits:
+            jumps, pops_iterator = self.__exits[-1]
+            jumps.append(self.emit(BREAK_ITER if pops_iterator else JUMP))
+        else:
+            # not inside any loop of the function
+            self.emit(RETURN_NONE)
+
+    def _compile_ReturnStatement(self, node: ast.ReturnStatement):
+        # inside loops a return statement only breaks out of the loop, same as exit
+        if self.__exits or not self.__in_function:
+            return self._compile_ExitStatement(node)
+
+        # the return value of generators is not produced, their tail calls are evaluated in place
+        if node.expr.__class__ is ast.FunctionCall and not self.code.generator:
+            self._compile_FunctionCall(node.expr, TAIL_CALL)
+            return
+
+        self.compile_expression(node.expr)
+        self.emit(RETURN)
+
+    def _compile_Yield(self, node: ast.Yield):
+        # hands the value to whoever resumed the generator, see mamba.vm.Generator
+        self.compile_expression(node.expr)
+        self.emit(YIELD_VALUE)
+
+    def _compile_Array(self, node: ast.Array):
+        for n in node.values:
+            self.compile_expression(n)
+
+        self.emit(BUILD_LIST, len(node.values))
+
+    def _compile_Map(self, node: ast.Map):
+        for k, v in zip(node.keys, node.values):
+            self.compile_expression(k)
+            self.compile_expression(v)
+
+        self.emit(BUILD_MAP, len(node.keys))
+
+    def _compile_ArrayAccess(self, node: ast.ArrayAccess):
+        self.compile_expression(node.array)
+        self.compile_expression(node.index)
+        self.emit(SUBSCR)
+
+    def _compile_ArrayAssign(self, node: ast.ArrayAssign):
+        # same evaluation order as python's a[i] = v
+        self.compile_expression(node.value)
+        self.compile_expression(node.array)
+        self.compile_expression(node.index)
+        self.emit(STORE_SUBSCR)
+
+    def _compile_ArraySlice(self, node: ast.ArraySlice):
+        flags = 0
+        self.compile_expression(node.array)
+
+        if node.start is not None:
+            self.compile_expression(node.start)
+            flags |= SLICE_START
+
+        if node.end is not None:
+            self.compile_expression(node.end)
+            flags |= SLICE_END
+
+        self.emit(SLICE, flags)
+
+    def _compile_ArraySliceAssign(self, node: ast.ArraySliceAssign):
+        # same evaluation order as python's a[i:j] = v
+        flags = 0
+        self.compile_expression(node.value)
+        self.compile_expression(node.array)
+
+        if node.start is not None:
+            self.compile_expression(node.start)
+            flags |= SLICE_START
+
+        if node.end is not None:
+            self.compile_expression(node.end)
+            flags |= SLICE_END
+
+        self.emit(STORE_SLICE, flags)
+
+    def _compile_Assignment(self, node: ast.Assignment):
+        if node.identifier.is_function:
+            self.emit(DECLARE_FUNC, self.compile_function(node.identifier.name, node.val))
+        else:
+            self.compile_expression(node.val)
+            self.compile_store(node.identifier)
+
+    def _compile_BinaryOperation(self, node: ast.BinaryOperation):
+        self.compile_expression(node.left)
+
+        # boolean operators short circuit and leave one of the operands on the stack
+        if node.op in ('and', 'or'):
+            jump = self.emit(JUMP_IF_FALSE_OR_POP if node.op == 'and' else JUMP_IF_TRUE_OR_POP)
+            self.compile_expression(node.right)
+            self.patch(jump)
+        else:
+            self.compile_expression(node.right)
+            self.emit(BINARY_OP, binary_operators.index(node.op))
+
+    def _compile_CompoundOperation(self, node: ast.CompoundOperation):
+        self.compile_expression(node.identifier)
+        self.compile_expression(node.modifier)
+        self.emit(INPLACE_OP, inplace_operators.index(node.operation))
+        self.compile_store(node.identifier)
+
+    def _compile_Concatenation(self, node: ast.Concatenation):
+        self.compile_expression(node.identifier)
+        self.compile_expression(node.modifier)
+        self.emit(CONCAT)
+        self.compile_store(node.identifier)
+
+    def _compile_UnaryOperation(self, node: ast.UnaryOperation):
+        self.compile_expression(node.expr)
+        self.emit(UNARY_OP, unary_operators.index(node.operation))
+
+    def _compile_If(self, node: ast.If):
+        self.compile_expression(node.condition)
+        jump_else = self.emit(JUMP_IF_FALSE)
+        self.compile_block(node.truepart)
+
+        if node.elsepart is None:
+            self.patch(jump_else)
+            return
+
+        jump_end = self.emit(JUMP)
+        self.patch(jump_else)
+
+        # else if chains store the nested If directly as the else part
+        if isinstance(node.elsepart, ast.InstructionList):
+            self.compile_block(node.elsepart)
+        else:
+            self.compile_statement(node.elsepart)
+
+        self.patch(jump_end)
+
+    def compile_iteration(self, variable: ast.Identifier, body: ast.InstructionList):
+        """
+        Compiles the loop over the iterator on top of the stack
+        """
+
+        start = self.emit(FOR_ITER)
+        self.compile_store(variable)
+        exits = self.compile_loop_body(body, True)
+        self.emit(LOOP, start)
+
+        # FOR_ITER pops the exhausted iterator before jumping, exits pop it themselves
+        self.patch(start)
+        self.patch_exits(exits)
+
+    def _compile_For(self, node: ast.For):
+        self.compile_expression(node.start)
+        self.compile_expression(node.end)
+        self.emit(MAKE_RANGE, 1 if node.asc else -1)
+        self.compile_iteration(node.variable, node.body)
+
+    def _compile_ForIn(self, node: ast.ForIn):
+        self.compile_expression(node.sequence)
+        self.emit(GET_ITER)
+        self.compile_iteration(node.variable, node.body)
+
+    def _compile_While(self, node: ast.While):
+        start = self.position()
+        jump_end = None
+
+        # infinite loops (for { }) do not need to test their condition
+        if not (isinstance(node.condition, ast.Primitive) and node.condition.value):
+            self.compile_expression(node.condition)
+            jump_end = self.emit(JUMP_IF_FALSE)
+
+        exits = self.compile_loop_body(node.body, False)
+        self.emit(LOOP, start)
+
+        if jump_end is not None:
+            self.patch(jump_end)
+
+        self.patch_exits(exits)
+
+    def _compile_BufferedLoop(self, node: ast.BufferedLoop):
+        # exits of the loop land on the flushes
+        self.compile_statement(node.loop)
+
+        for v in node.variables:
+            if v.local:
+                self.emit(FLUSH_LOCAL, v.slot)
+            else:
+                self.emit(FLUSH_GLOBAL, self.name(v.name))
+
+    def _compile_PrintStatement(self, node: ast.PrintStatement):
+        for n in node.items:
+            self.compile_expression(n)
+
+        self.emit(PRINT, len(node.items))
+
+    def _compile_FunctionCall(self, node: ast.FunctionCall, op: int=CALL):
+        # the function is looked up and its arity checked before evaluating the arguments
+        self.emit(LOAD_FUNC, self.const((node.name.name, len(node.params))))
+
+        for p in node.params:
+            self.compile_expression(p)
+
+        self.emit(op, len(node.params))
+
+    def _compile_Spawn(self, node: ast.Spawn):
+        self._compile_FunctionCall(node.call, SPAWN)
+
+    def _compile_Await(self, node: ast.Await):
+        self.compile_expression(node.expr)
+        self.emit(AWAIT)
+
+    def compile_function(self, name: str, node: ast.Function):
+        """
+        Compiles the function body into a separate code object, returns its index
+        """
+
+        outer = (self.code, self.__exits, self.__in_function)
+
+        self.code = Code(name, [p.name for p in node.params], node.varnames, node.param_slots, node.is_generator,
+                         node.memo)
+        self.__exits = []
+        self.__in_function = True
+
+        try:
+            self.compile_block(node.body)
+            self.emit(RETURN_NONE)
+            function = self.code
+        finally:
+            self.code, self.__exits, self.__in_function = outer
+
+        function.outer = self.code
+        self.code.functions.append(function)
+        return len(self.code.functions) - 1
+
+    def _compile_InExpression(self, node: ast.InExpression):
+        self.compile_expression(node.a)
+        self.compile_expression(node.b)
+        self.emit(CONTAINS, 1 if node.not_in else 0)
+
+    def _compile_TernaryOperator(self, node: ast.TernaryOperator):
+        self.compile_expression(node.cond)
+        jump_else = self.emit(JUMP_IF_FALSE)
+        self.compile_expression(node.trueval)
+        jump_end = self.emit(JUMP)
+        self.patch(jump_else)
+        self.compile_expression(node.falseval)
+        self.patch(jump_end)
+
+
+def compile_program(tree: ast.InstructionList) -> Code:
+    return Compiler().compile_program(tree)
@@ -1,8 +1,13 @@
+import bisect
 import os
 from timeit import default_timer
 import mamba
 import mamba.ast as ast
+import mamba.filemap
+import mamba.strbuf
 import mamba.symbol_table
+import mamba.vector
+from mamba.exceptions import *
 import math
 import random
 import sys
@@ -40,8 +45,62 @@ def array_reverse(arr: list):
     arr.reverse()
 
 
-def array_sort(arr: list):
-    arr.sort()
+def array_sort(s: mamba.symbol_table.SymbolTable, arr: list, key: str=None, reverse: bool=False):
+    """
+    Sorts the array in place, by the value the function named key returns for each item
+    unless key is empty. The function is called once per item, not once per comparison
+    """
+
+    if not key:
+        arr.sort(reverse=reverse)
+        return
+
+    func = s.get_func(key)
+
+    if isinstance(func, ast.BuiltInFunction):
+        arr.sort(key=func.func, reverse=reverse)
+        return
+
+    if len(func.params) != 1:
+        msg = "Invalid number of arguments for function {0}. Expected {1} got {2}"
+        raise InvalidParamCount(msg.format(key, len(func.params), 1))
+
+    call = s.call
+    arr.sort(key=lambda v: call(func, [v]), reverse=reverse)
+
+
+def array_extend(arr: list, values):
+    arr.extend(values)
+
+
+def array_bsearch(arr: list, value):
+    """
+    Index of the value in a sorted array or -1 when it's not there, found by binary search
+    """
+
+    i = bisect.bisect_left(arr, value)
+
+    return i if i < len(arr) and arr[i] == value else -1
+
+
+def array_new(size: int, value=0):
+    return [value] * size
+
+
+def array_fill(arr: list, value, start: int=0, end: int=None):
+    arr[start:end] = [value] * len(range(len(arr))[start:end])
+
+
+def map_keys(m: dict):
+    return list(m.keys())
+
+
+def map_values(m: dict):
+    return list(m.values())
+
+
+def map_get(m: dict, key, default=None):
+    return m.get(key, default)
 
 def file_close(f):
     f.close()
@@ -62,7 +121,59 @@ def file_exists(f):
     return os.path.isfile(f)
 
 
-def declare_env(s: mamba.symbol_table.SymbolTable):
+def file_size(f):
+    if isinstance(f, str):
+        return os.stat(f).st_size
+
+    return os.fstat(f.fileno()).st_size
+
+
+def file_lines(f):
+    """
+    Lazily yields the lines of a file name or handle without their line break
+    """
+
+    if isinstance(f, str):
+        with open(f) as handle:
+            yield from file_lines(handle)
+
+        return
+
+    for line in f:
+        yield line[:-1] if line.endswith('\n') else line
+
+
+def memo_stats(s: mamba.symbol_table.SymbolTable, name: str):
+    func = s.get_func(name)
+
+    if not isinstance(func, ast.BuiltInFunction) or not isinstance(func.func, ast.Memo):
+        raise InterpreterRuntimeError("Function '%s' is not declared with memo fn" % name)
+
+    memo = func.func
+    return {'hits': memo.hits, 'misses': memo.misses, 'size': len(memo.results), 'max_size': memo.size}
+
+
+_builtin_names = None
+
+
+def builtin_names() -> frozenset:
+    """
+    Names of the functions declared by declare_env which never run Mamba code, unlike
+    array_sort calling its key function
+    """
+
+    global _builtin_names
+
+    if _builtin_names is None:
+        table = mamba.symbol_table.SymbolTable()
+        declare_env(table, [])
+        functions = table.table()['functions']
+        _builtin_names = frozenset(name for name, func in functions.items() if not func.runs_code)
+
+    return _builtin_names
+
+
+def declare_env(s: mamba.symbol_table.SymbolTable, argv: list=None):
     f = ast.BuiltInFunction
 
     # "constants"
@@ -70,7 +181,7 @@ def declare_env(s: mamba.symbol_table.SymbolTable):
     s.set_sym('e', math.e)
 
     # globals
-    s.set_sym('argv', sys.argv)
+    s.set_sym('argv', argv if argv is not None else sys.argv)
 
     # Built in functions
 
@@ -99,10 +210,17 @@ def declare_env(s: mamba.symbol_table.SymbolTable):
     s.set_func('format', f(str_format))
     s.set_func('str', f(str))
 
+    # string buffers
+    s.set_func('strbuf', f(mamba.strbuf.strbuf))
+    s.set_func('strbuf_append', f(mamba.strbuf.strbuf_append))
+    s.set_func('strbuf_join', f(mamba.strbuf.strbuf_join))
+    s.set_func('strbuf_str', f(mamba.strbuf.strbuf_str))
+
     # misc
     s.set_func('chr', f(chr))
     s.set_func('ord', f(ord))
     s.set_func('time', f(default_timer))
+    s.set_func('range', f(range))
 
     # arrays
     s.set_func('array_insert', f(array_insert))
@@ -110,7 +228,28 @@ def declare_env(s: mamba.symbol_table.SymbolTable):
     s.set_func('array_push', f(array_push))
     s.set_func('array_remove', f(array_remove))
     s.set_func('array_reverse', f(array_reverse))
-    s.set_func('array_sort', f(array_sort))
+    s.set_func('array_sort', f(lambda arr, key=None, reverse=False: array_sort(s, arr, key, reverse), True))
+    s.set_func('array_extend', f(array_extend))
+    s.set_func('array_bsearch', f(array_bsearch))
+    s.set_func('array_new', f(array_new))
+    s.set_func('array_fill', f(array_fill))
+
+    # memo functions
+    s.set_func('memo_stats', f(lambda name: memo_stats(s, name)))
+
+    # maps
+    s.set_func('map_keys', f(map_keys))
+    s.set_func('map_values', f(map_values))
+    s.set_func('map_get', f(map_get))
+    s.set_func('map_remove', f(array_remove))
+
+    # typed arrays
+    s.set_func('int_array', f(mamba.vector.int_array))
+    s.set_func('float_array', f(mamba.vector.float_array))
+    s.set_func('sum', f(mamba.vector.array_sum))
+    s.set_func('min', f(mamba.vector.array_min))
+    s.set_func('max', f(mamba.vector.array_max))
+    s.set_func('dot', f(mamba.vector.dot))
 
     # file
     s.set_func('file', f(open))
@@ -120,6 +259,9 @@ def declare_env(s: mamba.symbol_table.SymbolTable):
     s.set_func('file_seek', f(file_seek))
     s.set_func('file_pos', f(file_pos))
     s.set_func('file_exists', f(file_exists))
+    s.set_func('file_size', f(file_size))
+    s.set_func('file_lines', f(file_lines))
+    s.set_func('file_map', f(mamba.filemap.file_map))
 
     # input
     s.set_func('ask', f(input))
\ No newline at end of file
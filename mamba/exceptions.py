@@ -27,4 +27,12 @@ class InterpreterRuntimeError(InterpreterException):
 
 
 class InvalidParamCount(InterpreterRuntimeError):
-    pass
\ No newline at end of file
+    pass
+
+
+class RecursionDepthExceeded(InterpreterRuntimeError):
+    pass
+
+
+class BudgetExceeded(InterpreterRuntimeError):
+    pass
@@ -0,0 +1,84 @@
+import mmap
+from mamba.exceptions import *
+
+
+class FileMap:
+    """
+    Read only view of a memory mapped file. Slicing returns another view of
+    the same mapping without copying, data is only read from the file when
+    a view is converted to a string, indexed or searched. Iterating a view
+    yields its lines, line breaks included, like iterating a file handle
+    """
+
+    __slots__ = ('data', 'start', 'end')
+
+    def __init__(self, data, start: int, end: int):
+        self.data = data
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                raise InterpreterRuntimeError("file_map slices can not have a step")
+
+            start, stop, _ = index.indices(len(self))
+            return FileMap(self.data, self.start + start, self.start + max(start, stop))
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("file_map index out of range")
+
+        return chr(self.data[self.start + index])
+
+    def __contains__(self, item: str):
+        return self.data.find(item.encode(), self.start, self.end) != -1
+
+    def __iter__(self):
+        data, pos, end = self.data, self.start, self.end
+
+        while pos < end:
+            newline = data.find(b'\n', pos, end)
+            stop = end if newline == -1 else newline + 1
+
+            yield data[pos:stop].decode('utf-8', 'replace')
+            pos = stop
+
+    def __str__(self):
+        return self.data[self.start:self.end].decode('utf-8', 'replace')
+
+    def __repr__(self):
+        return '<file_map {0} bytes>'.format(len(self))
+
+    def index(self, sub: str):
+        """
+        Offset of the first occurrence of sub in the view, so pos() works on views like on strings
+        """
+
+        i = self.data.find(sub.encode(), self.start, self.end)
+
+        if i == -1:
+            raise ValueError("substring not found")
+
+        return i - self.start
+
+    def close(self):
+        # closes the mapping of every view of the file
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+def file_map(filename: str):
+    with open(filename, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can not be mapped
+            data = b''
+
+    return FileMap(data, 0, len(data))
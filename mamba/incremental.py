@@ -0,0 +1,275 @@
+import pickle
+import mamba.ast as ast
+import mamba.lexer
+import mamba.parser
+from mamba.exceptions import *
+
+# Raised by the lexer, strings with invalid escapes fail to decode
+LEXER_ERRORS = (UnexpectedCharacter, UnicodeDecodeError)
+
+
+class Statement:
+    """
+    Top level statement of a source: its text, where it is and the line
+    it starts at. after is the line the lexer is at past its last token,
+    which isn't always a line break away when it's followed by whitespace
+    """
+
+    __slots__ = ('text', 'start', 'end', 'lineno', 'after', 'complete')
+
+    def __init__(self, text: str, start: int, end: int, lineno: int, after: int, complete: bool=True):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.lineno = lineno
+        self.after = after
+        self.complete = complete
+
+    def __repr__(self):
+        return '<Statement line={0} text={1!r}>'.format(self.lineno, self.text)
+
+    def moved(self, offset: int, lines: int) -> 'Statement':
+        return Statement(self.text, self.start + offset, self.end + offset, self.lineno + lines, self.after + lines,
+                         self.complete)
+
+
+def scan(source: str, lexer, pos: int=0, lineno: int=1):
+    """
+    Yields the top level statements of the source from pos on, where the
+    lexer is at line lineno. A statement ends with a semicolon or with the
+    block of an if, for, while or fn statement (unless an else follows).
+    The last statement is incomplete when the source ends in the middle of
+    it, comments and whitespace between statements are left out
+    """
+
+    lexer.input(source)
+    lexer.lexpos = pos
+    lexer.lineno = lineno
+
+    depth = 0
+    start = first = None
+
+    # if statement waiting for the next token, it goes on if that's an else
+    pending = None
+
+    for tok in iter(lexer.token, None):
+        if pending is not None:
+            if tok.type != 'ELSE':
+                yield pending
+                start = None
+
+            pending = None
+
+        if start is None:
+            start, first = tok, tok.type
+
+        if tok.type == 'LBRACK':
+            depth += 1
+        elif tok.type == 'RBRACK':
+            depth -= 1
+
+            if depth == 0 and first in ('IF', 'FOR', 'WHILE', 'FUNCTION', 'MEMO'):
+                statement = Statement(source[start.lexpos:lexer.lexpos], start.lexpos, lexer.lexpos, start.lineno,
+                                      lexer.lineno)
+
+                if first == 'IF':
+                    pending = statement
+                else:
+                    yield statement
+                    start = None
+        elif tok.type == 'STMT_END' and depth == 0:
+            yield Statement(source[start.lexpos:lexer.lexpos], start.lexpos, lexer.lexpos, start.lineno, lexer.lineno)
+            start = None
+
+    if pending is not None:
+        yield pending
+    elif start is not None:
+        text = source[start.lexpos:].rstrip()
+        yield Statement(text, start.lexpos, start.lexpos + len(text), start.lineno, lexer.lineno, False)
+
+
+def split(source: str, lexer=None) -> list:
+    """
+    Returns the top level statements of the source
+    """
+
+    return list(scan(source, lexer if lexer is not None else mamba.lexer.lexer.clone()))
+
+
+def _common_prefix(a: str, b: str) -> int:
+    lo, hi = 0, min(len(a), len(b))
+
+    # slices are compared in C, much faster than walking the strings
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return lo
+
+
+def _common_suffix(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, limit
+
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return lo
+
+
+def shift_lines(node, offset: int):
+    """
+    Moves the line numbers of the node and everything in it by offset
+    """
+
+    stack = [node]
+
+    while stack:
+        node = stack.pop()
+
+        if isinstance(node, ast.InstructionList):
+            stack.extend(node.children)
+            continue
+
+        if getattr(node, 'lineno', None) is not None:
+            node.lineno += offset
+
+        stack.extend(v for v in vars(node).values() if isinstance(v, (ast.BaseExpression, ast.InstructionList)))
+
+
+class IncrementalParser:
+    """
+    Parses successive versions of a source doing only the work the changes
+    need. The source is split into its top level statements starting from
+    the last one before the first change, and as soon as a statement ends
+    where one ended before the change the rest of the previous split is
+    reused. Statements whose text was parsed before are copies of the
+    earlier trees with their line numbers moved, only new text is parsed.
+
+    A statement which fails to parse on its own has the whole source parsed
+    instead, syntax errors are the same as without incremental parsing and
+    sources the split cut in the wrong place still parse
+    """
+
+    def __init__(self, parser=None, lexer=None):
+        self.parser = parser if parser is not None else mamba.parser.get_parser()
+        self.lexer = lexer if lexer is not None else mamba.lexer.lexer.clone()
+        self.scanner = self.lexer.clone()
+
+        # the previous version, its statements and their text -> (line it was parsed at, pickled tree)
+        self.__source = None
+        self.__statements = []
+        self.__trees = {}
+
+        # number of statements parsed and reused by the last parse
+        self.parsed = 0
+        self.reused = 0
+
+    def parse_all(self, source: str) -> ast.InstructionList:
+        # line numbers of error messages start over for every program
+        self.lexer.lineno = 1
+        return self.parser.parse(source, lexer=self.lexer)
+
+    def split(self, source: str) -> list:
+        """
+        Returns the statements of the source, scanning only from the first change since the previous version
+        """
+
+        old, statements = self.__source, self.__statements
+
+        if old is None:
+            return list(scan(source, self.scanner))
+
+        prefix = _common_prefix(old, source)
+        suffix = _common_suffix(old, source, min(len(old), len(source)) - prefix)
+
+        kept = 0
+
+        while kept < len(statements) and statements[kept].end <= prefix:
+            kept += 1
+
+        # whether an if statement ended depends on the token after it, which might have changed
+        if kept and statements[kept - 1].text.startswith('if'):
+            kept -= 1
+
+        res = statements[:kept]
+        pos, lineno = (res[-1].end, res[-1].after) if res else (0, 1)
+
+        offset = len(source) - len(old)
+        sync = len(source) - suffix
+        ends = {s.end: i for i, s in enumerate(statements) if s.complete}
+
+        for statement in scan(source, self.scanner, pos, lineno):
+            res.append(statement)
+
+            # the scanner is in the same state at every statement end, past one in the unchanged
+            # part of the source it goes over the same tokens as the last time
+            i = ends.get(statement.end - offset) if statement.complete and statement.end > sync else None
+
+            if i is not None and i >= kept:
+                lines = statement.after - statements[i].after
+                res.extend(s.moved(offset, lines) for s in statements[i + 1:])
+                break
+
+        return res
+
+    def parse(self, source: str) -> ast.InstructionList:
+        try:
+            statements = self.split(source)
+        except LEXER_ERRORS:
+            statements = None
+
+        if not statements or not statements[-1].complete:
+            # can't tell where an unfinished statement ends, which is most likely an error anyway
+            self.__source, self.__statements, self.__trees = None, [], {}
+            self.parsed, self.reused = len(statements or ()), 0
+            return self.parse_all(source)
+
+        trees = {}
+        program = ast.InstructionList()
+        parsed = reused = 0
+
+        for statement in statements:
+            if statement.text in trees:
+                lineno, data = trees[statement.text]
+            elif statement.text in self.__trees:
+                lineno, data = self.__trees[statement.text]
+                reused += 1
+            else:
+                try:
+                    lineno, data = statement.lineno, self.__parse_statement(statement)
+                except (ParserSyntaxError,) + LEXER_ERRORS:
+                    # the split can be wrong (x = y = 1; ; splits after the first semicolon), the whole source
+                    # decides, it raises its own error when it's invalid
+                    self.__source, self.__statements, self.__trees = None, [], {}
+                    self.parsed, self.reused = len(statements), 0
+                    return self.parse_all(source)
+
+                parsed += 1
+
+            tree = pickle.loads(data)
+
+            if lineno != statement.lineno:
+                shift_lines(tree, statement.lineno - lineno)
+
+            trees[statement.text] = (lineno, data)
+            program.children.extend(tree.children)
+
+        self.__source, self.__statements, self.__trees = source, statements, trees
+        self.parsed, self.reused = parsed, reused
+
+        return program
+
+    def __parse_statement(self, statement: Statement):
+        self.lexer.lineno = statement.lineno
+        tree = self.parser.parse(statement.text, lexer=self.lexer)
+
+        return pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,321 @@
+import contextvars
+import sys
+import threading
+import mamba.ast
+import mamba.budget
+import mamba.cache
+import mamba.closure
+import mamba.compiler
+import mamba.environment
+import mamba.incremental
+import mamba.lexer
+import mamba.optimizer
+import mamba.parser
+import mamba.scanner
+import mamba.scope
+import mamba.symbol_table
+import mamba.vm
+from mamba.exceptions import *
+
+engines = ('tree', 'closure', 'vm')
+
+# Seconds an interrupted program is given to stop before the interpreter gives up on it, see Interpreter.run
+CANCEL_WAIT = 0.5
+
+
+def _start(run, args: tuple, finished):
+    """
+    Calls run on a new thread, finished is called on that thread with the
+    error run raised or None.
+
+    run is called in a copy of the caller's context, the context variables
+    it sets are its own and it sees those the caller set
+    """
+
+    context = contextvars.copy_context()
+
+    def target():
+        error = None
+
+        try:
+            context.run(run, *args)
+        except RecursionError:
+            # something else than calls nesting too deep, like a deeply nested expression
+            error = RecursionDepthExceeded("Maximum recursion depth exceeded")
+        except BaseException as e:
+            error = e
+
+        finished(error)
+
+    # daemon so that an interrupted program doesn't keep the process alive
+    threading.Thread(target=target, name='mamba', daemon=True).start()
+
+
+class Interpreter:
+    """
+    Everything needed to run Mamba programs: a symbol table with the standard
+    library declared, a parser and the cache of parsed programs.
+
+    Interpreters are independent of each other, programs executed by the same
+    interpreter share its functions and globals like statements typed in a
+    session do, reset() starts over with a fresh symbol table.
+
+    Programs run on a thread of their own, function calls can nest max_depth
+    deep (see mamba.stack), deeper recursion raises RecursionDepthExceeded.
+    The symbol table the tree engine evaluates against and the output are
+    context variables (see mamba.ast) set on that thread only, so programs of
+    different interpreters can run at the same time. An interpreter runs one
+    program at a time. say prints to output, sys.stdout when it's None.
+
+    A budget (see mamba.budget) limits the steps, time and memory of each
+    program run, its counts start over with every run.
+
+    Interrupting run() or execute() (Ctrl-C) cancels the program, which stops
+    at its next step with the globals as it left them. A program which
+    doesn't stop in time, waiting in a builtin like ask, is left to itself
+    and the interpreter starts over with a fresh symbol table and budget.
+
+    With incremental parsing each parse only parses again the top level
+    statements which changed since the previous source, for running new
+    versions of the same file. scanner=True lexes with the hand written
+    mamba.scanner instead of ply, which gives the same tokens faster
+    """
+
+    def __init__(self, engine: str='tree', optimize: bool=True, cache_dir: str=None, argv: list=None,
+                 disable_warnings: bool=True, max_depth: int=mamba.symbol_table.MAX_DEPTH, incremental: bool=False,
+                 scanner: bool=False, output=None, budget: mamba.budget.Budget=None):
+        if engine not in engines:
+            raise ValueError("Unknown engine '%s', expected one of %s" % (engine, ', '.join(engines)))
+
+        self.engine = engine
+        self.optimize = optimize
+        self.max_depth = max_depth
+        self.argv = argv if argv is not None else sys.argv
+        self.output = output
+        self.budget = budget
+        self.cache = mamba.cache.ProgramCache(cache_dir) if cache_dir is not None else None
+
+        self.parser = mamba.parser.get_parser(disable_warnings)
+        self.lexer = mamba.scanner.Scanner() if scanner else mamba.lexer.lexer.clone()
+        self.incremental = mamba.incremental.IncrementalParser(self.parser, self.lexer) if incremental else None
+
+        self.symbols = None
+        self.reset()
+
+    def reset(self):
+        self.symbols = mamba.symbol_table.SymbolTable(self.max_depth, self.budget)
+        mamba.environment.declare_env(self.symbols, self.argv)
+
+    def parse(self, source: str) -> mamba.ast.InstructionList:
+        """
+        Parses the source returning the syntax tree, from the cache when possible
+        """
+
+        res = self.cache.load_tree(source) if self.cache is not None else None
+
+        if res is None:
+            if self.incremental is not None:
+                res = self.incremental.parse(source)
+            else:
+                # line numbers of error messages start over for every program
+                self.lexer.lineno = 1
+                res = self.parser.parse(source, lexer=self.lexer)
+
+            if self.cache is not None:
+                self.cache.store_tree(source, res)
+
+        return res
+
+    def compile(self, source: str) -> mamba.compiler.Code:
+        """
+        Compiles the source to bytecode, from the cache when possible
+        """
+
+        code = self.cache.load_code(source, self.optimize) if self.cache is not None else None
+
+        if code is None:
+            res = self.parse(source)
+
+            if self.optimize:
+                res = mamba.optimizer.optimize(res)
+
+            code = mamba.compiler.compile_program(res)
+
+            if self.cache is not None:
+                self.cache.store_code(source, code, self.optimize)
+
+        return code
+
+    def load(self, source: str):
+        """
+        Returns the program in the form the engine runs, bytecode for the vm
+        and the (optimized) syntax tree for the others
+        """
+
+        if self.engine == 'vm':
+            return self.compile(source)
+
+        res = self.parse(source)
+
+        return mamba.optimizer.optimize(res) if self.optimize else res
+
+    def run(self, program, profiler: 'mamba.profiler.Profiler'=None):
+        """
+        Runs a program returned by load(), when a profiler is given the program
+        is instrumented with it, which only the tree engine supports
+        """
+
+        if profiler is not None and self.engine != 'tree':
+            raise ValueError("Profiling is only supported by the tree engine")
+
+        self.__run_thread(self.__run, program, profiler)
+
+    def __run(self, program, profiler):
+        # on the program's own thread and context, see _start
+        if self.output is not None:
+            mamba.ast.output.set(self.output)
+
+        # reset() replaces the table of a program left running
+        symbols = self.symbols
+        symbols.budget.start(symbols)
+
+        try:
+            if self.engine == 'closure':
+                mamba.scope.resolve(program, symbols)
+                mamba.closure.compile_program(program, symbols)()
+            elif self.engine == 'vm':
+                mamba.vm.run(program, symbols)
+            else:
+                mamba.scope.resolve(program, symbols)
+                mamba.ast.symbols.set(symbols)
+
+                if profiler is not None:
+                    profiler.instrument(program)
+
+                self.__eval_tree(program, profiler)
+        finally:
+            symbols.stack.close()
+
+    def execute(self, source: str, show_ast: bool=False, profiler: 'mamba.profiler.Profiler'=None):
+        if not show_ast:
+            self.run(self.load(source), profiler)
+            return
+
+        # only needed here, keeps it off the startup path
+        import pprint
+
+        res = self.parse(source)
+        code = unoptimized = None
+
+        if self.optimize:
+            unoptimized = pprint.pformat(res.children)
+            res = mamba.optimizer.optimize(res)
+
+        if self.engine == 'vm':
+            code = mamba.compiler.compile_program(res)
+
+        self.run(code if code is not None else res, profiler)
+
+        if unoptimized is not None:
+            print("\n\n" + '=' * 80, ' == Syntax tree (before optimization) ==')
+            print(unoptimized)
+
+        print("\n\n" + '=' * 80, ' == Syntax tree ==')
+
+        pp = pprint.PrettyPrinter()
+        pp.pprint(res.children)
+        pp.pprint(self.symbols.table())
+
+        if code is not None:
+            print("\n" + '=' * 80, ' == Bytecode ==')
+            print(mamba.compiler.disassemble(code))
+
+    async def async_execute(self, source: str):
+        """
+        execute() as a coroutine, the program is loaded and run on a thread of
+        its own while the event loop goes on. Cancelling the coroutine cancels
+        the program, which stops at its next step
+        """
+
+        # only needed here, keeps it off the startup path
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def settle(error):
+            if done.cancelled():
+                return
+
+            if error is not None:
+                done.set_exception(error)
+            else:
+                done.set_result(None)
+
+        def finished(error):
+            try:
+                loop.call_soon_threadsafe(settle, error)
+            except RuntimeError:
+                # the loop was closed without waiting for the program
+                pass
+
+        budget = self.symbols.budget
+        budget.cancelled = False
+
+        _start(self.__run_async, (source,), finished)
+
+        try:
+            await done
+        except asyncio.CancelledError:
+            budget.cancel()
+            raise
+
+    def __run_async(self, source: str):
+        self.__run(self.load(source), None)
+
+    def __run_thread(self, run, *args):
+        outcome = []
+        finished = threading.Event()
+
+        def done(error):
+            outcome.append(error)
+            finished.set()
+
+        # cleared here rather than on the program's thread, a cancel() coming before it starts still counts
+        budget = self.symbols.budget
+        budget.cancelled = False
+
+        _start(run, args, done)
+
+        try:
+            finished.wait()
+        except KeyboardInterrupt:
+            budget.cancel()
+
+            try:
+                stopped = finished.wait(CANCEL_WAIT)
+            except KeyboardInterrupt:
+                stopped = False
+
+            if not stopped:
+                # still changing the symbol table it has, which it keeps along with its cancelled budget
+                if self.budget is not None:
+                    self.budget = self.budget.copy()
+
+                self.reset()
+
+            raise
+
+        if outcome[0] is not None:
+            raise outcome[0]
+
+    def __eval_tree(self, res: mamba.ast.InstructionList, profiler=None):
+        if profiler is not None:
+            profiler.start()
+
+        try:
+            for node in res.children:
+                node.eval()
+        finally:
+            if profiler is not None:
+                profiler.stop()
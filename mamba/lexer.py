@@ -1,6 +1,11 @@
+import os
+import zlib
 import ply.lex as lex
 import mamba.exceptions
 
+# The lexer tables ship next to this file, they're written again when the rules below change
+LEXTAB = 'lextab'
+
 reserved = {
     'if': 'IF',
     'else': 'ELSE',
@@ -12,6 +17,11 @@ reserved = {
 
     'fn': 'FUNCTION',
     'ret': 'RETURN',
+    'yield': 'YIELD',
+    'memo': 'MEMO',
+
+    'spawn': 'SPAWN',
+    'await': 'AWAIT',
 
     'say': 'PRINT',
 
@@ -175,4 +185,45 @@ def t_error(t):
     raise mamba.exceptions.UnexpectedCharacter("Unexpected character '%s' at line %d" % (t.value[0], t.lineno))
 
 
-lexer = lex.lex()
\ No newline at end of file
+def _checksum():
+    # cheap fingerprint of the rules, None when the source isn't around (frozen executables)
+    try:
+        with open(__file__, 'rb') as f:
+            return zlib.crc32(f.read())
+    except OSError:
+        return None
+
+
+def build_lexer():
+    """
+    Loads the lexer from the shipped tables, skipping the validation of the
+    rules, or builds it from the rules and writes the tables when they are
+    missing or out of date
+    """
+
+    checksum = _checksum()
+
+    try:
+        import mamba.lextab as tables
+    except ImportError:
+        tables = None
+
+    if tables is not None and checksum in (None, getattr(tables, 'checksum', None)):
+        return lex.lex(optimize=True, lextab=tables)
+
+    res = lex.lex()
+
+    try:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        res.writetab(LEXTAB, directory)
+
+        with open(os.path.join(directory, LEXTAB + '.py'), 'a') as f:
+            f.write('checksum      = %r\n' % checksum)
+    except OSError:
+        # read only installs, the lexer works all the same
+        pass
+
+    return res
+
+
+lexer = build_lexer()
\ No newline at end of file
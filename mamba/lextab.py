@@ -0,0 +1,11 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('AND', 'ARROW_LTR', 'ARROW_RTL', 'AWAIT', 'BIT_AND', 'BIT_NEG', 'BIT_OR', 'BIT_XOR', 'COLON', 'COMMA', 'DIV', 'DIV_EQ', 'DOUBLE_MINUS', 'DOUBLE_PLUS', 'ELSE', 'EQ', 'EQUALS', 'EXIT', 'EXP', 'EXP_EQ', 'FALSE', 'FOR', 'FUNCTION', 'GT', 'GTE', 'IDENTIFIER', 'IF', 'IN', 'KEYWORD', 'LBRACK', 'LPAREN', 'LSHIFT', 'LSQBRACK', 'LT', 'LTE', 'MEMO', 'MINUS', 'MINUS_EQ', 'MOD', 'MOD_EQ', 'MUL', 'MUL_EQ', 'NEQ', 'NEWLINE', 'NOT', 'NUM_FLOAT', 'NUM_INT', 'OR', 'PLUS', 'PLUS_EQ', 'PRINT', 'QUESTION_MARK', 'RBRACK', 'RETURN', 'RPAREN', 'RSHIFT', 'RSQBRACK', 'SPAWN', 'STMT_END', 'STRING', 'TRUE', 'WHILE', 'YIELD'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_NEWLINE>\\n)|(?P<t_TRUE>true)|(?P<t_FALSE>false)|(?P<t_IDENTIFIER>[\\$_a-zA-Z]\\w*)|(?P<t_NUM_FLOAT>\\d*\\.\\d+)|(?P<t_NUM_INT>\\d+)|(?P<t_STRING>"(?:\\\\"|.)*?")|(?P<t_EXP_EQ>\\*\\*=)|(?P<t_EXP>\\*\\*)|(?P<t_ignore_COMMENTS>//.+)|(?P<t_DOUBLE_PLUS>\\+\\+)|(?P<t_ignore_WS>\\s+)|(?P<t_PLUS_EQ>\\+=)|(?P<t_MUL_EQ>\\*=)|(?P<t_PLUS>\\+)|(?P<t_MUL>\\*)|(?P<t_QUESTION_MARK>\\?)|(?P<t_LPAREN>\\()|(?P<t_RPAREN>\\))|(?P<t_LSQBRACK>\\[)|(?P<t_RSQBRACK>\\])|(?P<t_EQ>==)|(?P<t_NEQ>!=)|(?P<t_GTE>>=)|(?P<t_LTE><=)|(?P<t_ARROW_LTR>->)|(?P<t_ARROW_RTL><-)|(?P<t_MINUS_EQ>-=)|(?P<t_DIV_EQ>/=)|(?P<t_MOD_EQ>%=)|(?P<t_RSHIFT>>>)|(?P<t_LSHIFT><<)|(?P<t_BIT_AND>\\&)|(?P<t_BIT_OR>\\|)|(?P<t_BIT_XOR>\\^)|(?P<t_DOUBLE_MINUS>--)|(?P<t_COMMA>,)|(?P<t_MINUS>-)|(?P<t_DIV>/)|(?P<t_MOD>%)|(?P<t_STMT_END>;)|(?P<t_EQUALS>=)|(?P<t_COLON>:)|(?P<t_LBRACK>{)|(?P<t_RBRACK>})|(?P<t_GT>>)|(?P<t_LT><)|(?P<t_BIT_NEG>~)', [None, ('t_NEWLINE', 'NEWLINE'), ('t_TRUE', 'TRUE'), ('t_FALSE', 'FALSE'), ('t_IDENTIFIER', 'IDENTIFIER'), ('t_NUM_FLOAT', 'NUM_FLOAT'), ('t_NUM_INT', 'NUM_INT'), ('t_STRING', 'STRING'), (None, 'EXP_EQ'), (None, 'EXP'), (None, None), (None, 'DOUBLE_PLUS'), (None, None), (None, 'PLUS_EQ'), (None, 'MUL_EQ'), (None, 'PLUS'), (None, 'MUL'), (None, 'QUESTION_MARK'), (None, 'LPAREN'), (None, 'RPAREN'), (None, 'LSQBRACK'), (None, 'RSQBRACK'), (None, 'EQ'), (None, 'NEQ'), (None, 'GTE'), (None, 'LTE'), (None, 'ARROW_LTR'), (None, 'ARROW_RTL'), (None, 'MINUS_EQ'), (None, 'DIV_EQ'), (None, 'MOD_EQ'), (None, 'RSHIFT'), (None, 'LSHIFT'), (None, 'BIT_AND'), (None, 'BIT_OR'), (None, 'BIT_XOR'), (None, 'DOUBLE_MINUS'), (None, 'COMMA'), (None, 'MINUS'), (None, 'DIV'), (None, 'MOD'), (None, 'STMT_END'), (None, 'EQUALS'), (None, 'COLON'), (None, 'LBRACK'), (None, 'RBRACK'), (None, 'GT'), (None, 'LT'), (None, 'BIT_NEG')])]}
+_lexstateignore = {'INITIAL': ''}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
+checksum      = 4127020801
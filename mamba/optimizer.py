@@ -0,0 +1,285 @@
+import operator
+import mamba.ast as ast
+import mamba.environment
+
+# Folded strings, arrays and numbers larger than this are left to be computed at runtime
+# so that something like "x" * 1000000000 does not blow up the tree
+MAX_FOLDED_SIZE = 4096
+
+
+class Optimizer:
+    """
+    Rewrites the parsed tree before execution, the result behaves exactly
+    like the original program:
+
+    * operations whose operands are all literals are folded into a literal
+    * if statements and ternaries with a literal condition are replaced by the taken branch
+    * while loops with a false literal condition are removed
+    * strings built with += in a loop are appended to a buffer, joined once when the loop ends
+    """
+
+    __binary_operations = {
+        '+': operator.add,
+        '-': operator.sub,
+        '*': operator.mul,
+        '**': operator.pow,
+        '/': operator.truediv,
+        '%': operator.mod,
+
+        '>': operator.gt,
+        '>=': operator.ge,
+        '<': operator.lt,
+        '<=': operator.le,
+        '==': operator.eq,
+        '!=': operator.ne,
+
+        '&': operator.and_,
+        '|': operator.or_,
+        '^': operator.xor,
+        '>>': operator.rshift,
+        '<<': operator.lshift,
+    }
+
+    __unary_operations = {
+        '+': operator.pos,
+        '-': operator.neg,
+        '~': operator.inv,
+        'not': operator.not_
+    }
+
+    def optimize_program(self, tree: ast.InstructionList):
+        # at the top level an exit signal only stops the statement it was raised in, so
+        # a taken branch containing one can not be spliced among the top level statements
+        tree.children = self.optimize_block(tree, splice_exits=False).children
+        self.buffer_strings(tree)
+        return tree
+
+    def optimize(self, node):
+        method = getattr(self, '_optimize_' + node.__class__.__name__, None)
+
+        if method is not None:
+            return method(node)
+
+        return self.optimize_children(node)
+
+    def optimize_children(self, node):
+        for k, v in vars(node).items():
+            if isinstance(v, ast.InstructionList):
+                setattr(node, k, self.optimize_block(v))
+            elif isinstance(v, ast.BaseExpression):
+                setattr(node, k, self.optimize(v))
+
+        return node
+
+    def optimize_block(self, block: ast.InstructionList, splice_exits: bool=True):
+        """
+        Optimizes every statement of the block, the statements of if branches
+        known to be taken are spliced into the block in place of the if
+        """
+
+        children = []
+
+        for n in block:
+            n = self.optimize(n)
+
+            if n is None:
+                continue
+            elif isinstance(n, ast.InstructionList) and (splice_exits or not self.__has_exit(n)):
+                children.extend(n)
+            elif isinstance(n, ast.InstructionList):
+                # keep the branch behind an always true condition
+                children.append(ast.If(ast.Primitive(True), n))
+            else:
+                children.append(n)
+
+        block.children = children
+        return block
+
+    def __has_exit(self, node):
+        if isinstance(node, ast.ExitStatement):
+            return True
+
+        return any(self.__has_exit(n) for n in ast.iter_child_nodes(node))
+
+    @staticmethod
+    def __is_literal(node):
+        return isinstance(node, ast.Primitive)
+
+    @staticmethod
+    def __foldable(value):
+        if isinstance(value, (str, list)):
+            return len(value) <= MAX_FOLDED_SIZE
+        elif isinstance(value, int):
+            return value.bit_length() <= MAX_FOLDED_SIZE
+
+        return True
+
+    def __fold(self, op, *args):
+        """
+        Returns the folded literal or None if the operation has to be left for runtime,
+        either because it fails (and has to fail when executed) or its result is too big
+        """
+
+        try:
+            value = op(*args)
+        except Exception:
+            return None
+
+        if not self.__foldable(value):
+            return None
+
+        return ast.Primitive(value)
+
+    def _optimize_BinaryOperation(self, node: ast.BinaryOperation):
+        node.left = self.optimize(node.left)
+        node.right = self.optimize(node.right)
+        left, right = node.left, node.right
+
+        if node.op in ('and', 'or'):
+            # short circuit: the result is either the left literal or the right operand
+            if self.__is_literal(left):
+                if node.op == 'and':
+                    return right if left.value else left
+
+                return left if left.value else right
+
+            return node
+
+        if self.__is_literal(left) and self.__is_literal(right):
+            return self.__fold(self.__binary_operations[node.op], left.value, right.value) or node
+
+        return node
+
+    def _optimize_UnaryOperation(self, node: ast.UnaryOperation):
+        node.expr = self.optimize(node.expr)
+
+        if self.__is_literal(node.expr):
+            return self.__fold(self.__unary_operations[node.operation], node.expr.value) or node
+
+        return node
+
+    def _optimize_InExpression(self, node: ast.InExpression):
+        node.a = self.optimize(node.a)
+        node.b = self.optimize(node.b)
+
+        if self.__is_literal(node.a) and self.__is_literal(node.b):
+            if node.not_in:
+                return self.__fold(lambda a, b: a not in b, node.a.value, node.b.value) or node
+
+            return self.__fold(lambda a, b: a in b, node.a.value, node.b.value) or node
+
+        return node
+
+    def _optimize_TernaryOperator(self, node: ast.TernaryOperator):
+        self.optimize_children(node)
+
+        if self.__is_literal(node.cond):
+            return node.trueval if node.cond.value else node.falseval
+
+        return node
+
+    def _optimize_If(self, node: ast.If):
+        self.optimize_children(node)
+
+        if not self.__is_literal(node.condition):
+            return node
+
+        # only the branch that is always taken remains, None when there's nothing left
+        if node.condition.value:
+            return node.truepart
+
+        return node.elsepart
+
+    def _optimize_While(self, node: ast.While):
+        self.optimize_children(node)
+
+        if self.__is_literal(node.condition) and not node.condition.value:
+            return None
+
+        return node
+
+    def _optimize_Function(self, node: ast.Function):
+        # parameters are identifiers, only the body needs optimizing
+        node.body = self.optimize_block(node.body)
+        return node
+
+    def buffer_strings(self, node):
+        """
+        Wraps the loops which only ever append to a variable with += in a
+        BufferedLoop, those statements become Concatenations. Building a string
+        by appending to it n times is then linear instead of quadratic
+        """
+
+        if isinstance(node, ast.InstructionList):
+            node.children = [self.buffer_strings(n) for n in node]
+            return node
+
+        names = None
+
+        if isinstance(node, (ast.For, ast.ForIn, ast.While)):
+            names = self.__appended_only(node)
+
+            if names:
+                self.__concatenate(node, names)
+
+        for k, v in vars(node).items():
+            if isinstance(v, (ast.InstructionList, ast.BaseExpression)):
+                setattr(node, k, self.buffer_strings(v))
+
+        if names:
+            return ast.BufferedLoop(node, ast.InstructionList([ast.Identifier(name) for name in names]))
+
+        return node
+
+    def __appended_only(self, loop):
+        """
+        Names of the variables the loop appends to with += and doesn't otherwise
+        use, when it calls no user function. Those can read any of them while the
+        loop runs, the globals as well as the locals of their callers
+        """
+
+        appended = {}
+        used = {}
+        calls = False
+        builtins = mamba.environment.builtin_names()
+
+        def visit(n):
+            nonlocal calls
+
+            if isinstance(n, (ast.Function, ast.Yield)):
+                # a generator's consumer runs while the loop is suspended
+                return False
+
+            if n.__class__ is ast.CompoundOperation and n.operation == '+=':
+                appended[n.identifier.name] = appended.get(n.identifier.name, 0) + 1
+            elif isinstance(n, ast.Identifier) and not n.is_function:
+                used[n.name] = used.get(n.name, 0) + 1
+            elif isinstance(n, ast.FunctionCall) and n.name.name not in builtins:
+                calls = True
+
+            return all(visit(child) for child in ast.iter_child_nodes(n))
+
+        if not visit(loop) or calls:
+            return []
+
+        return [name for name, n in appended.items() if used[name] == n]
+
+    def __concatenate(self, node, names: list):
+        for k, v in vars(node).items():
+            if isinstance(v, ast.InstructionList):
+                v.children = [self.__concatenation(n, names) for n in v]
+            elif isinstance(v, ast.BaseExpression):
+                self.__concatenate(v, names)
+
+    def __concatenation(self, node, names: list):
+        if node.__class__ is ast.CompoundOperation and node.operation == '+=' and node.identifier.name in names:
+            concatenation = ast.Concatenation(node.identifier, node.modifier)
+            concatenation.lineno = node.lineno
+            return concatenation
+
+        self.__concatenate(node, names)
+        return node
+
+
+def optimize(tree: ast.InstructionList):
+    return Optimizer().optimize_program(tree)
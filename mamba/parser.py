@@ -1,3 +1,6 @@
+import copy
+import os
+import threading
 import ply.yacc as yacc
 import mamba.ast as ast
 from mamba.lexer import *
@@ -5,6 +8,27 @@ from mamba.exceptions import *
 
 disable_warnings = False
 
+# LALR tables shipped with the package, unpickling them is much faster than compiling a generated module
+TABLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parsetab.pickle')
+
+# Built by get_parser(), which copies it
+_parser = None
+_lock = threading.Lock()
+
+
+
+def located(node, p, i: int=1):
+    '''
+    Records the line of the i-th symbol of the rule on the node, tokens know
+    their line and nodes got theirs from their own first symbol
+    '''
+
+    line = p.lineno(i)
+    node.lineno = line if line else getattr(p[i], 'lineno', None)
+
+    return node
+
+
 precedence = (
     ('left', 'NOT'),
     ('left', 'PLUS', 'MINUS'),
@@ -12,6 +36,7 @@ precedence = (
     ('left', 'EXP', 'MOD'),
     ('right', 'UMINUS'),
     ('right', 'UPLUS'),
+    ('right', 'AWAIT'),
 )
 
 
@@ -40,14 +65,14 @@ def p_identifier(p):
     '''
     identifier : IDENTIFIER
     '''
-    p[0] = ast.Identifier(p[1])
+    p[0] = located(ast.Identifier(p[1]), p)
 
 
 def p_exit_stmt(p):
     '''
     statement : EXIT STMT_END
     '''
-    p[0] = ast.ExitStatement()
+    p[0] = located(ast.ExitStatement(), p)
 
 
 def p_primitive(p):
@@ -60,7 +85,7 @@ def p_primitive(p):
     if isinstance(p[1], ast.BaseExpression):
         p[0] = p[1]
     else:
-        p[0] = ast.Primitive(p[1])
+        p[0] = located(ast.Primitive(p[1]), p)
 
 
 def p_binary_op(p):
@@ -78,7 +103,7 @@ def p_binary_op(p):
             | expression LSHIFT expression
             | expression RSHIFT expression
     '''
-    p[0] = ast.BinaryOperation(p[1], p[3], p[2])
+    p[0] = located(ast.BinaryOperation(p[1], p[3], p[2]), p)
 
 def p_boolean_operators(p):
     '''
@@ -91,7 +116,7 @@ def p_boolean_operators(p):
             | expression AND expression
             | expression OR expression
     '''
-    p[0] = ast.BinaryOperation(p[1], p[3], p[2])
+    p[0] = located(ast.BinaryOperation(p[1], p[3], p[2]), p)
 
 
 def p_unary_operation(p):
@@ -101,7 +126,7 @@ def p_unary_operation(p):
                | BIT_NEG expression
                | NOT expression
     '''
-    p[0] = ast.UnaryOperation(p[1], p[2])
+    p[0] = located(ast.UnaryOperation(p[1], p[2]), p)
 
 
 def p_paren(p):
@@ -116,7 +141,7 @@ def p_boolean(p):
     boolean : TRUE
             | FALSE
     '''
-    p[0] = ast.Primitive(p[1])
+    p[0] = located(ast.Primitive(p[1]), p)
 
 
 def p_assignable(p):
@@ -146,20 +171,44 @@ def p_ternary_op(p):
     '''
     expression : expression QUESTION_MARK expression COLON expression
     '''
-    p[0] = ast.TernaryOperator(p[1], p[3], p[5])
+    p[0] = located(ast.TernaryOperator(p[1], p[3], p[5]), p)
 
 def p_arrays(p):
     '''
     expression : LSQBRACK arguments RSQBRACK
     '''
-    p[0] = ast.Array(p[2])
+    p[0] = located(ast.Array(p[2]), p)
+
+
+def p_map(p):
+    '''
+    expression : LBRACK map_items RBRACK
+               | LBRACK map_items COMMA RBRACK
+    '''
+    p[0] = located(ast.Map(*p[2]), p)
+
+
+def p_map_items(p):
+    '''
+    map_items : map_items COMMA expression COLON expression
+              | expression COLON expression
+              |
+    '''
+    if len(p) == 4:
+        p[0] = (ast.InstructionList([p[1]]), ast.InstructionList([p[3]]))
+    elif len(p) == 1:
+        p[0] = (ast.InstructionList(), ast.InstructionList())
+    else:
+        p[1][0].children.append(p[3])
+        p[1][1].children.append(p[5])
+        p[0] = p[1]
 
 
 def p_array_access(p):
     '''
     expression : identifier LSQBRACK expression RSQBRACK
     '''
-    p[0] = ast.ArrayAccess(p[1], p[3])
+    p[0] = located(ast.ArrayAccess(p[1], p[3]), p)
 
 
 def p_slice(p):
@@ -170,50 +219,69 @@ def p_slice(p):
                | identifier LSQBRACK COLON RSQBRACK
     '''
     if len(p) == 7:
-        p[0] = ast.ArraySlice(p[1], p[3], p[5])
+        p[0] = located(ast.ArraySlice(p[1], p[3], p[5]), p)
     elif len(p) == 5:
-        p[0] = ast.ArraySlice(p[1])
+        p[0] = located(ast.ArraySlice(p[1]), p)
     elif p[3] == ':':
         # accessing [:expr]
-        p[0] = ast.ArraySlice(p[1], end=p[4])
+        p[0] = located(ast.ArraySlice(p[1], end=p[4]), p)
     else:
         # accessing [expr:]
-        p[0] = ast.ArraySlice(p[1], start=p[3])
+        p[0] = located(ast.ArraySlice(p[1], start=p[3]), p)
 
 
 def p_array_access_assign(p):
     '''
     statement : identifier LSQBRACK expression RSQBRACK EQUALS expression STMT_END
     '''
-    p[0] = ast.ArrayAssign(p[1], p[3], p[6])
+    p[0] = located(ast.ArrayAssign(p[1], p[3], p[6]), p)
+
+
+def p_slice_assign(p):
+    '''
+    statement : identifier LSQBRACK expression COLON expression RSQBRACK EQUALS expression STMT_END
+              | identifier LSQBRACK COLON expression RSQBRACK EQUALS expression STMT_END
+              | identifier LSQBRACK expression COLON RSQBRACK EQUALS expression STMT_END
+              | identifier LSQBRACK COLON RSQBRACK EQUALS expression STMT_END
+    '''
+    if len(p) == 10:
+        p[0] = located(ast.ArraySliceAssign(p[1], p[3], p[5], p[8]), p)
+    elif len(p) == 8:
+        p[0] = located(ast.ArraySliceAssign(p[1], value=p[6]), p)
+    elif p[3] == ':':
+        # assigning [:expr]
+        p[0] = located(ast.ArraySliceAssign(p[1], end=p[4], value=p[7]), p)
+    else:
+        # assigning [expr:]
+        p[0] = located(ast.ArraySliceAssign(p[1], start=p[3], value=p[7]), p)
 
 
 def p_assign(p):
     '''
     expression : identifier EQUALS assignable STMT_END
     '''
-    p[0] = ast.Assignment(p[1], p[3])
+    p[0] = located(ast.Assignment(p[1], p[3]), p)
 
 
 def p_ifstatement(p):
     '''
     if_statement : IF expression LBRACK statement_list RBRACK
     '''
-    p[0] = ast.If(p[2], p[4])
+    p[0] = located(ast.If(p[2], p[4]), p)
 
 
 def p_ifstatement_else(p):
     '''
     if_statement : IF expression LBRACK statement_list RBRACK ELSE LBRACK statement_list RBRACK
     '''
-    p[0] = ast.If(p[2], p[4], p[8])
+    p[0] = located(ast.If(p[2], p[4], p[8]), p)
 
 
 def p_ifstatement_else_if(p):
     '''
     if_statement : IF expression LBRACK statement_list RBRACK ELSE if_statement
     '''
-    p[0] = ast.If(p[2], p[4], p[7])
+    p[0] = located(ast.If(p[2], p[4], p[7]), p)
 
 
 def p_in_expression(p):
@@ -222,16 +290,16 @@ def p_in_expression(p):
                | expression NOT IN expression
     '''
     if len(p) == 4:
-        p[0] = ast.InExpression(p[1], p[3])
+        p[0] = located(ast.InExpression(p[1], p[3]), p)
     else:
-        p[0] = ast.InExpression(p[1], p[4], True)
+        p[0] = located(ast.InExpression(p[1], p[4], True), p)
 
 
 def p_print_statement(p):
     '''
     statement : PRINT arguments STMT_END
     '''
-    p[0] = ast.PrintStatement(p[2])
+    p[0] = located(ast.PrintStatement(p[2]), p)
 
 
 def p_compound_operations(p):
@@ -243,7 +311,7 @@ def p_compound_operations(p):
                | identifier EXP_EQ expression STMT_END
                | identifier MOD_EQ expression STMT_END
     '''
-    p[0] = ast.CompoundOperation(p[1], p[3], p[2])
+    p[0] = located(ast.CompoundOperation(p[1], p[3], p[2]), p)
 
 
 def p_increment_decrement_identifiers(p):
@@ -252,9 +320,9 @@ def p_increment_decrement_identifiers(p):
                | identifier DOUBLE_MINUS
     '''
     if p[2] == '++':
-        p[0] = ast.BinaryOperation(p[1], ast.Primitive(1), '+')
+        p[0] = located(ast.BinaryOperation(p[1], ast.Primitive(1), '+'), p)
     else:
-        p[0] = ast.BinaryOperation(p[1], ast.Primitive(1), '-')
+        p[0] = located(ast.BinaryOperation(p[1], ast.Primitive(1), '-'), p)
 
 
 def p_expression(p):
@@ -271,28 +339,28 @@ def p_for_loop(p):
     statement : FOR identifier IN expression ARROW_LTR expression LBRACK statement_list RBRACK
               | FOR identifier IN expression ARROW_RTL expression LBRACK statement_list RBRACK
     '''
-    p[0] = ast.For(p[2], p[4], p[6], p[5] == '->', p[8])
+    p[0] = located(ast.For(p[2], p[4], p[6], p[5] == '->', p[8]), p)
 
 
 def p_for_in_loop(p):
     '''
     statement : FOR identifier IN expression LBRACK statement_list RBRACK
     '''
-    p[0] = ast.ForIn(p[2], p[4], p[6])
+    p[0] = located(ast.ForIn(p[2], p[4], p[6]), p)
 
 
 def p_while_loop(p):
     '''
     statement : WHILE expression LBRACK statement_list RBRACK
     '''
-    p[0] = ast.While(p[2], p[4])
+    p[0] = located(ast.While(p[2], p[4]), p)
 
 
 def p_for_loop_infinite(p):
     '''
     statement : FOR LBRACK statement_list RBRACK
     '''
-    p[0] = ast.While(ast.Primitive(True), p[3])
+    p[0] = located(ast.While(ast.Primitive(True), p[3]), p)
 
 
 def p_function_declaration(p):
@@ -303,16 +371,36 @@ def p_function_declaration(p):
     p[2].is_function = True
 
     if len(p) == 9:
-        p[0] = ast.Assignment(p[2], ast.Function(p[4], p[7]))
+        p[0] = located(ast.Assignment(p[2], ast.Function(p[4], p[7])), p)
+    else:
+        p[0] = located(ast.Assignment(p[2], ast.Function(ast.InstructionList(), p[4])), p)
+
+
+def p_memo_function_declaration(p):
+    '''
+    statement : MEMO FUNCTION identifier LPAREN arguments RPAREN LBRACK statement_list RBRACK
+              | MEMO FUNCTION identifier LBRACK statement_list RBRACK
+    '''
+    p[3].is_function = True
+
+    if len(p) == 10:
+        p[0] = located(ast.Assignment(p[3], ast.Function(p[5], p[8], memo=True)), p)
     else:
-        p[0] = ast.Assignment(p[2], ast.Function(ast.InstructionList(), p[4]))
+        p[0] = located(ast.Assignment(p[3], ast.Function(ast.InstructionList(), p[5], memo=True)), p)
 
 
 def p_return(p):
     '''
     statement : RETURN expression STMT_END
     '''
-    p[0] = ast.ReturnStatement(p[2])
+    p[0] = located(ast.ReturnStatement(p[2]), p)
+
+
+def p_yield(p):
+    '''
+    statement : YIELD expression STMT_END
+    '''
+    p[0] = located(ast.Yield(p[2]), p)
 
 
 def p_function_call(p):
@@ -322,7 +410,24 @@ def p_function_call(p):
 
     '''
     p[1].is_function = True
-    p[0] = ast.FunctionCall(p[1], p[3])
+    p[0] = located(ast.FunctionCall(p[1], p[3]), p)
+
+
+def p_spawn(p):
+    '''
+    expression : SPAWN identifier LPAREN arguments RPAREN
+    statement : SPAWN identifier LPAREN arguments RPAREN STMT_END
+    '''
+    p[2].is_function = True
+    p[0] = located(ast.Spawn(located(ast.FunctionCall(p[2], p[4]), p, 2)), p)
+
+
+def p_await(p):
+    '''
+    expression : AWAIT expression
+    statement : AWAIT expression STMT_END
+    '''
+    p[0] = located(ast.Await(p[2]), p)
 
 
 def p_error(p):
@@ -332,5 +437,23 @@ def p_error(p):
     raise ParserSyntaxError("Unexpected end of input")
 
 
-def get_parser():
-    return yacc.yacc(errorlog=yacc.NullLogger()) if disable_warnings else yacc.yacc()
\ No newline at end of file
+def get_parser(quiet: bool=None):
+    '''
+    Returns a new parser. The LALR tables are built once per process: they
+    ship next to this file and are loaded as long as their signature matches
+    the grammar, otherwise they're generated again (slow) and written back.
+    Every parser shares them, but ply parsers keep the stacks of the parse
+    they run so each interpreter needs one of its own
+    '''
+
+    global _parser
+
+    if quiet is None:
+        quiet = disable_warnings
+
+    with _lock:
+        if _parser is None:
+            # no parser.out, that's for debugging the grammar
+            _parser = yacc.yacc(debug=False, picklefile=TABLES, errorlog=yacc.NullLogger() if quiet else None)
+
+    return copy.copy(_parser)
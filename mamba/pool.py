@@ -0,0 +1,88 @@
+import collections
+import concurrent.futures
+import copy
+import io
+import os
+import time
+from mamba.budget import Budget
+from mamba.interpreter import Interpreter
+from mamba.symbol_table import MAX_DEPTH
+
+# Outcome of one program, status is 0 when it ran to completion and 1 when it raised
+Result = collections.namedtuple('Result', ['status', 'output', 'error', 'elapsed'])
+
+
+class Pool:
+    """
+    Runs programs concurrently on a pool of threads, for serving Mamba from a
+    threaded server. Every program runs in a fresh interpreter and its output
+    is collected in its result instead of going to stdout, the parser tables
+    are loaded once and shared by all of them.
+
+    Threads share the GIL, programs only run in parallel while they wait on
+    files or input: mamba.batch runs scripts on several processes to use every
+    core
+    """
+
+    def __init__(self, workers: int=None, engine: str='tree', optimize: bool=True, max_depth: int=MAX_DEPTH,
+                 scanner: bool=False, budget: Budget=None):
+        self.engine = engine
+        self.optimize = optimize
+        self.max_depth = max_depth
+        self.scanner = scanner
+
+        # the limits of every program, each one counts against a copy of its own
+        self.budget = budget
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers or (os.cpu_count() or 1) * 4,
+                                                              thread_name_prefix='mamba-pool')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, source: str, argv: list=None) -> Result:
+        """
+        Runs the source on the calling thread
+        """
+
+        output = io.StringIO()
+        status, error = 0, None
+        start = time.perf_counter()
+
+        try:
+            budget = copy.copy(self.budget) if self.budget is not None else None
+            interpreter = Interpreter(self.engine, self.optimize, argv=argv if argv is not None else [],
+                                      max_depth=self.max_depth, scanner=self.scanner, output=output, budget=budget)
+            interpreter.execute(source)
+        except Exception as e:
+            status, error = 1, e.__class__.__name__ + ': ' + str(e)
+
+        return Result(status, output.getvalue(), error, time.perf_counter() - start)
+
+    def submit(self, source: str, argv: list=None) -> concurrent.futures.Future:
+        """
+        Starts running the source, returns the future of its Result
+        """
+
+        return self.executor.submit(self.run, source, argv)
+
+    def map(self, sources):
+        """
+        Runs the sources, yielding their results in the order they were given
+        """
+
+        return self.executor.map(self.run, sources)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def run_many(sources, workers: int=None, engine: str='tree', optimize: bool=True, budget: Budget=None) -> list:
+    """
+    Runs the sources concurrently, returns the list of their results
+    """
+
+    with Pool(workers, engine, optimize, budget=budget) as pool:
+        return list(pool.map(sources))
@@ -0,0 +1,246 @@
+import time
+import mamba.ast as ast
+
+# Name of the frame of the top level statements
+MAIN = '<main>'
+
+
+class _Stats:
+    __slots__ = ('calls', 'total', 'self', 'lineno', 'depth')
+
+    def __init__(self, lineno=None):
+        self.calls = 0
+        self.total = 0.0
+        self.self = 0.0
+        self.lineno = lineno
+
+        # active calls, only the outermost of recursive calls adds to the total
+        self.depth = 0
+
+
+class _LineProbe(ast.BaseExpression):
+    """
+    Stands in for a statement, timing it and attributing the time to its line
+    """
+
+    def __init__(self, node: ast.BaseExpression, stats: _Stats, profiler: 'Profiler'):
+        self.node = node
+        self.stats = stats
+        self.profiler = profiler
+
+        # statements of generator functions are run through gen_execute, left untimed
+        if node.gen_execute is not None:
+            self.gen_execute = node.gen_execute
+
+    def __repr__(self):
+        return repr(self.node)
+
+    def eval(self):
+        return self.__timed(self.node.eval)
+
+    def execute(self):
+        return self.__timed(self.node.execute)
+
+    def __timed(self, run):
+        profiler = self.profiler
+        stats = self.stats
+        nested = profiler.nested
+
+        nested.append(0.0)
+        stats.depth += 1
+        start = profiler.timer()
+
+        try:
+            return run()
+        finally:
+            elapsed = profiler.timer() - start
+            stats.depth -= 1
+            stats.calls += 1
+            stats.self += elapsed - nested.pop()
+            nested[-1] += elapsed
+
+            if stats.depth == 0:
+                stats.total += elapsed
+
+
+class _FunctionProbe(ast.BaseExpression):
+    """
+    Stands in for a declared function, timing its calls and keeping track of the Mamba call stack
+    """
+
+    def __init__(self, name: str, function: ast.Function, stats: _Stats, profiler: 'Profiler'):
+        self.name = name
+        self.function = function
+        self.params = function.params
+        self.varnames = function.varnames
+        self.memo = function.memo
+        self.stats = stats
+        self.profiler = profiler
+
+    def __repr__(self):
+        return repr(self.function)
+
+    def eval(self, args: list, caller: list=None):
+        profiler = self.profiler
+        stats = self.stats
+        nested, callees, stack = profiler.nested, profiler.callees, profiler.stack
+
+        nested.append(0.0)
+        callees.append(0.0)
+        stack.append(self.name)
+        stats.depth += 1
+        start = profiler.timer()
+
+        try:
+            return self.function.eval(args, caller)
+        finally:
+            elapsed = profiler.timer() - start
+            own = elapsed - callees.pop()
+
+            stats.depth -= 1
+            stats.calls += 1
+            stats.self += own
+
+            if stats.depth == 0:
+                stats.total += elapsed
+
+            path = tuple(stack)
+            profiler.stacks[path] = profiler.stacks.get(path, 0.0) + own
+
+            stack.pop()
+            nested.pop()
+            nested[-1] += elapsed
+            callees[-1] += elapsed
+
+
+class Profiler:
+    """
+    Instrumenting profiler for the tree engine, attributes time and call
+    counts to Mamba functions and source lines.
+
+    instrument() wraps every statement of a resolved tree in a probe timing
+    it and every function declaration in one keeping the Mamba call stack.
+    Self time of a line excludes the statements nested in it (loop and if
+    bodies) and the functions it calls, self time of a function excludes
+    the functions it calls
+    """
+
+    # attributes of the nodes holding a list of statements
+    __blocks = ('body', 'truepart', 'elsepart')
+
+    def __init__(self, timer=time.perf_counter):
+        self.timer = timer
+        self.functions = {MAIN: _Stats()}
+        self.lines = {}  # (function, lineno) -> stats
+        self.stacks = {}  # call stack -> self time
+
+        # time spent in probes nested in each active probe and in functions called by each active function
+        self.nested = [0.0]
+        self.callees = [0.0]
+        self.stack = [MAIN]
+
+        self.__start = None
+
+    def instrument(self, tree: ast.InstructionList):
+        self.__instrument_block(tree, MAIN)
+
+    def __instrument_block(self, block: ast.InstructionList, function: str):
+        block.children = [self.__instrument_statement(n, function) for n in block]
+
+    def __instrument_statement(self, node, function: str):
+        if not isinstance(node, ast.BaseExpression):
+            return node
+
+        self.__instrument_node(node, function)
+
+        # blocks check for exit signals by type, those are cheap and only their return value is timed
+        if isinstance(node, ast.ExitStatement) or node.lineno is None:
+            return node
+
+        key = (function, node.lineno)
+
+        if key not in self.lines:
+            self.lines[key] = _Stats(node.lineno)
+
+        return _LineProbe(node, self.lines[key], self)
+
+    def __instrument_node(self, node, function: str):
+        if isinstance(node, ast.Assignment) and node.identifier.is_function:
+            name = node.identifier.name
+
+            self.functions[name] = _Stats(node.lineno)
+            self.__instrument_block(node.val.body, name)
+            node.val = _FunctionProbe(name, node.val, self.functions[name], self)
+            return
+
+        if isinstance(node, ast.ReturnStatement):
+            node.expr = self.__instrument_statement(node.expr, function)
+            return
+
+        for k, v in vars(node).items():
+            if k in self.__blocks and isinstance(v, ast.InstructionList):
+                self.__instrument_block(v, function)
+            elif k in self.__blocks and isinstance(v, ast.If):
+                # else if chains
+                self.__instrument_node(v, function)
+            elif isinstance(node, ast.BufferedLoop) and k == 'loop':
+                self.__instrument_node(v, function)
+
+    def start(self):
+        self.__start = self.timer()
+
+    def stop(self):
+        elapsed = self.timer() - self.__start
+        main = self.functions[MAIN]
+
+        main.calls += 1
+        main.total += elapsed
+        main.self += elapsed - self.callees[0]
+        self.stacks[(MAIN,)] = self.stacks.get((MAIN,), 0.0) + elapsed - self.callees[0]
+
+    def report(self, file, source: str=None, limit: int=30):
+        """
+        Writes the functions and the lines with the most self time
+        """
+
+        lines = source.splitlines() if source is not None else []
+
+        def ms(seconds):
+            return '%10.3f' % (seconds * 1000)
+
+        print('=' * 80, file=file)
+        print('Functions (times in ms)', file=file)
+        print('%8s %10s %10s  %s' % ('calls', 'total', 'self', 'function'), file=file)
+
+        for name, stats in sorted(self.functions.items(), key=lambda kv: kv[1].self, reverse=True):
+            if stats.calls == 0:
+                continue
+
+            where = '' if stats.lineno is None else ' (line %d)' % stats.lineno
+            print('%8d %s %s  %s%s' % (stats.calls, ms(stats.total), ms(stats.self), name, where), file=file)
+
+        print(file=file)
+        print('Lines (times in ms)', file=file)
+        print('%8s %10s %10s %6s  %-16s %s' % ('hits', 'total', 'self', 'line', 'function', 'source'), file=file)
+
+        hot = sorted(self.lines.items(), key=lambda kv: kv[1].self, reverse=True)
+
+        for (function, lineno), stats in hot[:limit]:
+            if stats.calls == 0:
+                continue
+
+            text = lines[lineno - 1].strip() if 0 < lineno <= len(lines) else ''
+            print('%8d %s %s %6d  %-16s %s' % (stats.calls, ms(stats.total), ms(stats.self), lineno, function, text),
+                  file=file)
+
+    def write_stacks(self, file):
+        """
+        Writes the collapsed call stacks with their self time in microseconds,
+        the input format of flamegraph.pl and compatible tools
+        """
+
+        for path, seconds in sorted(self.stacks.items()):
+            samples = int(round(seconds * 1000000))
+
+            if samples > 0:
+                print('%s %d' % (';'.join(path), samples), file=file)
@@ -0,0 +1,122 @@
+import argparse
+import sys
+import mamba.lexer
+from mamba.exceptions import *
+from mamba.interpreter import Interpreter, engines
+
+try:
+    # line editing and history where available
+    import readline
+except ImportError:
+    readline = None
+
+PS1 = '>>> '
+PS2 = '... '
+
+OPENING = ('LPAREN', 'LBRACK', 'LSQBRACK')
+CLOSING = ('RPAREN', 'RBRACK', 'RSQBRACK')
+
+
+def is_complete(source: str) -> bool:
+    """
+    Whether the typed source can be run or more lines are needed, which is
+    when a bracket is left open. Sources the lexer can't read are complete,
+    running them reports the error
+    """
+
+    lexer = mamba.lexer.lexer.clone()
+    lexer.input(source)
+    depth = 0
+
+    try:
+        for tok in iter(lexer.token, None):
+            if tok.type in OPENING:
+                depth += 1
+            elif tok.type in CLOSING:
+                depth -= 1
+    except UnexpectedCharacter:
+        return True
+
+    return depth <= 0
+
+
+class Repl:
+    """
+    Interactive session: every statement typed runs in the same interpreter
+    so functions and globals stay declared until the session ends.
+
+    Input is read until the brackets are balanced, an empty line runs what
+    was typed so far. Expressions typed without a semicolon have their value
+    printed
+    """
+
+    def __init__(self, interpreter: Interpreter, input=input, output=sys.stdout):
+        self.interpreter = interpreter
+        self.input = input
+        self.output = output
+
+    def read(self):
+        """
+        Returns the next source to run, None at the end of the input
+        """
+
+        lines = []
+
+        while True:
+            try:
+                line = self.input(PS2 if lines else PS1)
+            except KeyboardInterrupt:
+                # discards what was typed so far
+                print(file=self.output)
+                lines = []
+                continue
+            except EOFError:
+                return '\n'.join(lines) if lines else None
+
+            if not line.strip() and not lines:
+                continue
+
+            lines.append(line)
+            source = '\n'.join(lines).strip()
+
+            if not line.strip() or is_complete(source):
+                return source
+
+    def run(self, source: str):
+        if not source.endswith((';', '}')):
+            try:
+                self.interpreter.parse('say %s, "\\n";' % source)
+            except (ParserSyntaxError, UnexpectedCharacter):
+                pass
+            else:
+                source = 'say %s, "\\n";' % source
+
+        try:
+            self.interpreter.execute(source)
+        except KeyboardInterrupt:
+            print('KeyboardInterrupt', file=self.output)
+        except Exception as e:
+            # python errors (division by zero, index out of range) end the statement, not the session
+            print(e.__class__.__name__ + ': ' + str(e), file=sys.stderr)
+
+    def loop(self):
+        while True:
+            source = self.read()
+
+            if source is None:
+                print(file=self.output)
+                return
+
+            self.run(source)
+            sys.stdout.flush()
+
+
+def main(argv: list):
+    parser = argparse.ArgumentParser(prog='mamba.py repl', description='Interactive Mamba session')
+    parser.add_argument('-e', '--engine', choices=engines, default='tree')
+    parser.add_argument('--no-optimize', dest='optimize', action='store_false')
+    args = parser.parse_args(argv)
+
+    Repl(Interpreter(args.engine, args.optimize)).loop()
+
+    return 0
@@ -0,0 +1,182 @@
+import functools
+import operator
+import re
+import mamba.lexer
+from mamba.exceptions import *
+
+# Punctuation and operators, longest first so that the regex takes the longest one, like ply does
+OPERATORS = {
+    '**=': 'EXP_EQ',
+
+    '**': 'EXP',
+    '+=': 'PLUS_EQ',
+    '-=': 'MINUS_EQ',
+    '*=': 'MUL_EQ',
+    '/=': 'DIV_EQ',
+    '%=': 'MOD_EQ',
+    '++': 'DOUBLE_PLUS',
+    '--': 'DOUBLE_MINUS',
+    '==': 'EQ',
+    '!=': 'NEQ',
+    '>=': 'GTE',
+    '<=': 'LTE',
+    '->': 'ARROW_LTR',
+    '<-': 'ARROW_RTL',
+    '>>': 'RSHIFT',
+    '<<': 'LSHIFT',
+
+    ',': 'COMMA',
+    '+': 'PLUS',
+    '-': 'MINUS',
+    '*': 'MUL',
+    '/': 'DIV',
+    '%': 'MOD',
+    ';': 'STMT_END',
+    '?': 'QUESTION_MARK',
+    '=': 'EQUALS',
+    ':': 'COLON',
+    '(': 'LPAREN',
+    ')': 'RPAREN',
+    '{': 'LBRACK',
+    '}': 'RBRACK',
+    '[': 'LSQBRACK',
+    ']': 'RSQBRACK',
+    '>': 'GT',
+    '<': 'LT',
+    '&': 'BIT_AND',
+    '|': 'BIT_OR',
+    '^': 'BIT_XOR',
+    '~': 'BIT_NEG',
+}
+
+# Alternatives which can match at the same position are in the order of the rules of mamba.lexer: true
+# and false before identifiers (true_x is 'true' followed by '_x'), floats before ints and comments
+# before divisions. mamba.lexer counts a newline only when it isn't preceded by other whitespace, which
+# swallows the newlines that follow it, so only the newlines starting a run of whitespace count
+TOKEN = re.compile('|'.join([
+    r'(?P<NEWLINE>\n+(?:[^\S\n]\s*)?)',
+    r'(?P<WS>\s+)',
+    r'(?P<TRUE>true)',
+    r'(?P<FALSE>false)',
+    r'(?P<IDENTIFIER>[\$_a-zA-Z]\w*)',
+    r'(?P<NUM_FLOAT>\d*\.\d+)',
+    r'(?P<NUM_INT>\d+)',
+    r'(?P<STRING>"(?:\\"|.)*?")',
+    r'(?P<COMMENT>//.+)',
+    '(?P<OP>%s)' % '|'.join(re.escape(op) for op in OPERATORS),
+]))
+
+
+class Token(tuple):
+    """
+    Token with the attributes of ply's, a tuple since those are much faster to create than objects
+    """
+
+    type = property(operator.itemgetter(0))
+    value = property(operator.itemgetter(1))
+    lineno = property(operator.itemgetter(2))
+    lexpos = property(operator.itemgetter(3))
+
+    def __repr__(self):
+        return 'Token(%s,%r,%d,%d)' % self
+
+
+def unescape(text: str) -> str:
+    # the decoding done by mamba.lexer, which doesn't change plain ascii strings
+    if text.isascii() and '\\' not in text:
+        return text
+
+    return bytes(text, "utf-8").decode("unicode_escape")
+
+
+class Scanner:
+    """
+    Hand written replacement of the ply lexer of mamba.lexer producing the
+    same tokens, values, line numbers and positions, errors included. It
+    can be passed to the parser as its lexer.
+
+    Tokens are matched by one regex and turned into tokens in a single
+    loop, instead of calling a rule function per token like ply. Like the
+    ply lexer, lineno and lexpos can be set between input() and the first
+    token and tell where the scanner is after each token
+    """
+
+    def __init__(self):
+        self.lexdata = None
+        self.lexpos = 0
+        self.lineno = 1
+
+    def input(self, data: str):
+        self.lexdata = data
+        self.lexpos = 0
+
+        # the tokens are generated on demand, so that lexer errors are raised where the parser gets to them,
+        # and token() calls right into the generator
+        self.token = functools.partial(next, self.__scan(), None)
+
+    def clone(self) -> 'Scanner':
+        res = Scanner()
+        res.lineno = self.lineno
+
+        if self.lexdata is not None:
+            res.input(self.lexdata)
+            res.lexpos = self.lexpos
+
+        return res
+
+    def token(self):
+        # replaced by input()
+        raise RuntimeError('No input string given with input()')
+
+    def __iter__(self):
+        return iter(self.token, None)
+
+    def __scan(self):
+        source = self.lexdata
+        pos = self.lexpos
+        lineno = self.lineno
+        operators = OPERATORS
+        reserved = mamba.lexer.reserved
+        match = TOKEN.match
+        new = tuple.__new__
+
+        while pos < len(source):
+            m = match(source, pos)
+
+            if m is None:
+                self.lexpos, self.lineno = pos, lineno
+                raise UnexpectedCharacter("Unexpected character '%s' at line %d" % (source[pos], lineno))
+
+            kind = m.lastgroup
+            text = m.group()
+            end = m.end()
+
+            if kind == 'IDENTIFIER':
+                tok = new(Token, (reserved.get(text, 'IDENTIFIER'), text, lineno, pos))
+            elif kind == 'OP':
+                tok = new(Token, (operators[text], text, lineno, pos))
+            elif kind == 'NEWLINE':
+                lineno += len(text) - len(text.lstrip('\n'))
+                pos = end
+                continue
+            elif kind == 'WS' or kind == 'COMMENT':
+                pos = end
+                continue
+            elif kind == 'NUM_INT':
+                tok = new(Token, (kind, int(text), lineno, pos))
+            elif kind == 'NUM_FLOAT':
+                tok = new(Token, (kind, float(text), lineno, pos))
+            elif kind == 'STRING':
+                # all the quotes at both ends go, like in mamba.lexer, which is past the string
+                # if decoding it fails
+                self.lexpos, self.lineno = end, lineno
+                tok = new(Token, (kind, unescape(text.strip('"')), lineno, pos))
+            else:
+                tok = new(Token, (kind, kind == 'TRUE', lineno, pos))
+
+            self.lexpos = pos = end
+            self.lineno = lineno
+
+            yield tok
+
+        self.lexpos, self.lineno = pos, lineno
@@ -0,0 +1,176 @@
+import mamba.ast as ast
+from mamba.exceptions import *
+
+
+def assigned_names(body: ast.InstructionList):
+    """
+    Returns the names of the variables bound inside a function body
+    (not counting the bodies of functions declared in it) in order of appearance
+    """
+
+    names = {}
+
+    def visit(node):
+        if isinstance(node, ast.Function):
+            return
+
+        if isinstance(node, (ast.Assignment, ast.CompoundOperation)):
+            identifier = node.identifier
+        elif isinstance(node, (ast.For, ast.ForIn)):
+            identifier = node.variable
+        else:
+            identifier = None
+
+        if identifier is not None and not identifier.is_function and identifier.name not in names:
+            names[identifier.name] = True
+
+        for child in ast.iter_child_nodes(node):
+            visit(child)
+
+    visit(body)
+
+    return list(names)
+
+
+# builtins with side effects or whose results don't depend on their arguments alone
+IMPURE_BUILTINS = ('ask', 'rand', 'randrange', 'time')
+
+# builtins modifying the array or map passed as their first argument
+MUTATING_BUILTINS = (
+    'array_insert', 'array_pop', 'array_push', 'array_remove', 'array_reverse', 'array_sort', 'array_extend',
+    'array_fill', 'map_remove', 'strbuf_append', 'strbuf_join'
+)
+
+
+def impurity(node: ast.Function):
+    """
+    Returns what makes the function unfit for memoization or None if nothing
+    was found: printing, calling impure builtins or writing to arrays it did
+    not create itself. Calls to other user functions are not followed
+    """
+
+    if node.is_generator:
+        return 'is a generator'
+
+    # arrays held by these were created by the function
+    created = set(assigned_names(node.body)) - {p.name for p in node.params}
+
+    def visit(n):
+        if isinstance(n, ast.Function):
+            return None
+        elif isinstance(n, ast.PrintStatement):
+            return 'calls say'
+        elif isinstance(n, ast.FunctionCall):
+            name = n.name.name
+
+            if name in IMPURE_BUILTINS or name.startswith('file'):
+                return 'calls ' + name
+
+            target = n.params.children[0] if name in MUTATING_BUILTINS and len(n.params) else None
+
+            if isinstance(target, ast.Identifier) and target.name not in created:
+                return "modifies '%s' with %s" % (target.name, name)
+        elif isinstance(n, (ast.ArrayAssign, ast.ArraySliceAssign)) and n.array.name not in created:
+            return "writes to '%s'" % n.array.name
+
+        for child in ast.iter_child_nodes(n):
+            reason = visit(child)
+
+            if reason is not None:
+                return reason
+
+        return None
+
+    return visit(node.body)
+
+
+class Resolver:
+    """
+    Resolves every variable to a slot before execution.
+
+    Parameters and variables assigned anywhere in a function are local to it
+    and get an index in the per call list of local slots, everything else
+    (including all the top level variables) is global. When a symbol table is
+    given globals get their index in its global list, otherwise they are only
+    marked as global and left to be looked up by name.
+
+    Functions see the variables of their callers (see mamba.symbol_table), so
+    the variables read in a function which aren't local to it are `free`, or
+    `outer` when they are local to a function it's declared in: the depth of
+    that function, its scope and the slot, where the variable is when the
+    functions are called by the ones they are declared in.
+
+    Identifier nodes get `local`, `slot`, `free` and `outer` set, Function
+    nodes get `varnames` (the name of each local slot), `param_slots` and
+    `scope` (the slot of each name)
+    """
+
+    def __init__(self, symbols=None):
+        self.symbols = symbols
+
+    def resolve_program(self, tree: ast.InstructionList):
+        self.__visit(tree, ())
+
+    def resolve_function(self, node: ast.Function, enclosing: tuple=()):
+        """
+        enclosing are the scopes of the functions the function is declared in, innermost first
+        """
+
+        params = [p.name for p in node.params]
+        scope = {}
+
+        for name in params + assigned_names(node.body):
+            if name not in scope:
+                scope[name] = len(scope)
+
+        node.varnames = list(scope)
+        node.param_slots = [scope[p] for p in params]
+        node.scope = scope
+
+        self.__visit(node.params, (scope,) + enclosing)
+        self.__visit(node.body, (scope,) + enclosing)
+
+    def __visit(self, node, scopes: tuple):
+        if isinstance(node, ast.Yield) and not scopes:
+            raise ParserSyntaxError("'yield' outside of a function at line %s" % node.lineno)
+
+        if isinstance(node, ast.Identifier):
+            if node.is_function:
+                return
+
+            node.free = False
+            node.outer = None
+
+            if scopes and node.name in scopes[0]:
+                node.local = True
+                node.slot = scopes[0][node.name]
+                return
+
+            node.local = False
+            node.slot = self.symbols.global_slot(node.name) if self.symbols is not None else None
+
+            for depth, scope in enumerate(scopes[1:], 1):
+                if node.name in scope:
+                    node.outer = (depth, scope, scope[node.name])
+                    return
+
+            node.free = bool(scopes)
+            return
+
+        if isinstance(node, ast.Assignment) and node.identifier.is_function and node.val.memo:
+            reason = impurity(node.val)
+
+            if reason is not None:
+                msg = "Can not memoize function '%s' declared at line %s, it %s"
+                raise ParserSyntaxError(msg % (node.identifier.name, node.lineno, reason))
+
+        if isinstance(node, ast.Function):
+            self.resolve_function(node, scopes)
+            return
+
+        for child in ast.iter_child_nodes(node):
+            self.__visit(child, scopes)
+
+
+def resolve(tree: ast.InstructionList, symbols=None):
+    Resolver(symbols).resolve_program(tree)
@@ -0,0 +1,102 @@
+import contextvars
+import queue
+import sys
+import threading
+
+# Python frames a nested Mamba call takes at most, the tree and closure engines nest a few python
+# calls per Mamba call and generators and memo functions recurse in python on every engine
+FRAMES_PER_CALL = 16
+
+# Python frames below the first Mamba call of a thread
+BASE_FRAMES = 50
+
+
+class Stack:
+    """
+    The python stack nested Mamba calls run on, grown in segments.
+
+    Python stops recursing at sys.getrecursionlimit() frames, which only fits
+    a few dozen nested calls of the tree and closure engines. Rather than
+    raising that process wide limit, every `calls` nested calls the engines
+    make the next call with call(), when depth // calls > level. It goes on on
+    a thread of its own, starting with an empty python stack, while the thread
+    it's made on waits for it. Only one of them runs at a time.
+
+    Segment threads are kept for the next calls reaching their depth until
+    close(), every call made that deep would otherwise start a thread
+    """
+
+    def __init__(self, calls: int=None):
+        if calls is None:
+            calls = (sys.getrecursionlimit() - BASE_FRAMES) // FRAMES_PER_CALL
+
+        self.calls = max(calls, 1)
+
+        # segments in use
+        self.level = 0
+        self.__segments = []
+
+    def call(self, func, *args):
+        """
+        Calls func(*args) on the next segment in a copy of the caller's context,
+        returns what it returned or raises what it raised
+        """
+
+        level = self.level
+
+        if level == len(self.__segments):
+            self.__segments.append(_Segment())
+
+        self.level = level + 1
+
+        try:
+            return self.__segments[level].call(contextvars.copy_context(), func, args)
+        finally:
+            self.level = level
+
+    def close(self):
+        """
+        Ends the segment threads, the stack can still be used afterwards
+        """
+
+        for segment in self.__segments:
+            segment.close()
+
+        self.__segments = []
+
+
+class _Segment:
+    def __init__(self):
+        self.__calls = queue.SimpleQueue()
+        self.__results = queue.SimpleQueue()
+
+        # daemon so that a program left running doesn't keep the process alive
+        threading.Thread(target=self.__serve, name='mamba-segment', daemon=True).start()
+
+    def call(self, context: contextvars.Context, func, args: tuple):
+        self.__calls.put((context, func, args))
+        error, value = self.__results.get()
+
+        if error is not None:
+            raise error
+
+        return value
+
+    def close(self):
+        self.__calls.put(None)
+
+    def __serve(self):
+        while True:
+            call = self.__calls.get()
+
+            if call is None:
+                return
+
+            context, func, args = call
+
+            try:
+                result = (None, context.run(func, *args))
+            except BaseException as e:
+                result = (e, None)
+
+            self.__results.put(result)
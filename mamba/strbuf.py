@@ -0,0 +1,102 @@
+import operator
+import sys
+from mamba.exceptions import *
+
+# Size of an empty str, what every part held by a buffer costs on top of its characters
+_STR_SIZE = sys.getsizeof('')
+
+
+class StrBuf:
+    """
+    Mutable string made of the parts appended to it, which are joined once
+    when the string is needed. Appending takes the same time however long
+    the buffer is, building a string of n parts is linear instead of the
+    quadratic cost of concatenating n times
+    """
+
+    __slots__ = ('parts', 'length')
+
+    # changes after it's made, it can't key memo results or maps
+    __hash__ = None
+
+    def __init__(self, parts: list=None):
+        self.parts = parts if parts is not None else []
+        self.length = sum(len(p) for p in self.parts)
+
+    def __repr__(self):
+        return '<strbuf length={0}>'.format(self.length)
+
+    def __str__(self):
+        return self.value()
+
+    def __len__(self):
+        return self.length
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self.parts) + len(self.parts) * _STR_SIZE + self.length
+
+    def append(self, value: str):
+        self.parts.append(value)
+        self.length += len(value)
+
+    def value(self) -> str:
+        """
+        The string held, the parts are replaced by it so they're only joined again after more appends
+        """
+
+        parts = self.parts
+
+        if len(parts) != 1:
+            self.parts = parts = [''.join(parts)]
+
+        return parts[0]
+
+
+class Builder(StrBuf):
+    """
+    Held by a variable instead of its string while a loop appends to it, see concat()
+    """
+
+    __slots__ = ()
+
+
+def concat(l, r):
+    """
+    l += r for variables the optimizer found are only appended to inside a
+    loop (see mamba.optimizer): appending a string to a string gives a
+    Builder which the variable holds until the loop ends, then the engine
+    running the loop (see mamba.ast.BufferedLoop) assigns the variable the
+    Builder's value(), the joined string. Anything else is added as usual
+    """
+
+    if l.__class__ is Builder:
+        if r.__class__ is str:
+            l.parts.append(r)
+            l.length += len(r)
+            return l
+
+        l = l.value()
+    elif l.__class__ is str and r.__class__ is str:
+        return Builder([l, r])
+
+    try:
+        return operator.iadd(l, r)
+    except TypeError:
+        fmt = (l.__class__.__name__, l, r.__class__.__name__, r)
+        raise InterpreterRuntimeError("Unable to apply operation (%s: %s) += (%s: %s)" % fmt)
+
+
+def strbuf(value=None) -> StrBuf:
+    return StrBuf([str(value)] if value is not None else None)
+
+
+def strbuf_append(buf: StrBuf, value):
+    buf.append(str(value))
+
+
+def strbuf_join(buf: StrBuf, values: list, separator: str=''):
+    buf.append(separator.join(map(str, values)))
+
+
+def strbuf_str(buf: StrBuf) -> str:
+    return buf.value()
@@ -1,63 +1,275 @@
+from mamba.budget import Budget
+from mamba.stack import Stack
 from mamba.exceptions import *
 
 
+class _Unset:
+    def __repr__(self):
+        return '<unset>'
+
+
+# Value of the slots of variables which have not been assigned yet
+UNSET = _Unset()
+
+# Deepest nesting of user function calls, tail calls don't nest
+MAX_DEPTH = 10000
+
+
+def frame(size: int, scope: dict, caller: list) -> list:
+    '''
+    Returns the local slots of a call: size unset variables followed by the
+    scope of the function (name -> slot) and the frame of its caller, None
+    when called from the top level or from python (builtins, memo functions)
+    '''
+
+    slots = [UNSET] * (size + 2)
+    slots[-2] = scope
+    slots[-1] = caller
+
+    return slots
+
+
+def link_tail_call(replaced: list, frame: list):
+    '''
+    Links the frame of a function called by ret f(...) in place of the call
+    replaced belongs to. The callee sees the variables of replaced as if the
+    call was nested: those it has a variable of the same name for are copied
+    to it when unset, replaced can't change anymore, and replaced is only
+    kept as the caller for the others, so tail recursion doesn't hold on to
+    the frames it replaced
+    '''
+
+    scope = frame[-2]
+
+    while replaced is not None:
+        for name, slot in replaced[-2].items():
+            value = replaced[slot]
+
+            if value is UNSET:
+                continue
+
+            target = scope.get(name)
+
+            if target is None:
+                frame[-1] = replaced
+                return
+
+            if frame[target] is UNSET:
+                frame[target] = value
+
+        replaced = replaced[-1]
+
+    frame[-1] = None
+
+
 class SymbolTable:
+    '''
+    Variables are resolved to slots before execution (see mamba.scope), globals
+    live in a single list indexed by slot and every function call gets its own
+    list of local slots (see frame()), so reading a local or a global never
+    depends on the depth of the call stack.
+
+    Scoping is dynamic: a function sees the variables of its callers. Those
+    are found by name (see load_dynamic) by walking the frames from the caller
+    down, which is only done for variables which aren't local to the function
+    and which some declared function has as a local, the others are globals
+    '''
+
     __func = 'functions'
     __sym = 'symbols'
+    __globals = 'globals'
     __local = 'local'
 
-    __table = {
-        __func: {},
-        __sym: {},
-        __local: []
-    }
+    def __init__(self, max_depth: int=MAX_DEPTH, budget: Budget=None):
+        # checked by every engine when calling a user function
+        self.max_depth = max_depth
 
-    def __is_local(self):
+        # the python stack the engines nest calls on, see mamba.stack
+        self.stack = Stack()
+
+        # active calls of the closure engine, shared by every program run against the table
+        self.depth = [0]
+
+        # counted down by every engine at loop iterations and calls
+        self.budget = budget if budget is not None else Budget()
+
+        # calls a user function with evaluated arguments, for builtins taking a function like array_sort.
+        # The tree engine's functions evaluate themselves, the other engines set their own
+        self.call = lambda func, args: func.eval(args)
+
+        # names of the local variables of every declared function, a variable read in a function without being
+        # local to it is only looked for in the callers' frames when its name is in there
+        self.local_names = set()
+
+        # every table is independent, see mamba.interpreter.Interpreter
+        self.__table = {
+            self.__func: {},
+            self.__sym: {},  # global name -> slot
+            self.__globals: [],  # global values indexed by slot
+            self.__local: []  # stack of local slot lists, one per active call
+        }
+
+    def table(self):
+        '''
+        Returns a readable snapshot of the table contents
         '''
-        Returns true if symbol table is being called from inside
-        a function rather than the global scope
 
-        :return: bool
+        values = self.__table[self.__globals]
+
+        return {
+            self.__func: self.__table[self.__func],
+            self.__sym: {k: values[i] for k, i in self.__table[self.__sym].items() if values[i] is not UNSET},
+            self.__local: self.__table[self.__local]
+        }
+
+    def globals(self):
         '''
-        return len(self.__table[self.__local]) > 0
+        Returns the list of global values, it only ever grows so evaluators
+        are free to hold on to it
+        '''
+        return self.__table[self.__globals]
 
-    def table(self):
-        return self.__table
+    def frames(self):
+        '''
+        Returns the stack of local slot lists
+        '''
+        return self.__table[self.__local]
 
-    def get_local_table(self):
+    def global_slot(self, sym):
         '''
-        Returns the active local symbol table (the last one on the stack)
+        Returns the slot of a global variable, allocating it on first use
         '''
 
-        t = self.__table[self.__local]
+        slots = self.__table[self.__sym]
 
-        return t[len(t) - 1]
+        if sym not in slots:
+            slots[sym] = len(self.__table[self.__globals])
+            self.__table[self.__globals].append(UNSET)
 
-    def set_local(self, flag):
-        if flag:
-            self.__table[self.__local].append({})
-        else:
-            self.__table[self.__local].pop()
+        return slots[sym]
+
+    def current_frame(self):
+        '''
+        Returns the frame of the running call, None at the top level
+        '''
+
+        frames = self.__table[self.__local]
+
+        return frames[-1] if frames else None
+
+    def push_frame(self, frame: list):
+        frames = self.__table[self.__local]
+
+        if len(frames) >= self.max_depth:
+            raise self.depth_exceeded()
+
+        frames.append(frame)
+
+    def depth_exceeded(self):
+        return RecursionDepthExceeded("Maximum recursion depth of %d exceeded" % self.max_depth)
+
+    def pop_frame(self):
+        self.__table[self.__local].pop()
 
     def get_sym(self, sym):
-        if self.__is_local():
-            # Check all the local symbol tables starting from the current one
-            for tab in reversed(self.__table[self.__local]):
-                if sym in tab:
-                    return tab[sym]
+        '''
+        Returns the value of a global variable by name
+        '''
+
+        slots = self.__table[self.__sym]
 
-        # if not found check the global scope
-        if sym in self.__table[self.__sym]:
-            return self.__table[self.__sym][sym]
+        if sym in slots:
+            val = self.__table[self.__globals][slots[sym]]
+
+            if val is not UNSET:
+                return val
 
         # nope... sorry :(
         raise SymbolNotFound("Undefined variable '%s'" % sym)
 
     def set_sym(self, sym, val):
-        if self.__is_local():
-            self.get_local_table()[sym] = val
+        '''
+        Assigns a global variable by name
+        '''
+        self.__table[self.__globals][self.global_slot(sym)] = val
+
+    def load_global(self, slot, sym):
+        val = self.__table[self.__globals][slot]
+
+        if val is UNSET:
+            raise SymbolNotFound("Undefined variable '%s'" % sym)
+
+        return val
+
+    def store_global(self, slot, val):
+        self.__table[self.__globals][slot] = val
+
+    def load_local(self, slot, sym):
+        frame = self.__table[self.__local][-1]
+        val = frame[slot]
+
+        # locals read before being assigned in the call see the variable of the same name of the callers
+        if val is UNSET:
+            return self.load_dynamic(frame[-1], sym)
+
+        return val
+
+    def load_free(self, slot, sym):
+        '''
+        Reads a variable which isn't local to the running function
+        '''
+
+        if sym in self.local_names:
+            return self.load_dynamic(self.__table[self.__local][-1][-1], sym)
+
+        return self.load_global(slot, sym) if slot is not None else self.get_sym(sym)
+
+    def load_outer(self, frame, outer: tuple, sym):
+        '''
+        Reads a variable local to a function enclosing the running one, outer is
+        the (depth, scope, slot) mamba.scope found for it. When the functions are
+        called by the ones they are declared in the variable is in the frame depth
+        calls down, otherwise it's looked up by name
+        '''
+
+        depth, scope, slot = outer
+        caller = current = frame[-1]
+
+        for _ in range(depth - 1):
+            if current is None or sym in current[-2]:
+                break
+
+            current = current[-1]
         else:
-            self.__table[self.__sym][sym] = val
+            if current is not None and current[-2] is scope:
+                val = current[slot]
+
+                if val is not UNSET:
+                    return val
+
+        return self.load_dynamic(caller, sym)
+
+    def load_dynamic(self, frame, sym):
+        '''
+        Looks a variable up by name in the frames from frame down to the first
+        call, then in the globals
+        '''
+
+        while frame is not None:
+            slot = frame[-2].get(sym)
+
+            if slot is not None:
+                val = frame[slot]
+
+                if val is not UNSET:
+                    return val
+
+            frame = frame[-1]
+
+        return self.get_sym(sym)
+
+    def store_local(self, slot, val):
+        self.__table[self.__local][-1][slot] = val
 
     def get_func(self, name):
         if name in self.__table[self.__func]:
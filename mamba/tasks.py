@@ -0,0 +1,76 @@
+import contextvars
+import threading
+from mamba.exceptions import *
+
+# Threads running spawned builtins, shared by every program of the process. Spawned calls mostly wait on
+# files and input, so there can be many more of them than processors
+MAX_WORKERS = 64
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor() -> 'concurrent.futures.ThreadPoolExecutor':
+    global _executor
+
+    # imported and created on the first spawn, programs which don't spawn anything don't pay for it
+    import concurrent.futures
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix='mamba-task')
+
+    return _executor
+
+
+class Task:
+    """
+    Value of a spawn expression, await gives the result of the call or raises
+    the error it ended with
+    """
+
+    __slots__ = ('future',)
+
+    def __init__(self, future: 'concurrent.futures.Future'):
+        self.future = future
+
+    def __repr__(self):
+        return '<task {0}>'.format('done' if self.future.done() else 'running')
+
+    def result(self):
+        return self.future.result()
+
+
+def spawn(func, args: list) -> Task:
+    """
+    Starts func(*args) on a task thread, in a copy of the caller's context
+    """
+
+    return Task(executor().submit(contextvars.copy_context().run, func, *args))
+
+
+def done(value) -> Task:
+    """
+    Task of a call which has already returned value
+    """
+
+    import concurrent.futures
+
+    future = concurrent.futures.Future()
+    future.set_result(value)
+
+    return Task(future)
+
+
+def wait(value):
+    """
+    Result of awaiting the value: the result of a task, or of each task of an array
+    """
+
+    if isinstance(value, Task):
+        return value.result()
+
+    if isinstance(value, list) and all(isinstance(v, Task) for v in value):
+        return [v.result() for v in value]
+
+    raise InterpreterRuntimeError("Only tasks and arrays of tasks can be awaited, got %s" % value.__class__.__name__)
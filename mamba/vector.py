@@ -0,0 +1,313 @@
+import array
+import itertools
+import operator
+from mamba.exceptions import *
+
+# Set by _import_numpy() when the first typed array is created, numpy takes long to import
+# and most programs never use typed arrays
+numpy = None
+_numpy_checked = False
+
+INT = 'q'
+FLOAT = 'd'
+
+
+def _import_numpy():
+    global numpy, _numpy_checked
+
+    if not _numpy_checked:
+        _numpy_checked = True
+
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+
+
+def _store_error(typecode):
+    kind = 'ints can be stored in an int_array' if typecode == INT else 'numbers can be stored in a float_array'
+    return InterpreterRuntimeError('Only ' + kind)
+
+
+class TypedArray:
+    """
+    Fixed size array of 64 bit ints or floats stored compactly, backed by
+    numpy when it's installed and by array.array otherwise.
+
+    Arithmetic (+ - * / % **) and ordering comparisons (< <= > >=) apply
+    element-wise to another typed array or list of the same size or to a
+    number, comparisons give an int array of 0 and 1. == and != compare
+    whole arrays. The element loops run in native code either way: numpy
+    ufuncs or map() over operator functions. Ints wrap around on overflow
+    when backed by numpy and raise an error otherwise
+    """
+
+    __slots__ = ('typecode', 'data')
+
+    def __init__(self, typecode: str, data):
+        self.typecode = typecode
+        self.data = data
+
+    @classmethod
+    def create(cls, typecode: str, values):
+        """
+        Returns a typed array of the given size filled with zeros, or holding the values of a sequence
+        """
+
+        _import_numpy()
+
+        if isinstance(values, int):
+            values = itertools.repeat(0, values)
+        elif isinstance(values, TypedArray):
+            values = values.tolist()
+
+        values = list(values)
+
+        # numpy would silently truncate floats stored in int arrays or nest arrays
+        if not all(isinstance(v, int if typecode == INT else (int, float)) for v in values):
+            raise _store_error(typecode)
+
+        try:
+            if numpy is not None:
+                return cls(typecode, numpy.array(values, dtype=numpy.int64 if typecode == INT else numpy.float64))
+
+            return cls(typecode, array.array(typecode, values))
+        except (TypeError, ValueError):
+            raise _store_error(typecode)
+        except OverflowError:
+            raise InterpreterRuntimeError("Integer too large for an int_array")
+
+    def tolist(self):
+        return self.data.tolist()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.tolist()) if numpy is not None else iter(self.data)
+
+    def __contains__(self, item):
+        return item in self.data
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TypedArray(self.typecode, self.data[index].copy() if numpy is not None else self.data[index])
+
+        value = self.data[index]
+
+        return value.item() if numpy is not None else value
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            # the size is fixed, a slice can only be replaced by as many values
+            if not isinstance(value, (list, TypedArray)):
+                raise InterpreterRuntimeError("Only arrays can be assigned to a slice")
+
+            values = TypedArray.create(self.typecode, value)
+            size = len(range(len(self.data))[index])
+
+            if len(values) != size:
+                raise InterpreterRuntimeError("Can not assign %d values to a slice of %d items of a typed array" % (
+                    len(values), size))
+
+            self.data[index] = values.data
+            return
+
+        if not isinstance(value, int if self.typecode == INT else (int, float)):
+            raise _store_error(self.typecode)
+
+        self.data[index] = value
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    def __str__(self):
+        return str(self.tolist())
+
+    def __eq__(self, other):
+        if isinstance(other, (TypedArray, list)):
+            return len(self) == len(other) and self.tolist() == list(other)
+
+        return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __operand(self, other):
+        """
+        Returns the native representation of the other operand, with its typecode,
+        or None when the operation doesn't apply to it
+        """
+
+        if isinstance(other, TypedArray):
+            if len(other) != len(self):
+                raise InterpreterRuntimeError("Typed array sizes differ (%d and %d)" % (len(self), len(other)))
+
+            return other.data, other.typecode
+        elif isinstance(other, list):
+            typecode = INT if all(isinstance(v, int) for v in other) else FLOAT
+            return self.__operand(TypedArray.create(typecode, other))
+        elif isinstance(other, (int, float)):
+            return other, INT if isinstance(other, int) else FLOAT
+
+        return None
+
+    def __apply(self, other, op, reflected=False, typecode=None):
+        operand = self.__operand(other)
+
+        if operand is None:
+            return NotImplemented
+
+        b, other_typecode = operand
+        a = self.data
+
+        if reflected:
+            a, b = b, a
+
+        if typecode is None:
+            typecode = FLOAT if FLOAT in (self.typecode, other_typecode) else INT
+
+        if numpy is not None:
+            if op is operator.pow and typecode == INT and numpy.any(numpy.asarray(b) < 0):
+                # negative int powers are floats, like with python numbers
+                a = numpy.asarray(a, dtype=numpy.float64)
+
+            with numpy.errstate(all='raise'):
+                try:
+                    result = op(a, b)
+                except (FloatingPointError, ZeroDivisionError, ValueError) as e:
+                    raise InterpreterRuntimeError("Typed array operation failed: %s" % e)
+
+            if result.dtype.kind in 'bi':
+                return TypedArray(INT, result.astype(numpy.int64))
+
+            return TypedArray(FLOAT, result.astype(numpy.float64))
+
+        if isinstance(a, array.array) and isinstance(b, array.array):
+            values = map(op, a, b)
+        elif isinstance(a, array.array):
+            values = map(op, a, itertools.repeat(b))
+        else:
+            values = map(op, itertools.repeat(a), b)
+
+        try:
+            values = list(values)
+        except ZeroDivisionError as e:
+            raise InterpreterRuntimeError("Typed array operation failed: %s" % e)
+
+        try:
+            return TypedArray(typecode, array.array(typecode, values))
+        except TypeError:
+            # int powers with negative exponents
+            return TypedArray(FLOAT, array.array(FLOAT, values))
+        except OverflowError:
+            raise InterpreterRuntimeError("Integer too large for an int_array")
+
+    def __add__(self, other):
+        return self.__apply(other, operator.add)
+
+    def __radd__(self, other):
+        return self.__apply(other, operator.add, True)
+
+    def __sub__(self, other):
+        return self.__apply(other, operator.sub)
+
+    def __rsub__(self, other):
+        return self.__apply(other, operator.sub, True)
+
+    def __mul__(self, other):
+        return self.__apply(other, operator.mul)
+
+    def __rmul__(self, other):
+        return self.__apply(other, operator.mul, True)
+
+    def __truediv__(self, other):
+        return self.__apply(other, operator.truediv, typecode=FLOAT)
+
+    def __rtruediv__(self, other):
+        return self.__apply(other, operator.truediv, True, FLOAT)
+
+    def __mod__(self, other):
+        return self.__apply(other, operator.mod)
+
+    def __rmod__(self, other):
+        return self.__apply(other, operator.mod, True)
+
+    def __pow__(self, other):
+        return self.__apply(other, operator.pow)
+
+    def __rpow__(self, other):
+        return self.__apply(other, operator.pow, True)
+
+    def __lt__(self, other):
+        return self.__apply(other, operator.lt, typecode=INT)
+
+    def __le__(self, other):
+        return self.__apply(other, operator.le, typecode=INT)
+
+    def __gt__(self, other):
+        return self.__apply(other, operator.gt, typecode=INT)
+
+    def __ge__(self, other):
+        return self.__apply(other, operator.ge, typecode=INT)
+
+    def __neg__(self):
+        return self.__apply(-1, operator.mul)
+
+    def __pos__(self):
+        return self
+
+    def sum(self):
+        return self.data.sum().item() if numpy is not None else sum(self.data)
+
+    def min(self):
+        if not len(self):
+            raise InterpreterRuntimeError("min() of an empty array")
+
+        return self.data.min().item() if numpy is not None else min(self.data)
+
+    def max(self):
+        if not len(self):
+            raise InterpreterRuntimeError("max() of an empty array")
+
+        return self.data.max().item() if numpy is not None else max(self.data)
+
+    def dot(self, other):
+        if not isinstance(other, (TypedArray, list)):
+            raise InterpreterRuntimeError("dot() expects two arrays")
+
+        b = self.__operand(other)[0]
+
+        if numpy is not None:
+            return numpy.dot(self.data, b).item()
+
+        return sum(map(operator.mul, self.data, b))
+
+
+def int_array(values):
+    return TypedArray.create(INT, values)
+
+
+def float_array(values):
+    return TypedArray.create(FLOAT, values)
+
+
+def array_sum(arr):
+    return arr.sum() if isinstance(arr, TypedArray) else sum(arr)
+
+
+def array_min(arr):
+    return arr.min() if isinstance(arr, TypedArray) else min(arr)
+
+
+def array_max(arr):
+    return arr.max() if isinstance(arr, TypedArray) else max(arr)
+
+
+def dot(a, b):
+    if not isinstance(a, TypedArray):
+        a = float_array(a)
+
+    return a.dot(b)
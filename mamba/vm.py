@@ -0,0 +1,570 @@
+import operator
+import mamba.ast as ast
+import mamba.compiler as c
+import mamba.strbuf as strbuf
+import mamba.tasks as tasks
+import mamba.symbol_table as symbol_table
+from mamba.compiler import Code
+from mamba.exceptions import *
+from mamba.symbol_table import UNSET, link_tail_call
+
+_binary = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '**': operator.pow,
+    '/': operator.truediv,
+    '%': operator.mod,
+
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+
+    '&': operator.and_,
+    '|': operator.or_,
+    '^': operator.xor,
+    '>>': operator.rshift,
+    '<<': operator.lshift,
+}
+
+_inplace = {
+    '+=': operator.iadd,
+    '-=': operator.isub,
+    '/=': operator.itruediv,
+    '*=': operator.imul,
+    '%=': operator.imod,
+    '**=': operator.ipow,
+}
+
+_unary = {
+    '+': operator.pos,
+    '-': operator.neg,
+    '~': operator.inv,
+    'not': operator.not_
+}
+
+# operator tables indexed by the opcode argument
+binary_operations = [_binary[o] for o in c.binary_operators]
+inplace_operations = [_inplace[o] for o in c.inplace_operators]
+unary_operations = [_unary[o] for o in c.unary_operators]
+
+_exhausted = object()
+
+
+def _operation_error(l, symbol, r):
+    fmt = (l.__class__.__name__, l, symbol, r.__class__.__name__, r)
+    return InterpreterRuntimeError("Unable to apply operation (%s: %s) %s (%s: %s)" % fmt)
+
+
+class Function:
+    """
+    A function declared by DECLARE_FUNC, its code linked to the global slots of the symbol table
+    and with the inline caches of its calls, see VM.bind()
+    """
+
+    __slots__ = ('code', 'params', 'gslots', 'calls', 'padding', 'generator')
+
+    def __init__(self, code: Code, gslots: list):
+        self.code = code
+        self.params = code.params
+        self.gslots = gslots
+        self.calls = [None] * len(code.consts)
+        self.generator = code.generator
+
+        # when parameters take the first slots in order the arguments
+        # list only needs padding to become the local frame (see mamba.symbol_table.frame)
+        if code.param_slots == list(range(len(code.params))):
+            self.padding = [UNSET] * (len(code.varnames) - len(code.params)) + [code.scope, None]
+        else:
+            self.padding = None
+
+    def __repr__(self):
+        return '<VM function {0} params={1}>'.format(self.code.name, self.params)
+
+    def frame(self, args: list, caller: list=None):
+        if self.padding is not None:
+            frame = args + self.padding
+            frame[-1] = caller
+            return frame
+
+        frame = symbol_table.frame(len(self.code.varnames), self.code.scope, caller)
+
+        for slot, v in zip(self.code.param_slots, args):
+            frame[slot] = v
+
+        return frame
+
+
+class Generator:
+    """
+    Lazy iterator returned by calling a generator function, each value is
+    produced by running the function's code until its next YIELD_VALUE
+    """
+
+    __slots__ = ('vm', 'func', 'local', 'stack', 'pc')
+
+    def __init__(self, vm: 'VM', func: Function, local: list):
+        self.vm = vm
+        self.func = func
+        self.local = local
+        self.stack = []
+        self.pc = 0
+
+    def __repr__(self):
+        return '<VM generator {0}>'.format(self.func.code.name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.pc is None:
+            raise StopIteration
+
+        func = self.func
+
+        try:
+            value, self.pc = self.vm.execute_nested(func.code, func.gslots, func.calls, self.local, self.stack, self.pc)
+        except BaseException:
+            self.pc = None
+            raise
+
+        if self.pc is None:
+            raise StopIteration
+
+        return value
+
+
+class VM:
+    """
+    Stack based virtual machine executing code produced by mamba.compiler.
+
+    Calls to user defined functions do not recurse in python, the caller's
+    code, program counter, local slots and operand stack are saved on a frame
+    stack and restored once the callee returns
+    """
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+
+        # active executions started from python by generators, memo functions and builtins
+        self.nested = 0
+
+        symbols.call = self.call
+
+    def call(self, func: Function, args: list):
+        """
+        Calls a user function from python, see SymbolTable.call
+        """
+
+        if func.generator:
+            return Generator(self, func, func.frame(args))
+
+        budget = self.symbols.budget
+        budget.left -= 1
+        frame = func.frame(args)
+
+        if budget.left < 0:
+            budget.check(frame)
+
+        return self.execute_nested(func.code, func.gslots, func.calls, frame, [], 0)[0]
+
+    def __memo_call(self, func: Function):
+        def call(args: list):
+            return self.execute_nested(func.code, func.gslots, func.calls, func.frame(args), [], 0)[0]
+
+        return call
+
+    def link(self, code: Code):
+        """
+        Returns the global slot of each name in the code's name table
+        """
+        return [self.symbols.global_slot(n) for n in code.names]
+
+    def bind(self, name: str, argc: int):
+        """
+        Looks up the function called by a LOAD_FUNC and checks the number of arguments,
+        the result is kept in the calls list of the code (indexed like its constants)
+        since functions can't be redeclared
+        """
+
+        func = self.symbols.get_func(name)
+
+        if func.__class__ is not ast.BuiltInFunction and len(func.params) != argc:
+            msg = "Invalid number of arguments for function {0}. Expected {1} got {2}"
+            raise InvalidParamCount(msg.format(name, len(func.params), argc))
+
+        return func
+
+    def run(self, code: Code):
+        try:
+            return self.execute(code, self.link(code), [None] * len(code.consts), None, [], 0)[0]
+        except BaseException:
+            # a loop appending to a global failed before flushing it, the variable gets its string back
+            values = self.symbols.globals()
+
+            for i, value in enumerate(values):
+                if value.__class__ is strbuf.Builder:
+                    values[i] = value.value()
+
+            raise
+
+    def execute_nested(self, code: Code, gslots: list, calls: list, local: list, stack: list, pc: int):
+        """
+        execute() for generators and memo functions, their code runs on a frame
+        stack of its own so each one counts as a call towards the maximum depth
+        """
+
+        if self.nested >= self.symbols.max_depth:
+            raise self.symbols.depth_exceeded()
+
+        self.nested += 1
+
+        try:
+            # a segment's worth of executions deep the next one goes on on a new segment, see mamba.stack
+            segments = self.symbols.stack
+
+            if self.nested // segments.calls > segments.level:
+                return segments.call(self.execute, code, gslots, calls, local, stack, pc)
+
+            return self.execute(code, gslots, calls, local, stack, pc)
+        finally:
+            self.nested -= 1
+
+    def execute(self, code: Code, gslots: list, calls: list, local: list, stack: list, pc: int):
+        """
+        Runs the code from pc until it returns or yields, returns the value
+        and the pc to resume from, which is None once the code has returned
+        """
+
+        values = self.symbols.globals()
+        local_names = self.symbols.local_names
+        load_dynamic = self.symbols.load_dynamic
+        bind = self.bind
+        builtin = ast.BuiltInFunction
+        max_depth = self.symbols.max_depth
+        budget = self.symbols.budget
+        concat = strbuf.concat
+        builder = strbuf.Builder
+
+        frames = []
+        ops, consts, functions = code.ops, code.consts, code.functions
+
+        # opcodes are compared as literals ordered by how often they run,
+        # see mamba.compiler for their names
+        while True:
+            op = ops[pc]
+            arg = ops[pc + 1]
+            pc += 2
+
+            if op == 27:  # LOAD_LOCAL
+                value = local[arg]
+
+                # locals read before being assigned in the call see the variable of the same name of the callers
+                if value is UNSET:
+                    value = load_dynamic(local[-1], code.varnames[arg])
+
+                stack.append(value)
+
+            elif op == 1:  # LOAD_CONST
+                stack.append(consts[arg])
+
+            elif op == 28:  # STORE_LOCAL
+                local[arg] = stack.pop()
+
+            elif op == 2:  # LOAD_GLOBAL
+                value = values[gslots[arg]]
+
+                if value is UNSET:
+                    raise SymbolNotFound("Undefined variable '%s'" % code.names[arg])
+
+                stack.append(value)
+
+            elif op == 3:  # STORE_GLOBAL
+                values[gslots[arg]] = stack.pop()
+
+            elif op == 5:  # BINARY_OP
+                r = stack.pop()
+                l = stack[-1]
+                try:
+                    stack[-1] = binary_operations[arg](l, r)
+                except TypeError:
+                    raise _operation_error(l, c.binary_operators[arg], r)
+
+            elif op == 9:  # JUMP_IF_FALSE
+                if not stack.pop():
+                    pc = arg
+
+            elif op == 34:  # LOOP
+                # jumps back to the start of a loop, every iteration counts against the budget
+                budget.left -= 1
+
+                if budget.left < 0:
+                    budget.check(local)
+
+                pc = arg
+
+            elif op == 8:  # JUMP
+                pc = arg
+
+            elif op == 25:  # FOR_ITER
+                value = next(stack[-1], _exhausted)
+
+                if value is _exhausted:
+                    stack.pop()
+                    pc = arg
+                else:
+                    stack.append(value)
+
+            elif op == 13:  # SUBSCR
+                index = stack.pop()
+                stack[-1] = stack[-1][index]
+
+            elif op == 14:  # STORE_SUBSCR
+                index = stack.pop()
+                array = stack.pop()
+                array[index] = stack.pop()
+
+            elif op == 4:  # POP
+                stack.pop()
+
+            elif op == 18:  # LOAD_FUNC
+                func = calls[arg]
+
+                if func is None:
+                    func = calls[arg] = bind(*consts[arg])
+
+                stack.append(func)
+
+            elif op == 19:  # CALL
+                if arg:
+                    args = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    args = []
+
+                func = stack.pop()
+
+                if func.__class__ is builtin:
+                    stack.append(func.func(*args))
+                elif func.generator:
+                    stack.append(Generator(self, func, func.frame(args, local)))
+                else:
+                    if len(frames) >= max_depth:
+                        raise self.symbols.depth_exceeded()
+
+                    budget.left -= 1
+
+                    if budget.left < 0:
+                        budget.check(local)
+
+                    frames.append((code, ops, consts, functions, gslots, calls, local, stack, pc))
+
+                    code = func.code
+                    ops, consts, functions = code.ops, code.consts, code.functions
+                    gslots, calls = func.gslots, func.calls
+                    local = func.frame(args, local)
+                    stack = []
+                    pc = 0
+
+            elif op == 21 or op == 22:  # RETURN, RETURN_NONE
+                value = stack.pop() if op == 21 else None
+
+                if not frames:
+                    return value, None
+
+                code, ops, consts, functions, gslots, calls, local, stack, pc = frames.pop()
+                stack.append(value)
+
+            elif op == 6:  # INPLACE_OP
+                r = stack.pop()
+                l = stack[-1]
+                try:
+                    stack[-1] = inplace_operations[arg](l, r)
+                except TypeError:
+                    raise _operation_error(l, c.inplace_operators[arg], r)
+
+            elif op == 35:  # CONCAT
+                r = stack.pop()
+                stack[-1] = concat(stack[-1], r)
+
+            elif op == 10:  # JUMP_IF_FALSE_OR_POP
+                if not stack[-1]:
+                    pc = arg
+                else:
+                    stack.pop()
+
+            elif op == 11:  # JUMP_IF_TRUE_OR_POP
+                if stack[-1]:
+                    pc = arg
+                else:
+                    stack.pop()
+
+            elif op == 7:  # UNARY_OP
+                stack[-1] = unary_operations[arg](stack[-1])
+
+            elif op == 23:  # MAKE_RANGE
+                end = stack.pop()
+                stack[-1] = iter(range(stack[-1], end + arg, arg))
+
+            elif op == 24:  # GET_ITER
+                stack[-1] = iter(stack[-1])
+
+            elif op == 26:  # BREAK_ITER
+                stack.pop()
+                pc = arg
+
+            elif op == 12:  # BUILD_LIST
+                items = [v for v in stack[len(stack) - arg:] if v is not None]
+                del stack[len(stack) - arg:]
+                stack.append(items)
+
+            elif op == 30:  # BUILD_MAP
+                items = stack[len(stack) - 2 * arg:]
+                del stack[len(stack) - 2 * arg:]
+                stack.append(dict(zip(items[::2], items[1::2])))
+
+            elif op == 17:  # PRINT
+                items = [v for v in stack[len(stack) - arg:] if v is not None]
+                del stack[len(stack) - arg:]
+                print(*items, end='', sep='', file=ast.output.get())
+
+            elif op == 15:  # SLICE
+                end = stack.pop() if arg & c.SLICE_END else None
+                start = stack.pop() if arg & c.SLICE_START else None
+                stack[-1] = stack[-1][start:end]
+
+            elif op == 38:  # STORE_SLICE
+                end = stack.pop() if arg & c.SLICE_END else None
+                start = stack.pop() if arg & c.SLICE_START else None
+                array = stack.pop()
+                array[start:end] = stack.pop()
+
+            elif op == 16:  # CONTAINS
+                b = stack.pop()
+                stack[-1] = stack[-1] not in b if arg else stack[-1] in b
+
+            elif op == 31:  # TAIL_CALL
+                if arg:
+                    args = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    args = []
+
+                func = stack.pop()
+
+                if func.__class__ is not builtin and not func.generator:
+                    budget.left -= 1
+
+                    if budget.left < 0:
+                        budget.check(local)
+
+                    # runs the function in place of the current call instead of nesting it
+                    code = func.code
+                    ops, consts, functions = code.ops, code.consts, code.functions
+                    gslots, calls = func.gslots, func.calls
+                    replaced, local = local, func.frame(args)
+                    link_tail_call(replaced, local)
+                    stack = []
+                    pc = 0
+                    continue
+
+                if func.__class__ is builtin:
+                    value = func.func(*args)
+                else:
+                    value = Generator(self, func, func.frame(args, local))
+
+                if not frames:
+                    return value, None
+
+                code, ops, consts, functions, gslots, calls, local, stack, pc = frames.pop()
+                stack.append(value)
+
+            elif op == 32:  # SPAWN
+                if arg:
+                    args = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    args = []
+
+                func = stack.pop()
+
+                if func.__class__ is not builtin:
+                    # see mamba.tasks, Mamba functions have returned by the time the task is made
+                    if func.generator:
+                        value = Generator(self, func, func.frame(args, local))
+                    else:
+                        budget.left -= 1
+
+                        if budget.left < 0:
+                            budget.check(local)
+
+                        frame = func.frame(args, local)
+                        value = self.execute_nested(func.code, func.gslots, func.calls, frame, [], 0)[0]
+
+                    stack.append(tasks.done(value))
+                elif func.runs_code:
+                    # Mamba code only runs on the program's thread
+                    stack.append(tasks.done(func.func(*args)))
+                else:
+                    stack.append(tasks.spawn(func.func, args))
+
+            elif op == 33:  # AWAIT
+                stack[-1] = tasks.wait(stack[-1])
+
+            elif op == 29:  # YIELD_VALUE
+                # only generator code yields and it always runs at the bottom of its own frame stack
+                return stack.pop(), pc
+
+            elif op == 36:  # FLUSH_LOCAL
+                if local[arg].__class__ is builder:
+                    local[arg] = local[arg].value()
+
+            elif op == 37:  # FLUSH_GLOBAL
+                value = values[gslots[arg]]
+
+                if value.__class__ is builder:
+                    values[gslots[arg]] = value.value()
+
+            elif op == 20:  # DECLARE_FUNC
+                declared = functions[arg]
+                local_names.update(declared.varnames)
+                func = Function(declared, self.link(declared))
+
+                if declared.memo:
+                    # called like a builtin, the memo runs the code on a frame stack of its own
+                    func = builtin(ast.Memo(declared.name, len(declared.params), self.__memo_call(func)))
+
+                self.symbols.set_func(declared.name, func)
+
+            elif op == 39:  # LOAD_FREE
+                name = code.names[arg]
+
+                # see SymbolTable.load_free, callers only need a look when a function has a local of that name
+                if name in local_names:
+                    value = load_dynamic(local[-1], name)
+                else:
+                    value = values[gslots[arg]]
+
+                    if value is UNSET:
+                        raise SymbolNotFound("Undefined variable '%s'" % name)
+
+                stack.append(value)
+
+            elif op == 40:  # LOAD_OUTER
+                name, depth, slot = consts[arg]
+                enclosing = code
+
+                for _ in range(depth):
+                    enclosing = enclosing.outer
+
+                stack.append(self.symbols.load_outer(local, (depth, enclosing.scope, slot), name))
+
+            else:
+                raise InterpreterRuntimeError("Invalid opcode %d at %d" % (op, pc - 2))
+
+
+def run(code: Code, symbols):
+    return VM(symbols).run(code)
@@ -0,0 +1,31 @@
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mamba.interpreter import Interpreter, engines
+
+
+def run(source: str, engine: str='tree', optimize: bool=True, budget=None):
+    """
+    Runs the source in a fresh interpreter, returns what it printed and the error it ended with, if any
+    """
+
+    output = io.StringIO()
+    interpreter = Interpreter(engine, optimize, argv=[], output=output, budget=budget)
+
+    try:
+        interpreter.execute(source)
+    except Exception as e:
+        return output.getvalue(), e.__class__.__name__ + ': ' + str(e)
+
+    return output.getvalue(), None
+
+
+def run_all(source: str, **kwargs) -> dict:
+    """
+    run() on every engine, the results by engine name
+    """
+
+    return {engine: run(source, engine, **kwargs) for engine in engines}
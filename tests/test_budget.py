@@ -0,0 +1,23 @@
+import unittest
+from helpers import engines, run
+from mamba.budget import Budget
+
+# every iteration and every spawned call is a step
+SPAWNED_CALLS = 'fn f(x) { ret x + 1; } s = 0; for i in 1 -> 10 { t = spawn f(i); s += await t; } say s;'
+
+
+class SpawnBudgetTest(unittest.TestCase):
+    def test_spawned_calls_are_steps(self):
+        for engine in engines:
+            budget = Budget()
+            self.assertEqual(run(SPAWNED_CALLS, engine, budget=budget), ('65', None), engine)
+            self.assertEqual(budget.used, 20, engine)
+
+    def test_spawned_calls_exceed_step_limit(self):
+        for engine in engines:
+            output, error = run(SPAWNED_CALLS, engine, budget=Budget(steps=15))
+            self.assertEqual(error, 'BudgetExceeded: Step limit of 15 exceeded', engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from helpers import engines, run, run_all
+
+# the key function reads the string the loop builds
+SORT_IN_LOOP = '''
+out = "";
+fn k(x) { ret len(out + "z") * x; }
+a = [3, 1, 2];
+for i in 1 -> 3 {
+    out += "ab";
+    array_sort(a, "k");
+}
+say out, a;
+'''
+
+# the key function and the program both run in function frames
+SPAWNED_SORT = '''
+fn k(x) { y = x * 2; ret -y; }
+a = [];
+for i in 1 -> 20000 { array_push(a, i); }
+fn main() {
+    t = spawn array_sort(a, "k");
+    z = 1;
+    s = 0;
+    for i in 1 -> 100000 { s += z; }
+    await t;
+    ret s;
+}
+s = main();
+say a[0], " ", s;
+'''
+
+
+class ArraySortTest(unittest.TestCase):
+    def test_key_function(self):
+        source = 'fn neg(x) { ret -x; } a = [2, 3, 1]; array_sort(a, "neg"); say a; array_sort(a, "", true); say a;'
+
+        for engine in engines:
+            self.assertEqual(run(source, engine), ('[3, 2, 1][3, 2, 1]', None), engine)
+
+    def test_key_reads_string_built_in_loop(self):
+        expected = run(SORT_IN_LOOP, optimize=False)
+        self.assertEqual(expected, ('ababab[1, 2, 3]', None))
+
+        for engine, result in run_all(SORT_IN_LOOP).items():
+            self.assertEqual(result, expected, engine)
+
+    def test_spawned_sort_runs_key_on_program_thread(self):
+        for engine, result in run_all(SPAWNED_SORT).items():
+            self.assertEqual(result, ('20000 100000', None), engine)
+
+
+class StrBufTest(unittest.TestCase):
+    def test_memo_sees_appends(self):
+        source = 'memo fn f(b) { ret strbuf_str(b); } b = strbuf("a"); say f(b); strbuf_append(b, "b"); say f(b);'
+
+        for engine, result in run_all(source).items():
+            self.assertEqual(result, ('aab', None), engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import io
+import sys
+import threading
+import unittest
+from helpers import Interpreter, engines, run
+from mamba.ast import BuiltInFunction
+
+RECURSE = 'fn f(n) { if n == 0 { ret 0; } ret 1 + f(n - 1); } say f(%d);'
+GENERATORS = '''
+fn g(n) { if n == 0 { yield 1; } else { for v in g(n - 1) { yield v + 1; } } }
+for v in g(%d) { say v; }
+'''
+MEMO = 'memo fn m(n) { if n == 0 { ret 0; } ret 1 + m(n - 1); } say m(%d);'
+DEEP = 'RecursionDepthExceeded: Maximum recursion depth of 10000 exceeded'
+
+
+class DepthTest(unittest.TestCase):
+    def assertEverywhere(self, source: str, expected):
+        for engine in engines:
+            self.assertEqual(run(source, engine), expected, engine)
+
+    def test_tail_calls_dont_nest(self):
+        source = '''
+        fn count(n, acc) { if n == 0 { ret acc; } ret count(n - 1, acc + n); }
+        fn ev(n) { if n == 0 { ret true; } ret od(n - 1); }
+        fn od(n) { if n == 0 { ret false; } ret ev(n - 1); }
+        say count(100000, 0), " ", ev(30001);
+        '''
+        self.assertEverywhere(source, ('5000050000 False', None))
+
+    def test_calls_nest_up_to_max_depth(self):
+        self.assertEverywhere(RECURSE % 9999, ('9999', None))
+        self.assertEverywhere(RECURSE % 10000, ('', DEEP))
+
+    def test_generators_nest_up_to_max_depth(self):
+        self.assertEverywhere(GENERATORS % 9998, ('9999', None))
+        self.assertEverywhere(GENERATORS % 10000, ('', DEEP))
+
+    def test_memo_functions_nest_up_to_max_depth(self):
+        self.assertEverywhere(MEMO % 9999, ('9999', None))
+        self.assertEverywhere(MEMO % 10000, ('', DEEP))
+
+    def test_max_depth(self):
+        for engine in engines:
+            output = io.StringIO()
+            interpreter = Interpreter(engine, argv=[], output=output, max_depth=50)
+
+            interpreter.execute(RECURSE % 49)
+            self.assertEqual(output.getvalue(), '49', engine)
+
+            with self.assertRaisesRegex(Exception, 'Maximum recursion depth of 50 exceeded'):
+                interpreter.execute('say f(50);')
+
+    def test_process_limits_are_left_alone(self):
+        limit = sys.getrecursionlimit()
+        stack_size = threading.stack_size()
+
+        for engine in engines:
+            interpreter = Interpreter(engine, argv=[], output=io.StringIO())
+            done = threading.Event()
+
+            # a program recursing in a builtin, observed while it runs
+            def check():
+                self.assertEqual(sys.getrecursionlimit(), limit)
+                self.assertEqual(threading.stack_size(), stack_size)
+                done.set()
+
+            interpreter.symbols.set_func('check', BuiltInFunction(check))
+            interpreter.execute('fn f(n) { if n == 0 { check(); ret 0; } ret 1 + f(n - 1); } f(5000);')
+
+            self.assertTrue(done.is_set(), engine)
+            self.assertEqual(sys.getrecursionlimit(), limit)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+from helpers import run_all
+from mamba.exceptions import InterpreterRuntimeError
+from mamba.filemap import file_map
+
+
+class FileTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.data = self.write('data.txt', 'alpha\nbeta\ngamma')
+        self.empty = self.write('empty.txt', '')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.dir, name)
+
+        with open(path, 'w') as f:
+            f.write(text)
+
+        # mamba strings are unescaped
+        return path.replace('\\', '/')
+
+    def assertEverywhere(self, source: str, expected):
+        source = source.replace('DATA', '"%s"' % self.data).replace('EMPTY', '"%s"' % self.empty)
+
+        for engine, result in run_all(source).items():
+            self.assertEqual(result, expected, engine)
+
+    def test_file_size(self):
+        source = 'say file_size(DATA), " "; h = file(DATA); say file_size(h); file_close(h);'
+        self.assertEverywhere(source, ('16 16', None))
+
+    def test_file_lines(self):
+        source = '''
+        for line in file_lines(DATA) { say "[", line, "]"; }
+        h = file(DATA);
+        for line in file_lines(h) { say len(line); }
+        file_close(h);
+        '''
+        self.assertEverywhere(source, ('[alpha][beta][gamma]545', None))
+
+    def test_file_map(self):
+        source = '''
+        m = file_map(DATA);
+        say len(m), " ", str(m[6:10]), " ", m[0], m[-1], " ", m[3:1], "|";
+        say "beta" in m, " ", "delta" in m, " ", pos("gamma", m), " ", pos("gamma", m[6:]);
+        '''
+        self.assertEverywhere(source, ('16 beta aa |True False 11 5', None))
+
+    def test_file_map_lines_keep_line_breaks(self):
+        source = 'm = file_map(DATA); for line in m[6:] { say "<", line, ">"; }'
+        self.assertEverywhere(source, ('<beta\n><gamma>', None))
+
+    def test_empty_file_map(self):
+        self.assertEverywhere('m = file_map(EMPTY); say len(m), "|", str(m), "|"; for line in m { say line; }',
+                              ('0||', None))
+
+    def test_file_map_index_out_of_range(self):
+        self.assertEverywhere('m = file_map(DATA); say m[100];', ('', 'IndexError: file_map index out of range'))
+
+    def test_views_share_the_mapping(self):
+        m = file_map(self.data)
+        view = m[6:]
+
+        self.assertIs(view.data, m.data)
+        self.assertEqual(str(view[:4]), 'beta')
+        self.assertEqual(view.index('gamma'), 5)
+
+        with self.assertRaises(InterpreterRuntimeError):
+            m[::2]
+
+        m.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
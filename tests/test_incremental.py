@@ -0,0 +1,60 @@
+import pickle
+import unittest
+import helpers  # noqa: F401, puts the package on the path
+from mamba.exceptions import ParserSyntaxError
+from mamba.incremental import IncrementalParser, split
+
+PROGRAM = '''x = 1;
+fn f(n) {
+    ret n * 2;
+}
+say f(x);
+'''
+
+
+def parse_all(source: str):
+    return IncrementalParser().parse_all(source)
+
+
+class IncrementalParserTest(unittest.TestCase):
+    def assertSameTree(self, tree, expected):
+        # line numbers included
+        self.assertEqual(pickle.dumps(tree), pickle.dumps(expected))
+
+    def test_reuses_unchanged_statements(self):
+        parser = IncrementalParser()
+        parser.parse(PROGRAM)
+
+        source = PROGRAM.replace('x = 1;\n', 'x = 1;\ny = 2;\n')
+        tree = parser.parse(source)
+
+        self.assertEqual((parser.parsed, parser.reused), (1, 3))
+        self.assertSameTree(tree, parse_all(source))
+
+    def test_syntax_error_is_the_full_parse_error(self):
+        parser = IncrementalParser()
+        parser.parse(PROGRAM)
+        source = PROGRAM + 'y = ;\n'
+
+        with self.assertRaises(ParserSyntaxError) as expected:
+            parse_all(source)
+
+        with self.assertRaises(ParserSyntaxError) as error:
+            parser.parse(source)
+
+        self.assertEqual(str(error.exception), str(expected.exception))
+
+        # and it starts over afterwards
+        self.assertSameTree(parser.parse(PROGRAM), parse_all(PROGRAM))
+
+    def test_wrong_split_falls_back_to_full_parse(self):
+        # the assignment is an expression ending with its own semicolon, the split cuts it too early
+        source = 'x = y = 1; ;\nsay x, y;\n'
+        self.assertEqual(split(source)[0].text, 'x = y = 1;')
+
+        parser = IncrementalParser()
+        self.assertSameTree(parser.parse(source), parse_all(source))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import io
+import signal
+import threading
+import unittest
+from helpers import Interpreter, engines
+from mamba.ast import BuiltInFunction
+from mamba.budget import Budget
+
+
+class InterruptTest(unittest.TestCase):
+    def interrupt(self, interpreter: Interpreter, source: str, delay: float=0.3):
+        """
+        Executes the source and presses Ctrl-C after delay seconds, the program is expected to still be running
+        """
+
+        threading.Timer(delay, signal.pthread_kill, (threading.main_thread().ident, signal.SIGINT)).start()
+
+        with self.assertRaises(KeyboardInterrupt):
+            interpreter.execute(source)
+
+    def test_interrupted_program_stops(self):
+        for engine in engines:
+            output = io.StringIO()
+            interpreter = Interpreter(engine, argv=[], output=output)
+
+            self.interrupt(interpreter, 'n = 0; while true { n += 1; }')
+            interpreter.execute('say n, " ";')
+            threading.Event().wait(0.2)
+            interpreter.execute('say n;')
+
+            first, second = output.getvalue().split()
+            self.assertEqual(first, second, engine)
+            self.assertGreater(int(first), 0, engine)
+
+    def test_blocked_program_is_left_behind(self):
+        release = threading.Event()
+        output = io.StringIO()
+        budget = Budget(steps=100)
+        interpreter = Interpreter(argv=[], output=output, budget=budget)
+        interpreter.symbols.set_func('block', BuiltInFunction(release.wait))
+
+        self.interrupt(interpreter, 'n = 1; block(); n = 2;')
+        release.set()
+
+        # a fresh symbol table and budget, the program left behind keeps the old ones
+        self.assertIsNot(interpreter.budget, budget)
+        self.assertEqual(interpreter.budget.steps, 100)
+        interpreter.execute('n = 3; say n;')
+        self.assertEqual(output.getvalue(), '3')
+
+
+if __name__ == '__main__':
+    unittest.main()
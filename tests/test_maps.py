@@ -0,0 +1,51 @@
+import unittest
+from helpers import run, run_all
+
+
+class MapTest(unittest.TestCase):
+    def assertEverywhere(self, source: str, expected):
+        self.assertEqual(run(source, optimize=False), expected)
+
+        for engine, result in run_all(source).items():
+            self.assertEqual(result, expected, engine)
+
+    def test_literal(self):
+        source = 'ages = {"bob": 31, "alice": 27}; ages["carol"] = 40; say ages["bob"], ages["carol"], len(ages);'
+        self.assertEverywhere(source, ('31403', None))
+
+    def test_empty_literal(self):
+        self.assertEverywhere('m = {}; say m, " ", len(m);', ('{} 0', None))
+
+    def test_keys_and_nesting(self):
+        source = 'm = {2: "b", true: [1, 2], "n": {"x": 1 + 2}, "a": 1, "a": 4}; n = m["n"];'
+        source += 'say m[2], m[true], n["x"], m["a"];'
+        self.assertEverywhere(source, ('b[1, 2]34', None))
+
+    def test_in(self):
+        source = 'm = {"a": 1, "b": 2}; say "a" in m, " ", "c" in m, " ", "c" not in m, " ", 1 in m;'
+        self.assertEverywhere(source, ('True False True False', None))
+
+    def test_for_in_visits_keys_in_order(self):
+        self.assertEverywhere('m = {"z": 1, "a": 2, "m": 3}; for k in m { say k, m[k], " "; }', ('z1 a2 m3 ', None))
+
+    def test_literal_in_blocks_and_arguments(self):
+        source = 'fn f(m) { ret m["a"] * 2; } x = 1; if x { m = {"k": x}; say m["k"], " ", f({"a": 21}); }'
+        self.assertEverywhere(source, ('1 42', None))
+
+    def test_builtins(self):
+        source = '''
+        m = {"a": 1, "b": 2};
+        say map_keys(m), map_values(m), " ", map_get(m, "a"), " ", map_get(m, "x", 0), " ", map_get(m, "x");
+        say " ", map_remove(m, "a"), " ", m;
+        '''
+        self.assertEverywhere(source, ("['a', 'b'][1, 2] 1 0  1 {'b': 2}", None))
+
+    def test_missing_key(self):
+        self.assertEverywhere('m = {"a": 1}; say m["b"];', ('', "KeyError: 'b'"))
+
+    def test_unhashable_key(self):
+        self.assertEverywhere('m = {[1]: 1};', ('', "TypeError: unhashable type: 'list'"))
+
+
+if __name__ == '__main__':
+    unittest.main()
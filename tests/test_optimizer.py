@@ -0,0 +1,28 @@
+import unittest
+from helpers import engines, run
+
+
+class PowerTest(unittest.TestCase):
+    def assertSameAsUnoptimized(self, source: str, expected):
+        self.assertEqual(run(source, optimize=False), expected)
+
+        for engine in engines:
+            self.assertEqual(run(source, engine), expected, engine)
+
+    def test_float_power(self):
+        self.assertSameAsUnoptimized('x = 7.7; say x ** 3;', (str(7.7 ** 3), None))
+
+    def test_float_power_overflow(self):
+        self.assertSameAsUnoptimized('x = 10.0 ** 200; say x ** 2;',
+                                     ('', "OverflowError: (34, 'Numerical result out of range')"))
+
+    def test_str_power(self):
+        self.assertSameAsUnoptimized('x = "a"; say x ** 2;',
+                                     ('', 'InterpreterRuntimeError: Unable to apply operation (str: a) ** (int: 2)'))
+
+    def test_int_power(self):
+        self.assertSameAsUnoptimized('x = 3; say x ** 4, " ", x ** 2;', ('81 9', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import contextlib
+import io
+import unittest
+from helpers import Interpreter
+from mamba.repl import Repl
+
+
+def session(*lines):
+    """
+    Types the lines into a REPL, returns what it printed and the errors it reported
+    """
+
+    lines = iter(lines)
+
+    def read(prompt):
+        try:
+            return next(lines)
+        except StopIteration:
+            raise EOFError
+
+    output = io.StringIO()
+    errors = io.StringIO()
+
+    with contextlib.redirect_stderr(errors):
+        Repl(Interpreter(argv=[], output=output), read, output).loop()
+
+    return output.getvalue(), errors.getvalue()
+
+
+class ReplTest(unittest.TestCase):
+    def test_python_errors_keep_the_session(self):
+        output, errors = session('x = 1;', '1 / 0', 'a = [1];', 'a[5]', 'x + 1')
+
+        self.assertEqual(output, '2\n\n')
+        self.assertIn('ZeroDivisionError', errors)
+        self.assertIn('IndexError', errors)
+
+
+if __name__ == '__main__':
+    unittest.main()
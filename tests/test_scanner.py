@@ -0,0 +1,76 @@
+import glob
+import os
+import random
+import unittest
+from helpers import run
+import mamba.lexer
+from mamba.scanner import Scanner
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+# the quirks of the ply lexer the scanner reproduces
+QUIRKS = [
+    'true_x = false1;',
+    'x = 1 \n\n\ny = 2;\n  \n z;',
+    's = "a\\"b" + "c\\"";',
+    'say "\\x41\\n\\u00e9", \'q\';',
+    'x = 1.5 + .5 + 5. // comment\ny = 7 / 2;',
+    'a **= 2; b++; c--; d <- e -> f >> g << h;',
+    'x = 1; @ y = 2;',
+    's = "unterminated',
+    'é = 1; x = "é";',
+]
+
+ALPHABET = list('abtruefls_$x0123456789.+-*/%=!<>&|^~(){}[],;:?"\\ \t\n') + ['true', 'false', 'if', '//', 'é']
+
+
+def tokens(lexer, source: str) -> list:
+    """
+    Everything the lexer gives for the source: each token with its position, then the error it ended with
+    """
+
+    lexer.input(source)
+    lexer.lineno = 1
+    result = []
+
+    try:
+        for t in iter(lexer.token, None):
+            result.append((t.type, t.value, t.lineno, t.lexpos, lexer.lineno))
+    except Exception as e:
+        result.append((e.__class__.__name__, str(e), lexer.lineno))
+
+    return result
+
+
+class ScannerTest(unittest.TestCase):
+    def assertSameTokens(self, source: str):
+        self.assertEqual(tokens(Scanner(), source), tokens(mamba.lexer.lexer.clone(), source), repr(source))
+
+    def test_examples(self):
+        for path in glob.glob(os.path.join(EXAMPLES, '*.mb')):
+            with open(path) as f:
+                self.assertSameTokens(f.read())
+
+    def test_quirks(self):
+        for source in QUIRKS:
+            self.assertSameTokens(source)
+
+    def test_random_sources(self):
+        rnd = random.Random(20)
+
+        for _ in range(2000):
+            self.assertSameTokens(''.join(rnd.choice(ALPHABET) for _ in range(rnd.randrange(1, 30))))
+
+    def test_clone_starts_over(self):
+        scanner = Scanner()
+        scanner.input('a b c')
+        scanner.token()
+
+        clone = scanner.clone()
+        clone.input('x')
+        self.assertEqual(clone.token().value, 'x')
+        self.assertEqual(scanner.token().value, 'b')
+
+
+if __name__ == '__main__':
+    unittest.main()
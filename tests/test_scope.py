@@ -0,0 +1,79 @@
+import unittest
+from helpers import engines, run
+
+
+class ScopeTest(unittest.TestCase):
+    def assertEverywhere(self, source: str, expected):
+        for engine in engines:
+            for optimize in (True, False):
+                self.assertEqual(run(source, engine, optimize), expected, (engine, optimize))
+
+    def test_nested_function_reads_enclosing_params(self):
+        source = 'fn outer(a) { fn inner(b) { ret a + b; } ret inner(2); } say outer(1);'
+        self.assertEverywhere(source, ('3', None))
+
+    def test_nested_function_two_levels_down(self):
+        source = '''
+        fn f(a) {
+            fn g(b) {
+                fn h(c) { ret a * 100 + b * 10 + c; }
+                ret h(3);
+            }
+            ret g(2);
+        }
+        say f(1);
+        '''
+        self.assertEverywhere(source, ('123', None))
+
+    def test_callee_reads_caller_locals(self):
+        source = '''
+        fn g() { ret x * 10; }
+        fn f(x) { ret g(); }
+        fn h(x) { y = g(); ret y + 1; }
+        say f(4), " ", h(5);
+        x = 7;
+        say " ", g();
+        '''
+        self.assertEverywhere(source, ('40 51 70', None))
+
+    def test_local_read_before_assignment(self):
+        source = '''
+        x = 10;
+        fn k() { y = x; x = 3; ret y + x; }
+        fn kk(x) { ret k(); }
+        say kk(100), " ", k(), " ", x;
+        '''
+        self.assertEverywhere(source, ('103 13 10', None))
+
+    def test_undefined_variable(self):
+        source = 'fn f() { ret nothing; } fn g(nothing) { ret 1; } say f();'
+        self.assertEverywhere(source, ('', "SymbolNotFound: Undefined variable 'nothing'"))
+
+    def test_tail_calls_keep_caller_variables(self):
+        source = '''
+        fn tc(a) { ret tg(); }
+        fn tg() { ret a * 2; }
+        fn count(n, acc) { if n == 0 { ret acc; } ret count(n - 1, acc + n); }
+        say tc(21), " ", count(50000, 0);
+        '''
+        self.assertEverywhere(source, ('42 1250025000', None))
+
+    def test_generator_reads_variables_where_created(self):
+        source = '''
+        fn gen(k) { for i in 1 -> k { yield i * m; } }
+        fn use(m) { s = 0; for v in gen(3) { s += v; } ret s; }
+        say use(10);
+        '''
+        self.assertEverywhere(source, ('60', None))
+
+    def test_callee_reads_string_built_in_loop(self):
+        source = '''
+        fn last() { ret out[len(out) - 1]; }
+        fn build() { out = "."; seen = ""; for i in 1 -> 3 { out += str(i); seen += last(); } ret seen; }
+        say build();
+        '''
+        self.assertEverywhere(source, ('123', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from helpers import run, run_all
+
+
+class TypedArrayTest(unittest.TestCase):
+    def assertEverywhere(self, source: str, expected):
+        self.assertEqual(run(source, optimize=False), expected)
+
+        for engine, result in run_all(source).items():
+            self.assertEqual(result, expected, engine)
+
+    def assertFails(self, source: str, error: str):
+        # numpy and array.array word some errors differently, only the start is compared
+        for engine, (output, e) in run_all(source).items():
+            self.assertTrue(e is not None and e.startswith(error), (engine, e))
+
+    def test_create(self):
+        source = 'a = int_array(3); b = float_array([1, 2.5, 3]); c = int_array(b[0:0]); say a, b, len(a), c;'
+        self.assertEverywhere(source, ('[0, 0, 0][1.0, 2.5, 3.0]3[]', None))
+
+    def test_arithmetic(self):
+        source = '''
+        a = int_array([1, 2, 3]);
+        b = int_array([4, 5, 6]);
+        say a + b, a * 2, 10 - a, a ** 2, b / a, b % a, -a, " ";
+        f = float_array([1, 2]);
+        say f * 1.5, f + int_array([1, 1]), f + [1, 2], int_array([1, 2]) ** -1;
+        '''
+        expected = '[5, 7, 9][2, 4, 6][9, 8, 7][1, 4, 9][4.0, 2.5, 2.0][0, 1, 0][-1, -2, -3] '
+        expected += '[1.5, 3.0][2.0, 3.0][2.0, 4.0][1.0, 0.5]'
+        self.assertEverywhere(source, (expected, None))
+
+    def test_comparisons(self):
+        source = 'a = int_array([1, 5, 3]); say a < 3, a >= 3, a == [1, 5, 3], a != int_array([1, 5, 3]);'
+        self.assertEverywhere(source, ('[1, 0, 0][0, 1, 1]TrueFalse', None))
+
+    def test_reductions(self):
+        source = 'a = int_array([1, 2, 3]); say sum(a), min(a), max(a), dot(a, [1, 1, 1]), dot([1.5, 2], [2, 2]);'
+        self.assertEverywhere(source, ('61367.0', None))
+
+    def test_items_and_slices(self):
+        source = '''
+        a = int_array([1, 2, 3]);
+        a[0] = 7;
+        a[1:] = [8, 9];
+        say a, a[1:], a[2], 2 in a, 8 in a;
+        for v in a { say v; }
+        s = a[0:1];
+        s[0] = 0;
+        say a;
+        '''
+        self.assertEverywhere(source, ('[7, 8, 9][8, 9]9FalseTrue789[7, 8, 9]', None))
+
+    def test_stored_values_are_checked(self):
+        self.assertEverywhere('a = int_array([1, 2]); a[0] = 1.5;',
+                              ('', 'InterpreterRuntimeError: Only ints can be stored in an int_array'))
+        self.assertEverywhere('a = float_array(["x"]);',
+                              ('', 'InterpreterRuntimeError: Only numbers can be stored in a float_array'))
+        self.assertEverywhere('a = int_array([2 ** 70]);',
+                              ('', 'InterpreterRuntimeError: Integer too large for an int_array'))
+
+    def test_sizes_are_fixed(self):
+        error = 'InterpreterRuntimeError: Can not assign 1 values to a slice of 2 items of a typed array'
+        self.assertEverywhere('a = int_array([1, 2, 3]); a[0:2] = [1];', ('', error))
+        self.assertEverywhere('a = int_array([1, 2]) + int_array([1, 2, 3]);',
+                              ('', 'InterpreterRuntimeError: Typed array sizes differ (2 and 3)'))
+
+    def test_errors(self):
+        self.assertFails('a = int_array([1, 2]) / 0;', 'InterpreterRuntimeError: Typed array operation failed')
+        self.assertFails('say min(int_array(0));', 'InterpreterRuntimeError: min() of an empty array')
+
+
+if __name__ == '__main__':
+    unittest.main()